@@ -0,0 +1,457 @@
+#alerts.py
+
+from collections import deque
+from datetime import datetime
+from email.message import EmailMessage
+from urllib.request import Request, urlopen
+from file_lock import locked, load_json, write_json
+import threading
+import smtplib
+import logging
+import atexit
+import queue
+import json
+import time
+
+class RollingWindow:
+    """Last size prices with a running sum and a monotonic deque for the minimum
+
+    add() and both aggregates are O(1) amortized.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.values = deque()
+        self.total = 0.0
+        self._mins = deque()
+
+    def add(self, value):
+        self.values.append(value)
+        self.total += value
+        while self._mins and self._mins[-1] > value:
+            self._mins.pop()
+        self._mins.append(value)
+        if len(self.values) > self.size:
+            dropped = self.values.popleft()
+            self.total -= dropped
+            if self._mins[0] == dropped:
+                self._mins.popleft()
+
+    def __len__(self):
+        return len(self.values)
+
+    @property
+    def min(self):
+        return self._mins[0] if self._mins else None
+
+    @property
+    def avg(self):
+        return self.total / len(self.values) if self.values else None
+
+class PriceAggregates:
+    """Per-item aggregates the rules are evaluated against, updated one price at a time"""
+
+    def __init__(self, window_sizes):
+        self.count = 0
+        self.min = None
+        self.max = None
+        self.last = None
+        # Start of the latest stored run folded in, to find prices saved since
+        self.last_ts = None
+        self.windows = {size: RollingWindow(size) for size in window_sizes}
+
+    def add(self, price, timestamp=None):
+        self.count += 1
+        self.last_ts = timestamp
+        self.min = price if self.min is None else min(self.min, price)
+        self.max = price if self.max is None else max(self.max, price)
+        self.last = price
+        for window in self.windows.values():
+            window.add(price)
+
+    def to_dict(self):
+        longest = max(self.windows.values(), key=len, default=None)
+        return {
+            'count': self.count,
+            'min': self.min,
+            'max': self.max,
+            'last': self.last,
+            'last_ts': self.last_ts,
+            'recent': list(longest.values) if longest else []
+        }
+
+    @classmethod
+    def from_dict(cls, data, window_sizes):
+        aggregates = cls(window_sizes)
+        # Windows are rebuilt from the most recent prices, then the totals restored
+        for price in data['recent']:
+            aggregates.add(price)
+        aggregates.count, aggregates.min = data['count'], data['min']
+        aggregates.max, aggregates.last = data['max'], data['last']
+        aggregates.last_ts = data.get('last_ts')
+        return aggregates
+
+class AlertRule:
+    """One alert condition, checked against a new price and the aggregates before it
+
+    Types:
+        threshold: price at or below 'below' (or at or above 'above')
+        drop_from_min: price 'percent' below the lowest of the last 'window' prices
+        drop_from_avg: price 'percent' below the average of the last 'window' prices
+        all_time_low: price below every earlier price
+    Threshold and drop rules fire when the condition starts to hold, not on
+    every price while it keeps holding.
+    """
+
+    TYPES = ('threshold', 'drop_from_min', 'drop_from_avg', 'all_time_low')
+
+    def __init__(self, name, type, item_ids=None, below=None, above=None, percent=5.0,
+                 window=30, min_history=3):
+        """
+        name: identifies the rule in notifications
+        item_ids: items the rule applies to, all items when None
+        min_history: earlier prices needed before relative rules can fire
+        """
+        if type not in self.TYPES:
+            raise ValueError(f"Unknown alert rule type {type!r}")
+        self.name = name
+        self.type = type
+        self.item_ids = set(item_ids) if item_ids else None
+        self.below = below
+        self.above = above
+        self.percent = percent
+        self.window = window
+        self.min_history = min_history
+
+    @classmethod
+    def from_dict(cls, data, index):
+        data = dict(data)
+        return cls(data.pop('name', f"{data.get('type')}-{index}"), **data)
+
+    def applies_to(self, item_id):
+        return self.item_ids is None or item_id in self.item_ids
+
+    def holds(self, price, aggregates):
+        """Whether the condition holds for price; returns (holds, message)"""
+        if self.type == 'threshold':
+            if self.below is not None and price <= self.below:
+                return True, f"price {price:.2f} is at or below {self.below:.2f}"
+            if self.above is not None and price >= self.above:
+                return True, f"price {price:.2f} is at or above {self.above:.2f}"
+            return False, None
+        if aggregates.count < self.min_history:
+            return False, None
+        if self.type == 'all_time_low':
+            if price < aggregates.min:
+                return True, f"all-time low {price:.2f}, previous low {aggregates.min:.2f}"
+            return False, None
+
+        window = aggregates.windows[self.window]
+        reference = window.min if self.type == 'drop_from_min' else window.avg
+        label = 'lowest' if self.type == 'drop_from_min' else 'average'
+        if reference and price <= reference * (1 - self.percent / 100):
+            drop = (reference - price) / reference * 100
+            return True, f"price {price:.2f} is {drop:.1f}% below the {label} {reference:.2f} of the last {len(window)} prices"
+        return False, None
+
+    def edge_triggered(self):
+        return self.type != 'all_time_low'
+
+class LogSink:
+    """Writes alerts to the application log"""
+
+    def __init__(self, level='WARNING'):
+        self.level = logging.getLevelName(level) if isinstance(level, str) else level
+        self.logger = logging.getLogger(__name__)
+
+    def send(self, alerts):
+        for alert in alerts:
+            self.logger.log(self.level, f"Price alert for {alert['name']}: {alert['message']} ({alert['url']})")
+
+class WebhookSink:
+    """POSTs each batch of alerts as JSON to a URL"""
+
+    def __init__(self, url, timeout=10, headers=None):
+        self.url = url
+        self.timeout = timeout
+        self.headers = headers or {}
+
+    def send(self, alerts):
+        request = Request(self.url, data=json.dumps({'alerts': alerts}).encode(), method='POST',
+                          headers={'Content-Type': 'application/json', **self.headers})
+        with urlopen(request, timeout=self.timeout) as response:
+            response.read()
+
+class EmailSink:
+    """Sends one email per batch of alerts over SMTP"""
+
+    def __init__(self, sender, recipients, host='localhost', port=25, username=None,
+                 password=None, starttls=False, timeout=10):
+        self.sender = sender
+        self.recipients = recipients if isinstance(recipients, list) else [recipients]
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+        self.timeout = timeout
+
+    def send(self, alerts):
+        message = EmailMessage()
+        message['Subject'] = (f"Price alert: {alerts[0]['name']}" if len(alerts) == 1
+                              else f"{len(alerts)} price alerts")
+        message['From'] = self.sender
+        message['To'] = ', '.join(self.recipients)
+        message.set_content('\n\n'.join(
+            f"{alert['name']}\n{alert['message']}\n{alert['url']}" for alert in alerts
+        ))
+        with smtplib.SMTP(self.host, self.port, timeout=self.timeout) as smtp:
+            if self.starttls:
+                smtp.starttls()
+            if self.username:
+                smtp.login(self.username, self.password)
+            smtp.send_message(message)
+
+SINK_TYPES = {'log': LogSink, 'webhook': WebhookSink, 'email': EmailSink}
+
+class AlertDispatcher:
+    """Delivers alerts to the sinks in batches from a background thread
+
+    submit() only enqueues, so scrape workers never wait on a webhook or SMTP
+    server. Alerts are grouped until batch_size is reached or flush_seconds
+    have passed since the first one in the batch.
+    """
+
+    def __init__(self, sinks, batch_size=20, flush_seconds=5.0, max_queue=10000):
+        self.sinks = sinks
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.logger = logging.getLogger(__name__)
+        self.sent = 0
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = threading.Thread(target=self._run, name='alert-dispatcher', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def submit(self, alert):
+        """Queue an alert without blocking"""
+        try:
+            self._queue.put_nowait(alert)
+        except queue.Full:
+            self.dropped += 1
+            self.logger.warning(f"Alert queue full, dropped alert for {alert['item_id']}")
+
+    def _run(self):
+        while True:
+            alert = self._queue.get()
+            if alert is None:
+                return
+            batch = [alert]
+            deadline = time.monotonic() + self.flush_seconds
+            stop = False
+            while len(batch) < self.batch_size:
+                try:
+                    alert = self._queue.get(timeout=max(0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if alert is None:
+                    stop = True
+                    break
+                batch.append(alert)
+            self._deliver(batch)
+            if stop:
+                return
+
+    def _deliver(self, batch):
+        for sink in self.sinks:
+            try:
+                sink.send(batch)
+            except Exception as e:
+                self.logger.error(f"Error sending {len(batch)} alerts to {type(sink).__name__}: {e}")
+        self.sent += len(batch)
+
+    def close(self, timeout=10):
+        """Deliver what is queued and stop the thread"""
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join(timeout)
+
+class AlertEngine:
+    """Evaluates alert rules as each new price is stored
+
+    Rules and sinks come from rules_file. Per-item aggregates (count, all-time
+    min/max, rolling windows) are seeded once from the stored history, then
+    updated with every new price, so evaluating a price is O(1). Worker
+    processes each run an engine: prices another process stored since the
+    last evaluation are read back and replayed without alerting, so every
+    engine keeps the same aggregates and rule states, and saves are merged
+    into the shared state file.
+    """
+
+    def __init__(self, rules_file='data/alerts.json', state_file='data/alert_state.json',
+                 dispatcher=None):
+        """
+        rules_file: JSON with 'rules' and 'sinks' lists
+        state_file: where per-item aggregates persist between runs
+        dispatcher: AlertDispatcher to use instead of one built from the configured sinks
+        """
+        self.rules_file = rules_file
+        self.state_file = state_file
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        config = self._load_json(rules_file, {})
+        self.rules = []
+        for index, rule in enumerate(config.get('rules', [])):
+            try:
+                self.rules.append(AlertRule.from_dict(rule, index))
+            except (TypeError, ValueError) as e:
+                self.logger.error(f"Invalid alert rule {rule}: {e}")
+        self.window_sizes = sorted({rule.window for rule in self.rules
+                                    if rule.type in ('drop_from_min', 'drop_from_avg')})
+        self.dispatcher = dispatcher
+        if self.dispatcher is None and self.rules:
+            self.dispatcher = AlertDispatcher(self._build_sinks(config.get('sinks') or [{'type': 'log'}]))
+
+        self.aggregates, self.active = self._load_state()
+        self._checked = set()
+        self._removed = set()
+
+    def _load_state(self):
+        """Per-item aggregates and active rule names from the state file"""
+        state = self._load_json(self.state_file, {})
+        active = {item_id: set(names) for item_id, names in state.get('active', {}).items()}
+        aggregates = {}
+        for item_id, data in state.get('aggregates', {}).items():
+            try:
+                aggregates[item_id] = PriceAggregates.from_dict(data, self.window_sizes)
+            except (KeyError, TypeError) as e:
+                self.logger.error(f"Discarding alert state for {item_id}: {e}")
+        return aggregates, active
+
+    def _load_json(self, path, default):
+        try:
+            return load_json(path, default)
+        except Exception as e:
+            self.logger.error(f"Error loading {path}: {e}")
+        return default
+
+    def _build_sinks(self, configs):
+        sinks = []
+        for config in configs:
+            config = dict(config)
+            try:
+                sinks.append(SINK_TYPES[config.pop('type')](**config))
+            except (KeyError, TypeError) as e:
+                self.logger.error(f"Invalid alert sink {config}: {e}")
+        return sinks
+
+    def save(self):
+        """Merge aggregates and active rule states into the shared state file
+
+        For each item the state that has folded in the most recent stored
+        price wins, whichever process wrote it.
+        """
+        if not self.rules:
+            return
+        try:
+            with locked(self.state_file):
+                aggregates, active = self._load_state()
+                with self._lock:
+                    for item_id, ours in self.aggregates.items():
+                        theirs = aggregates.get(item_id)
+                        if theirs is None or (ours.last_ts or 0) >= (theirs.last_ts or 0):
+                            aggregates[item_id] = ours
+                            active[item_id] = self.active.get(item_id, set())
+                    for item_id in self._removed:
+                        aggregates.pop(item_id, None)
+                        active.pop(item_id, None)
+                    data = {
+                        'aggregates': {item_id: item.to_dict() for item_id, item in aggregates.items()},
+                        'active': {item_id: sorted(names) for item_id, names in active.items() if names}
+                    }
+                write_json(self.state_file, data)
+        except Exception as e:
+            self.logger.error(f"Error saving alert state: {e}")
+
+    def _aggregates_for(self, item_id, data_manager):
+        """Aggregates of the history before the price just saved, and that price's timestamp
+
+        The stored runs from the latest one folded in onwards are read on every
+        evaluation; prices saved in between by other processes are replayed.
+        Once per process, and whenever that run is no longer stored, the
+        aggregates are also checked against the whole history and rebuilt if
+        they do not match it.
+        """
+        aggregates = self.aggregates.get(item_id)
+        if aggregates is not None and aggregates.last_ts is not None and item_id in self._checked:
+            timestamps, prices = data_manager.load_price_columns(aggregates.last_ts)
+            if len(timestamps) >= 2 and timestamps[0] == aggregates.last_ts:
+                for timestamp, price in zip(timestamps[1:-1], prices[1:-1]):
+                    self._evaluate(item_id, price, aggregates, timestamp)
+                return aggregates, timestamps[-1]
+        timestamps, prices = data_manager.load_price_columns()
+        previous_ts = timestamps[-2] if len(timestamps) > 1 else None
+        if (aggregates is None or aggregates.count != len(prices) - 1
+                or aggregates.last_ts not in (None, previous_ts)):
+            aggregates = PriceAggregates(self.window_sizes)
+            self.active[item_id] = set()
+            for timestamp, price in zip(timestamps[:-1], prices[:-1]):
+                self._evaluate(item_id, price, aggregates, timestamp)
+            self.aggregates[item_id] = aggregates
+        # State saved before timestamps were kept starts tracking from here
+        aggregates.last_ts = previous_ts
+        self._checked.add(item_id)
+        return aggregates, timestamps[-1] if len(timestamps) else None
+
+    def _evaluate(self, item_id, price, aggregates, timestamp=None):
+        """Rules firing for price, updating the item's active rule states, then fold price in"""
+        active = self.active.setdefault(item_id, set())
+        fired = []
+        for rule in self.rules:
+            if not rule.applies_to(item_id):
+                continue
+            holds, message = rule.holds(price, aggregates)
+            if not holds:
+                active.discard(rule.name)
+                continue
+            if rule.edge_triggered():
+                if rule.name in active:
+                    continue
+                active.add(rule.name)
+            fired.append((rule, message))
+        aggregates.add(price, timestamp)
+        return fired
+
+    def on_price(self, item_id, name, url, price, data_manager):
+        """Evaluate the rules for a newly stored price and fold it into the aggregates"""
+        if not self.rules:
+            return []
+        with self._lock:
+            self._removed.discard(item_id)
+            aggregates, timestamp = self._aggregates_for(item_id, data_manager)
+            alerts = [{
+                'item_id': item_id,
+                'name': name,
+                'url': url,
+                'rule': rule.name,
+                'type': rule.type,
+                'price': price,
+                'message': message,
+                'created_at': datetime.now().isoformat()
+            } for rule, message in self._evaluate(item_id, price, aggregates, timestamp)]
+
+        for alert in alerts:
+            self.dispatcher.submit(alert)
+        return alerts
+
+    def retain(self, item_ids):
+        """Forget the state of items that are no longer tracked"""
+        item_ids = set(item_ids)
+        with self._lock:
+            for item_id in [key for key in self.aggregates if key not in item_ids]:
+                del self.aggregates[item_id]
+                self._removed.add(item_id)
+            for item_id in [key for key in self.active if key not in item_ids]:
+                del self.active[item_id]
+                self._removed.add(item_id)
@@ -0,0 +1,499 @@
+#benchmark.py
+
+from fake_retailer import FakeRetailer, PAGE_KINDS, PRODUCT_IMAGE, product_kind, product_price
+from http_fetcher import SelectorExtractor, SKIP_OUTCOMES, fetch_html
+from scraper import FIND_SELECTORS_SCRIPT
+from thumbnails import FIND_IMAGE_SCRIPT
+import thumbnails
+from datetime import date, timedelta
+import subprocess
+import threading
+import tempfile
+import argparse
+import resource
+import logging
+import shutil
+import json
+import time
+import sys
+import os
+import re
+
+JS_PRICE = re.compile(r'<div id="price-root" data-js-price="([\d.]+)" data-js-delay="(\d+)"></div>')
+
+class SimulatedBrowser:
+    """Stand-in WebDriver that loads pages over HTTP and simulates script-rendered prices
+
+    Pages with a script-inserted price only show it once the page's script
+    delay has passed, as in a real browser. Use --browser firefox to measure
+    with real sessions instead.
+    """
+
+    def __init__(self):
+        self.timeout = 20
+        self.html = ''
+        self.rendered = None
+        self.ready_at = 0
+
+    def set_page_load_timeout(self, timeout):
+        self.timeout = timeout
+
+    def get(self, url):
+        self.rendered = None
+        if url == 'about:blank':
+            self.html = ''
+            return
+        self.html = fetch_html(url, self.timeout)
+        match = JS_PRICE.search(self.html)
+        if match:
+            self.rendered = self.html.replace(
+                match.group(0), f'<div id="price-root"><span class="price">${match.group(1)}</span></div>'
+            )
+            self.ready_at = time.monotonic() + int(match.group(2)) / 1000
+
+    def _page(self):
+        if self.rendered is not None and time.monotonic() >= self.ready_at:
+            return self.rendered
+        return self.html
+
+    @property
+    def title(self):
+        match = re.search(r'<title>(.*?)</title>', self._page())
+        return match.group(1) if match else ''
+
+    def execute_script(self, script, *args):
+        if script == FIND_SELECTORS_SCRIPT:
+            lookups = args[0]
+            extractor = SelectorExtractor([selector for selector, _ in lookups])
+            extractor.feed(self._page())
+            results = []
+            for selector, attribute in lookups:
+                found = extractor.value(selector)
+                if found is None:
+                    results.append(None)
+                else:
+                    text, attrs = found
+                    results.append([text, {'content': attrs.get('content', ''),
+                                           attribute: attrs.get(attribute, '')}])
+            return results
+        if script == FIND_IMAGE_SCRIPT:
+            extractor = SelectorExtractor(['meta[property="og:image"]'])
+            extractor.feed(self._page())
+            found = extractor.value('meta[property="og:image"]')
+            return [found[1].get('content') if found else None, -1]
+        return None
+
+    def get_screenshot_as_png(self):
+        return PRODUCT_IMAGE
+
+    def delete_all_cookies(self):
+        pass
+
+    def quit(self):
+        pass
+
+def percentile(values, q):
+    """Nearest-rank percentile of a list, None when empty"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(q / 100 * len(ordered))) - 1))]
+
+def latency_summary(seconds):
+    """p50/p99/mean in milliseconds"""
+    if not seconds:
+        return {'count': 0}
+    return {
+        'count': len(seconds),
+        'p50_ms': round(percentile(seconds, 50) * 1000, 3),
+        'p99_ms': round(percentile(seconds, 99) * 1000, 3),
+        'mean_ms': round(sum(seconds) / len(seconds) * 1000, 3)
+    }
+
+def io_counters():
+    """Process I/O counters: /proc/self/io where available, else block counts from getrusage"""
+    try:
+        with open('/proc/self/io', 'r') as f:
+            return {key: int(value) for key, value in (line.split(': ') for line in f)}
+    except OSError:
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        return {'inblock': usage.ru_inblock, 'oublock': usage.ru_oublock}
+
+def peak_rss_mb():
+    """Peak resident set size of this process"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+class Phase:
+    """Times a benchmark phase and records its I/O and memory"""
+
+    def __init__(self, report, name):
+        self.report = report
+        self.name = name
+        self.result = {}
+
+    def __enter__(self):
+        self.io_before = io_counters()
+        self.started = time.perf_counter()
+        return self.result
+
+    def __exit__(self, *exc):
+        duration = time.perf_counter() - self.started
+        io_after = io_counters()
+        self.result['duration_s'] = round(duration, 3)
+        self.result['io'] = {key: io_after[key] - self.io_before.get(key, 0) for key in io_after}
+        self.result['peak_rss_mb'] = peak_rss_mb()
+        self.report['phases'][self.name] = self.result
+        logging.getLogger(__name__).warning(f"{self.name}: {duration:.2f}s")
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+class Benchmark:
+    """Runs the tracker against local fake retailers in a scratch directory"""
+
+    def __init__(self, args):
+        self.args = args
+        self.logger = logging.getLogger(__name__)
+        self.report = {
+            'revision': git_revision(),
+            'started_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'config': {key: value for key, value in vars(args).items() if key not in ('output', 'compare')},
+            'phases': {}
+        }
+
+    def run(self):
+        args = self.args
+        # The tracker keeps its files relative to the working directory
+        workdir = tempfile.mkdtemp(prefix='price-tracker-bench-')
+        origin = os.getcwd()
+        retailers = [FakeRetailer(latency_ms=args.latency_ms, js_delay_ms=args.js_delay_ms,
+                                  padding_kb=args.page_kb, validators=not args.no_validators).start()
+                     for _ in range(args.domains)]
+        self.retailers = retailers
+        # The fake retailers serve their product images from loopback
+        thumbnails.ALLOWED_PRIVATE_HOSTS.add('127.0.0.1')
+        try:
+            os.chdir(workdir)
+            os.makedirs('data', exist_ok=True)
+            self.items_config = [{
+                'name': f"Product {n}",
+                'url': retailers[n // len(PAGE_KINDS) % len(retailers)].product_url(n),
+                'status': 'success'
+            } for n in range(args.items)]
+
+            self.seed()
+            tracker = self.build_tracker()
+            self.scrape(tracker)
+            self.rescrape(tracker)
+            self.storage(tracker)
+            self.compact(tracker)
+            self.api(tracker)
+            self.sse(tracker)
+            self.report['retailer_requests'] = sum(retailer.requests for retailer in retailers)
+        finally:
+            os.chdir(origin)
+            for retailer in retailers:
+                retailer.stop()
+            if args.keep:
+                self.report['workdir'] = workdir
+            else:
+                shutil.rmtree(workdir, ignore_errors=True)
+        self.report['peak_rss_mb'] = peak_rss_mb()
+        return self.report
+
+    def _history(self, product_id):
+        """Daily prices up to yesterday, so today's scrape appends a new one"""
+        from price_store import date_to_timestamp
+        today = date.today()
+        return [
+            (date_to_timestamp((today - timedelta(days=days)).isoformat()),
+             product_price(product_id, today - timedelta(days=days)))
+            for days in range(self.args.history_days, 0, -1)
+        ]
+
+    def seed(self):
+        """Write the item configuration and years of price history"""
+        from item_registry import generate_item_id
+        with Phase(self.report, 'seed') as result:
+            if self.args.storage == 'sqlite':
+                from sqlite_storage import SQLiteStorage, SQLiteConfigManager
+                self.sqlite = SQLiteStorage('data/price_tracker.db')
+                self.config_manager = SQLiteConfigManager(self.sqlite)
+                with self.sqlite.batch():
+                    for n, item in enumerate(self.items_config):
+                        item_id = generate_item_id(item['url'])
+                        self.sqlite.write('INSERT INTO prices (item_id, ts, price, last_seen) VALUES (?, ?, ?, ?)',
+                                          [(item_id, ts, price, ts) for ts, price in self._history(n)], many=True)
+            else:
+                from config_manager import ConfigManager
+                from datamanager import PriceDataManager
+                self.sqlite = None
+                self.config_manager = ConfigManager('data/items_config.json', 'data/items_history.json')
+                for n, item in enumerate(self.items_config):
+                    data_manager = PriceDataManager(generate_item_id(item['url']))
+                    data_manager.ensure_files_exist()
+                    data_manager.store.extend(self._history(n))
+            self.config_manager.save_items(self.items_config)
+            result['items'] = len(self.items_config)
+            result['history_rows'] = len(self.items_config) * self.args.history_days
+
+    def build_tracker(self):
+        from tracker import PriceTracker
+        from driver_pool import DriverPool, create_firefox_driver
+        factory = create_firefox_driver if self.args.browser == 'firefox' else SimulatedBrowser
+        pool = DriverPool(max_drivers=self.args.workers, driver_factory=factory)
+        with Phase(self.report, 'startup') as result:
+            tracker = PriceTracker(self.config_manager.load_items(), self.config_manager,
+                                   max_workers=self.args.workers, per_domain_limit=self.args.per_domain,
+                                   driver_pool=pool, storage=self.sqlite,
+                                   page_deadline=self.args.page_deadline)
+            result['items'] = len(tracker.items)
+        return tracker
+
+    def scrape(self, tracker):
+        """PriceTracker.update_all_prices over every page kind"""
+        with Phase(self.report, 'scrape') as result:
+            results = tracker.update_all_prices()
+        run = tracker.last_run_stats
+        durations = [timing['duration'] for timing in run['items'].values()]
+        kinds = {}
+        for n, item in enumerate(self.items_config):
+            from item_registry import generate_item_id
+            entry = kinds.setdefault(product_kind(n), {'items': 0, 'succeeded': 0})
+            entry['items'] += 1
+            entry['succeeded'] += generate_item_id(item['url']) in results
+        result.update({
+            'items': run['total'],
+            'succeeded': run['succeeded'],
+            'items_per_sec': round(run['total'] / result['duration_s'], 2) if result['duration_s'] else None,
+            'latency': latency_summary(durations),
+            'by_kind': kinds,
+            'tiers': tracker.tier_stats.hit_rates()
+        })
+
+    def rescrape(self, tracker):
+        """A second update of the same items, where unchanged pages should skip the parse and render"""
+        before = tracker.fetch_skip_stats()['totals']
+        requests = sum(retailer.requests for retailer in self.retailers)
+        not_modified = sum(retailer.not_modified for retailer in self.retailers)
+        with Phase(self.report, 'rescrape') as result:
+            # Forced, so items failing in the first run are tried again as well
+            tracker.update_prices(list(tracker.items), force=True)
+        run = tracker.last_run_stats
+        after = tracker.fetch_skip_stats()['totals']
+        outcomes = {outcome: count - before.get(outcome, 0) for outcome, count in after.items()
+                    if outcome != 'skip_rate' and count != before.get(outcome, 0)}
+        result.update({
+            'items': run['total'],
+            'succeeded': run['succeeded'],
+            'items_per_sec': round(run['total'] / result['duration_s'], 2) if result['duration_s'] else None,
+            'latency': latency_summary([timing['duration'] for timing in run['items'].values()]),
+            'outcomes': outcomes,
+            'skip_rate': round(sum(outcomes.get(outcome, 0) for outcome in SKIP_OUTCOMES) /
+                               outcomes['checks'], 3) if outcomes.get('checks') else None,
+            'retailer_requests': sum(retailer.requests for retailer in self.retailers) - requests,
+            'not_modified_responses': sum(retailer.not_modified for retailer in self.retailers) - not_modified
+        })
+
+    def storage(self, tracker):
+        """Data manager read paths on tracked items and write paths on scratch items"""
+        sample = list(tracker.items.items())[:self.args.sample]
+        reads = {'load_price_history': [], 'load_price_columns': [], 'load_rollups': [],
+                 'get_latest_price': [], 'load_metadata': []}
+        writes = {'save_price': [], 'save_metadata': []}
+        with Phase(self.report, 'storage') as result:
+            for item_id, item in sample:
+                data_manager = item['data_manager']
+                for name in reads:
+                    call = getattr(data_manager, name)
+                    start = time.perf_counter()
+                    call('week') if name == 'load_rollups' else call()
+                    reads[name].append(time.perf_counter() - start)
+
+            for n in range(len(sample)):
+                data_manager = tracker._create_data_manager(f"bench-write-{n}")
+                for name, value in (('save_price', 10.0 + n), ('save_metadata', {'title': f"Write {n}"})):
+                    start = time.perf_counter()
+                    getattr(data_manager, name)(value)
+                    writes[name].append(time.perf_counter() - start)
+            result['reads'] = {name: latency_summary(values) for name, values in reads.items()}
+            result['writes'] = {name: latency_summary(values) for name, values in writes.items()}
+
+    def compact(self, tracker):
+        """Rolling seeded history past the retention tiers into daily and weekly summaries"""
+        with Phase(self.report, 'compact') as result:
+            summary = tracker.compact_history()
+            result.update({key: value for key, value in summary.items() if key not in ('duration', 'finished_at')})
+
+    def _dashboard(self, tracker):
+        from dashboard import Dashboard
+
+        class BenchDashboard(Dashboard):
+            def setup_scheduler(self):
+                """No background scrapes while measuring"""
+
+        dashboard = BenchDashboard(tracker, self.config_manager)
+        dashboard.sse_heartbeat_seconds = 1
+        return dashboard
+
+    def _timed_get(self, client, path, headers=None):
+        start = time.perf_counter()
+        response = client.get(path, headers=headers or {})
+        return time.perf_counter() - start, response
+
+    def api(self, tracker):
+        """Flask listing, summary and history endpoints through the test client"""
+        self.dashboard = self._dashboard(tracker)
+        client = self.dashboard.app.test_client()
+        result_endpoints = {}
+        with Phase(self.report, 'api') as result:
+            if not self.args.skip_full_items:
+                timings, size, etag = [], 0, None
+                for _ in range(self.args.repeat):
+                    elapsed, response = self._timed_get(client, '/api/items')
+                    timings.append(elapsed)
+                    size, etag = len(response.data), response.headers.get('ETag')
+                not_modified = [self._timed_get(client, '/api/items', {'If-None-Match': etag})[0]
+                                for _ in range(self.args.repeat)]
+                result_endpoints['/api/items'] = {**latency_summary(timings), 'bytes': size}
+                result_endpoints['/api/items (304)'] = latency_summary(not_modified)
+
+            timings, size = [], 0
+            pages = max(1, -(-len(tracker.items) // 20))
+            for page in range(1, min(pages, self.args.sample) + 1):
+                elapsed, response = self._timed_get(client, f'/api/items/summary?page={page}&per_page=20')
+                timings.append(elapsed)
+                size = max(size, len(response.data))
+            result_endpoints['/api/items/summary'] = {**latency_summary(timings), 'bytes': size}
+
+            timings, size = [], 0
+            for item_id in list(tracker.items)[:self.args.sample]:
+                elapsed, response = self._timed_get(client, f'/api/items/{item_id}/history?points=300')
+                timings.append(elapsed)
+                size = max(size, len(response.data))
+            result_endpoints['/api/items/<id>/history'] = {**latency_summary(timings), 'bytes': size}
+            result['endpoints'] = result_endpoints
+
+    def sse(self, tracker):
+        """Fan-out latency of status changes to concurrent /api/status/stream clients"""
+        client_count, event_count = self.args.sse_clients, self.args.sse_events
+        published = {}
+        latencies = []
+        lock = threading.Lock()
+        ready = threading.Barrier(client_count + 1)
+
+        def consume():
+            client = self.dashboard.app.test_client()
+            response = client.get('/api/status/stream', buffered=False)
+            connected, seen, buffer = False, 0, ''
+            try:
+                for chunk in response.response:
+                    buffer += chunk.decode() if isinstance(chunk, bytes) else chunk
+                    while '\n\n' in buffer:
+                        message, buffer = buffer.split('\n\n', 1)
+                        data = [line[6:] for line in message.split('\n') if line.startswith('data: ')]
+                        if not data:
+                            continue
+                        if not connected:
+                            # The first message is the status snapshot
+                            connected = True
+                            ready.wait(timeout=30)
+                            continue
+                        received = time.perf_counter()
+                        for url in json.loads(data[0]):
+                            if url in published:
+                                with lock:
+                                    latencies.append(received - published[url])
+                                seen += 1
+                        if seen >= event_count:
+                            return
+            finally:
+                response.close()
+
+        with Phase(self.report, 'sse') as result:
+            threads = [threading.Thread(target=consume, daemon=True) for _ in range(client_count)]
+            for thread in threads:
+                thread.start()
+            ready.wait(timeout=30)
+            for n in range(event_count):
+                url = f"bench://status/{n}"
+                published[url] = time.perf_counter()
+                tracker.status_bus.publish_status(url, 'checking')
+                time.sleep(0.001)
+            for thread in threads:
+                thread.join(timeout=30)
+            result.update({'clients': client_count, 'events': event_count,
+                           'delivered': len(latencies), 'latency': latency_summary(latencies)})
+
+def compare(report, baseline):
+    """Print relative changes of the headline numbers against a previous report"""
+    def headline(data):
+        phases = data['phases']
+        values = {'peak_rss_mb': data.get('peak_rss_mb')}
+        scrape = phases.get('scrape', {})
+        values['scrape.items_per_sec'] = scrape.get('items_per_sec')
+        values['scrape.p50_ms'] = scrape.get('latency', {}).get('p50_ms')
+        values['scrape.p99_ms'] = scrape.get('latency', {}).get('p99_ms')
+        values['rescrape.items_per_sec'] = phases.get('rescrape', {}).get('items_per_sec')
+        values['rescrape.skip_rate'] = phases.get('rescrape', {}).get('skip_rate')
+        for name, phase in phases.items():
+            values[f'{name}.duration_s'] = phase.get('duration_s')
+        for name, endpoint in phases.get('api', {}).get('endpoints', {}).items():
+            values[f'api {name}.p50_ms'] = endpoint.get('p50_ms')
+        return values
+
+    old, new = headline(baseline), headline(report)
+    print(f"{'metric':<45} {'baseline':>12} {'current':>12} {'change':>8}")
+    for key in new:
+        before, after = old.get(key), new[key]
+        change = f"{(after - before) / before * 100:+.1f}%" if before and after is not None else ''
+        print(f"{key:<45} {before if before is not None else '-':>12} {after if after is not None else '-':>12} {change:>8}")
+
+def main():
+    """Benchmark scraping, storage and the dashboard API against local fake retailers"""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument('--items', type=int, default=100, help='tracked items (10 to 10000)')
+    parser.add_argument('--history-days', type=int, default=365 * 3, help='days of seeded history per item')
+    parser.add_argument('--storage', choices=['files', 'sqlite'], default='files')
+    parser.add_argument('--browser', choices=['simulated', 'firefox'], default='simulated',
+                        help='simulated loads pages over HTTP; firefox uses real headless sessions')
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--per-domain', type=int, default=4)
+    parser.add_argument('--domains', type=int, default=4, help='fake retailers, one port each')
+    parser.add_argument('--latency-ms', type=int, default=20, help='added to every fake retailer response')
+    parser.add_argument('--js-delay-ms', type=int, default=300)
+    parser.add_argument('--page-kb', type=int, default=50, help='filler per product page')
+    parser.add_argument('--no-validators', action='store_true',
+                        help='fake retailers send no ETag or Last-Modified, leaving only body hashes')
+    parser.add_argument('--page-deadline', type=float, default=3, help='seconds before a missing price fails')
+    parser.add_argument('--sample', type=int, default=200, help='items used for storage and API timings')
+    parser.add_argument('--repeat', type=int, default=3, help='requests per full /api/items timing')
+    parser.add_argument('--skip-full-items', action='store_true', help='skip the full /api/items payload')
+    parser.add_argument('--sse-clients', type=int, default=10)
+    parser.add_argument('--sse-events', type=int, default=50)
+    parser.add_argument('--keep', action='store_true', help='keep the scratch directory')
+    parser.add_argument('--output', help='write the JSON report here instead of stdout')
+    parser.add_argument('--compare', help='previous JSON report to compare against')
+    args = parser.parse_args()
+    # Benchmark progress only; the tracker's own INFO logging would dominate the run
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(message)s')
+    logging.getLogger('driver_pool').setLevel(logging.ERROR)
+
+    report = Benchmark(args).run()
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=4)
+    else:
+        print(json.dumps(report, indent=4))
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            compare(report, json.load(f))
+
+if __name__ == "__main__":
+    main()
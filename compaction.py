@@ -0,0 +1,103 @@
+#compaction.py
+
+from price_history import period_start
+from metrics import get_default_metrics
+import threading
+import argparse
+import logging
+import glob
+import time
+import os
+
+class PriceCompactor:
+    """Bounds stored price history as scrapes become more frequent
+
+    Every price change is kept for raw_days. Older runs are reduced to the
+    open, high, low and close runs of each day, and after daily_days to those
+    of each week, so storage and query cost grow with days tracked rather
+    than with observations.
+    """
+
+    def __init__(self, raw_days=14, daily_days=365):
+        """
+        raw_days: days every observed price change is kept
+        daily_days: days daily summaries are kept before they are reduced to weekly ones
+        """
+        self.raw_days = raw_days
+        self.daily_days = max(daily_days, raw_days)
+        self.logger = logging.getLogger(__name__)
+        self.metrics = get_default_metrics()
+        self.last_run = None
+        self._lock = threading.Lock()
+
+    def cutoffs(self, now=None):
+        """(raw_before, daily_before) timestamps, on day and week boundaries so no bucket is split"""
+        now = now or time.time()
+        return (period_start(now - self.raw_days * 86400, 'day'),
+                period_start(now - self.daily_days * 86400, 'week'))
+
+    def run(self, items, now=None):
+        """Compact the history of every item in an {item_id: item} dict; returns the run summary"""
+        if not self._lock.acquire(blocking=False):
+            self.logger.info("Compaction already running, skipped")
+            return None
+        try:
+            raw_before, daily_before = self.cutoffs(now)
+            start = time.monotonic()
+            summary = {'items': 0, 'compacted_items': 0, 'records_before': 0, 'records_after': 0}
+            for item_id, item in items.items():
+                before, after = item['data_manager'].compact(raw_before, daily_before)
+                summary['items'] += 1
+                summary['compacted_items'] += after < before
+                summary['records_before'] += before
+                summary['records_after'] += after
+            removed = summary['records_before'] - summary['records_after']
+            self.metrics.inc('price_records_compacted_total', removed)
+            self.last_run = {
+                **summary,
+                'raw_before': raw_before,
+                'daily_before': daily_before,
+                'finished_at': time.time(),
+                'duration': round(time.monotonic() - start, 3)
+            }
+            self.logger.info(
+                f"Compacted {summary['compacted_items']} of {summary['items']} price histories, "
+                f"removing {removed} records in {self.last_run['duration']:.1f}s"
+            )
+            return self.last_run
+        finally:
+            self._lock.release()
+
+    def policy(self):
+        """Retention settings and the latest run, for the dashboard API"""
+        return {'raw_days': self.raw_days, 'daily_days': self.daily_days, 'last_run': self.last_run}
+
+def main():
+    """Compact every stored price history, including those of removed items"""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument('--storage', choices=['files', 'sqlite'], default='files',
+                        help='per-item files under data/ or a single SQLite database')
+    parser.add_argument('--db', default='data/price_tracker.db',
+                        help='SQLite database path when --storage sqlite is used')
+    parser.add_argument('--raw-days', type=int, default=14, help='days every price change is kept')
+    parser.add_argument('--daily-days', type=int, default=365,
+                        help='days daily summaries are kept before weekly ones replace them')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    compactor = PriceCompactor(args.raw_days, args.daily_days)
+    if args.storage == 'sqlite':
+        from sqlite_storage import SQLiteStorage, SQLitePriceDataManager
+        storage = SQLiteStorage(args.db)
+        item_ids = [row[0] for row in storage.query('SELECT DISTINCT item_id FROM prices')]
+        items = {item_id: {'data_manager': SQLitePriceDataManager(item_id, storage)} for item_id in item_ids}
+    else:
+        from datamanager import PriceDataManager
+        item_ids = [os.path.basename(path)[:-len('_prices.bin')] for path in sorted(glob.glob('data/*_prices.bin'))]
+        items = {item_id: {'data_manager': PriceDataManager(item_id)} for item_id in item_ids}
+    summary = compactor.run(items)
+    print(f"Compacted {summary['compacted_items']} of {summary['items']} price histories: "
+          f"{summary['records_before']} records became {summary['records_after']}")
+
+if __name__ == "__main__":
+    main()
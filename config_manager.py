@@ -3,16 +3,34 @@
 import json
 import os
 import logging
+import tempfile
+import threading
+import atexit
 from datetime import datetime
+from item_registry import ItemRegistry
 
 class ConfigManager:
     """Manages item configurations for price tracking"""
     
-    def __init__(self, config_file='data/items_config.json', history_file='data/items_history.json'):
+    def __init__(self, config_file='data/items_config.json', history_file='data/items_history.json',
+                 flush_delay=1.0):
+        """
+        config_file: JSON file with the tracked items
+        history_file: JSON file with removed items
+        flush_delay: seconds status changes are held in memory before being written
+        """
         self.config_file = config_file
         self.history_file = history_file
+        self.flush_delay = flush_delay
         self.logger = logging.getLogger(__name__)
+        self._lock = threading.RLock()
+        self.registry = ItemRegistry()
+        self._items_mtime = None
+        self._history_mtime = None
+        self._items_dirty = False
+        self._flush_timer = None
         self.ensure_config_files()
+        atexit.register(self.flush)
         
     def ensure_config_files(self):
         """Create config and history files if they don't exist"""
@@ -21,121 +39,180 @@ class ConfigManager:
             self.save_items([])
         if not os.path.exists(self.history_file):
             self.save_history([])
-            
-    def load_items(self):
-        """Load items configuration from file"""
+
+    def _mtime(self, path):
         try:
-            with open(self.config_file, 'r') as f:
-                return json.load(f)
-        except Exception as e:
-            self.logger.error(f"Error loading config: {e}")
-            return []
-            
-    def load_history(self):
-        """Load removed items history from file"""
+            return os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+
+    def _write_json(self, path, data):
+        """Write JSON atomically so readers never see a half-written file"""
+        directory = os.path.dirname(path) or '.'
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-', suffix='.json')
         try:
-            with open(self.history_file, 'r') as f:
-                return json.load(f)
-        except Exception as e:
-            self.logger.error(f"Error loading history: {e}")
-            return []
+            with os.fdopen(fd, 'w') as f:
+                json.dump(data, f, indent=4)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
             
-    def save_items(self, items):
-        """Save items configuration to file"""
+    def _refresh(self):
+        """Reload either file into the registry if it changed on disk"""
+        items_mtime = self._mtime(self.config_file)
+        if not self._items_dirty and items_mtime != self._items_mtime:
+            try:
+                with open(self.config_file, 'r') as f:
+                    self.registry.load_items(json.load(f))
+                self._items_mtime = items_mtime
+            except Exception as e:
+                self.logger.error(f"Error loading config: {e}")
+        history_mtime = self._mtime(self.history_file)
+        if history_mtime != self._history_mtime:
+            try:
+                with open(self.history_file, 'r') as f:
+                    self.registry.load_history(json.load(f))
+                self._history_mtime = history_mtime
+            except Exception as e:
+                self.logger.error(f"Error loading history: {e}")
+
+    def _write_items(self):
+        """Write the registry's active items to file"""
         try:
-            with open(self.config_file, 'w') as f:
-                json.dump(items, f, indent=4)
+            self._write_json(self.config_file, self.registry.items())
+            self._items_mtime = self._mtime(self.config_file)
+            self._items_dirty = False
             return True
         except Exception as e:
             self.logger.error(f"Error saving config: {e}")
+            # Fall back to what is on disk on the next read
+            self._items_mtime = None
             return False
-            
-    def save_history(self, history):
-        """Save removed items history to file"""
+
+    def _write_history(self):
+        """Write the registry's removed items to file"""
         try:
-            with open(self.history_file, 'w') as f:
-                json.dump(history, f, indent=4)
+            self._write_json(self.history_file, self.registry.history())
+            self._history_mtime = self._mtime(self.history_file)
             return True
         except Exception as e:
             self.logger.error(f"Error saving history: {e}")
+            self._history_mtime = None
             return False
             
+    def load_items(self):
+        """Load items configuration, from memory unless the file changed on disk"""
+        with self._lock:
+            self._refresh()
+            return self.registry.items()
+            
+    def load_history(self):
+        """Load removed items history, from memory unless the file changed on disk"""
+        with self._lock:
+            self._refresh()
+            return self.registry.history()
+            
+    def save_items(self, items):
+        """Save items configuration to file"""
+        with self._lock:
+            self.registry.load_items(items)
+            return self._write_items()
+            
+    def save_history(self, history):
+        """Save removed items history to file"""
+        with self._lock:
+            self.registry.load_history(history)
+            return self._write_history()
+
+    def update_status(self, url, status):
+        """Record an item's status in memory, written out on the next debounced flush"""
+        with self._lock:
+            self._refresh()
+            if not self.registry.set_status(url, status):
+                return
+            self._items_dirty = True
+            if self._flush_timer is None:
+                self._flush_timer = threading.Timer(self.flush_delay, self.flush)
+                self._flush_timer.daemon = True
+                self._flush_timer.start()
+
+    def flush(self):
+        """Write pending status changes to file"""
+        with self._lock:
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+            if self._items_dirty:
+                return self._write_items()
+            return True
+
+    def find_item(self, url):
+        """Get the tracked entry for url (or an equivalent URL), or None"""
+        with self._lock:
+            self._refresh()
+            item = self.registry.get(url)
+            return dict(item) if item else None
+            
     def add_item(self, name, url):
         """Add a new item to track"""
-        items = self.load_items()
-        
-        # Check if URL already exists
-        if any(item['url'] == url for item in items):
-            return False, "URL already being tracked"
+        with self._lock:
+            self._refresh()
             
-        # Add new item
-        items.append({
-            'name': name,
-            'url': url,
-            'status': 'checking'
-        })
-        
-        if self.save_items(items):
-            return True, "Item added successfully"
-        return False, "Error saving item"
+            # Check if URL already exists
+            if self.registry.is_tracked(url):
+                return False, "URL already being tracked"
+                
+            # Add new item
+            self.registry.add({
+                'name': name,
+                'url': url,
+                'status': 'checking'
+            })
+            
+            if self._write_items():
+                return True, "Item added successfully"
+            return False, "Error saving item"
         
     def remove_item(self, url):
         """Remove an item from tracking and add to history"""
-        items = self.load_items()
-        history = self.load_history()
-        
-        # Find and remove item
-        removed_items = [item for item in items if item['url'] == url]
-        if not removed_items:
-            return False, "Item not found"
+        with self._lock:
+            self._refresh()
             
-        removed_item = removed_items[0]
-        items = [item for item in items if item['url'] != url]
-        
-        # Add to history with timestamp
-        history_entry = {
-            **removed_item,
-            'removed_at': datetime.now().isoformat()
-        }
-        history.append(history_entry)
-        
-        if self.save_items(items) and self.save_history(history):
-            return True, "Item removed successfully"
-        return False, "Error removing item"
+            # Move item to history with timestamp
+            removed_item = self.registry.remove(url, removed_at=datetime.now().isoformat())
+            if removed_item is None:
+                return False, "Item not found"
+            
+            if self._write_items() and self._write_history():
+                return True, "Item removed successfully"
+            return False, "Error removing item"
 
     def restore_item(self, url):
         """Restore an item from history back to active tracking"""
-        items = self.load_items()
-        history = self.load_history()
-        
-        # Check if URL already exists in active items
-        if any(item['url'] == url for item in items):
-            return False, "URL already being tracked"
-        
-        # Find item in history
-        restored_items = [item for item in history if item['url'] == url]
-        if not restored_items:
-            self.logger.warning(f"Attempted to restore non-existent item: {url}")
-            return False, "Item not found in history"
-        
-        restored_item = restored_items[0]
-        # Remove removed_at field before adding back to items
-        restored_item.pop('removed_at', None)
-        restored_item['status'] = 'checking'
-        
-        # Add to items
-        items.append(restored_item)
-        
-        # Remove from history
-        history = [item for item in history if item['url'] != url]
-        
-        # Save both files
-        if self.save_items(items) and self.save_history(history):
-            self.logger.info(f"Successfully restored item: {url}")
-            return True, "Item restored successfully"
-        
-        self.logger.error(f"Error saving during item restoration.")
-        return False, "Error restoring item"
+        with self._lock:
+            self._refresh()
+            
+            # Check if URL already exists in active items
+            if self.registry.is_tracked(url):
+                return False, "URL already being tracked"
+            
+            # Move item back from history, dropping its removed_at field
+            restored_item = self.registry.restore(url, status='checking')
+            if restored_item is None:
+                self.logger.warning(f"Attempted to restore non-existent item: {url}")
+                return False, "Item not found in history"
+            
+            # Save both files
+            if self._write_items() and self._write_history():
+                self.logger.info(f"Successfully restored item: {url}")
+                return True, "Item restored successfully"
+            
+            self.logger.error(f"Error saving during item restoration.")
+            return False, "Error restoring item"
         
     def get_items(self):
         """Get all tracked items"""
@@ -143,4 +220,4 @@ class ConfigManager:
         
     def get_history(self):
         """Get all removed items"""
-        return self.load_history()
\ No newline at end of file
+        return self.load_history()
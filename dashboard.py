@@ -1,10 +1,27 @@
 #dashboard.py
 
 from flask import Flask, render_template, jsonify, send_from_directory, request, Response
-from apscheduler.schedulers.background import BackgroundScheduler
+from jobs import JobQueue
+from scrape_scheduler import AdaptiveScheduler
+from item_registry import normalize_url
+from price_history import DOWNSAMPLERS, PERIODS, parse_timestamp
+import hashlib
 import json
 import time
 
+SUMMARY_SORT_KEYS = {
+    'name': lambda summary: summary['name'].lower(),
+    'price': lambda summary: summary['latest_price'],
+    'change': lambda summary: summary['change_pct'],
+    'updated': lambda summary: summary['latest_at']
+}
+
+CHANGE_FILTERS = {
+    'down': lambda delta: delta is not None and delta < 0,
+    'up': lambda delta: delta is not None and delta > 0,
+    'unchanged': lambda delta: delta == 0
+}
+
 class Dashboard:
     """Flask application for the dashboard"""
     
@@ -12,52 +29,173 @@ class Dashboard:
         self.app = Flask(__name__, static_folder='static')
         self.tracker = tracker
         self.config_manager = config_manager
+        self.sse_heartbeat_seconds = 15
+        self.sse_retry_ms = 3000
+        self.thumbnail_max_age = 365 * 24 * 3600
+        self.jobs = JobQueue(self._run_scrape_job, tracker.status_bus)
         self.setup_routes()
         self.setup_scheduler()
         
     def setup_scheduler(self):
-        """Setup automated price updates"""
+        """Setup automated price updates, checking every minute for items that are due, and history compaction"""
+        # Imported here, off the module import path
+        from apscheduler.schedulers.background import BackgroundScheduler
+        self.scrape_scheduler = AdaptiveScheduler(self.tracker)
         scheduler = BackgroundScheduler()
-        scheduler.add_job(self.tracker.update_all_prices, 'cron', hour=0)
+        scheduler.add_job(self.scrape_scheduler.tick, 'interval', minutes=1,
+                          max_instances=1, coalesce=True)
+        scheduler.add_job(self.tracker.compact_history, 'interval', hours=6,
+                          max_instances=1, coalesce=True)
         scheduler.start()
 
+    def _run_scrape_job(self, item_ids, on_progress):
+        """Scrape the items of a queued job and summarize the outcome"""
+        start = time.monotonic()
+        # Jobs are requested by the user, so they run even for items in backoff
+        results = self.tracker.update_prices(item_ids, on_progress, force=True)
+        return {
+            'updated': [item_id for item_id in item_ids if item_id in results],
+            'failed': [item_id for item_id in item_ids if item_id not in results],
+            'duration': round(time.monotonic() - start, 3)
+        }
+
+    def _queue_scrape(self, url, item_ids):
+        """Queue a scrape of newly tracked items, collapsing repeats for the same URL"""
+        job, _ = self.jobs.submit('scrape', normalize_url(url), item_ids)
+        return job.id
+
     def setup_routes(self):
         """Setup Flask routes"""
         
-        def generate_status():
-            # Capture config_manager reference
-            config_manager = self.config_manager
-            while True:
-                # Get latest status for all items
-                config_items = config_manager.get_items()
-                statuses = {item['url']: item.get('status', 'checking') 
-                        for item in config_items}
-                
-                # Format as SSE data
-                data = f"data: {json.dumps(statuses)}\n\n"
-                yield data
-                time.sleep(1)  # Check every second
-        
         @self.app.route('/')
         def index():
             return render_template('dashboard.html')
     
         @self.app.route('/api/status/stream')
-        def status_stream_endpoint():
-            """SSE endpoint for status updates"""
+        def status_stream():
+            """SSE endpoint pushing status changes as they are published"""
+            last_event_id = request.headers.get('Last-Event-ID', request.args.get('lastEventId'))
             return Response(
-                generate_status(),
+                self._generate_status_events(last_event_id),
                 mimetype='text/event-stream',
                 headers={
                     'Cache-Control': 'no-cache',
                     'Connection': 'keep-alive'
                 }
             )
-                
+
         @self.app.route('/api/items')
         def get_items():
-            """Get all items data"""
-            return jsonify(self.tracker.get_all_items())
+            """Get all items data, answering 304 when the client copy is current"""
+            etag = self.tracker.get_items_etag()
+            if request.if_none_match.contains(etag):
+                response = Response(status=304)
+            else:
+                response = jsonify(self.tracker.get_all_items())
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = 'no-cache'
+            return response
+
+        @self.app.route('/api/items/summary')
+        def get_item_summaries():
+            """One page of item summaries, filtered by name, status and price change"""
+            try:
+                page = max(1, int(request.args.get('page', 1)))
+                per_page = max(1, min(int(request.args.get('per_page', 20)), 200))
+            except ValueError:
+                return jsonify({'success': False, 'message': 'Invalid page or per_page'}), 400
+            sort = request.args.get('sort', '')
+            change = request.args.get('change', '')
+            if sort and sort.lstrip('-') not in SUMMARY_SORT_KEYS or change and change not in CHANGE_FILTERS:
+                return jsonify({'success': False, 'message': 'Invalid sort or change filter'}), 400
+
+            summaries = self._filter_summaries(
+                self.tracker.get_item_summaries(),
+                request.args.get('q', '').strip().lower(),
+                request.args.get('status', ''),
+                change
+            )
+            if sort:
+                key = SUMMARY_SORT_KEYS[sort.lstrip('-')]
+                # Items without a value sort last in either direction
+                present = [summary for summary in summaries if key(summary) is not None]
+                missing = [summary for summary in summaries if key(summary) is None]
+                summaries = sorted(present, key=key, reverse=sort.startswith('-')) + missing
+
+            etag = hashlib.md5(json.dumps([summaries, page, per_page]).encode()).hexdigest()
+            if request.if_none_match.contains(etag):
+                response = Response(status=304)
+            else:
+                response = jsonify({
+                    'items': summaries[(page - 1) * per_page:page * per_page],
+                    'page': page,
+                    'per_page': per_page,
+                    'total': len(summaries),
+                    'pages': max(1, -(-len(summaries) // per_page))
+                })
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = 'no-cache'
+            return response
+
+        @self.app.route('/api/items/<item_id>/history')
+        def get_item_history(item_id):
+            """Price history of one item as columnar arrays, filtered by from/to and downsampled"""
+            try:
+                start = parse_timestamp(request.args.get('from'))
+                end = parse_timestamp(request.args.get('to'))
+                points = max(3, min(int(request.args.get('points', 500)), 5000))
+            except ValueError:
+                return jsonify({'success': False, 'message': 'Invalid from, to or points'}), 400
+            method = request.args.get('method', 'lttb')
+            resolution = request.args.get('resolution', 'auto')
+            if method not in DOWNSAMPLERS or resolution not in ('auto', 'raw') + PERIODS:
+                return jsonify({'success': False, 'message': 'Invalid method or resolution'}), 400
+            if item_id not in self.tracker.items:
+                return jsonify({'success': False, 'message': 'Item not found'}), 404
+
+            revision = self.tracker.items[item_id]['data_manager'].get_revision()
+            etag = hashlib.md5(repr((revision, sorted(request.args.items()))).encode()).hexdigest()
+            if request.if_none_match.contains(etag):
+                response = Response(status=304)
+            else:
+                response = jsonify(self.tracker.get_price_history(
+                    item_id, start, end, points, method, resolution
+                ))
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = 'no-cache'
+            return response
+
+        @self.app.route('/metrics')
+        def get_metrics():
+            """Scrape, storage, pool and cache metrics in Prometheus text format"""
+            return Response(self.tracker.metrics.render(), mimetype='text/plain; version=0.0.4')
+
+        @self.app.route('/api/cache/stats')
+        def get_cache_stats():
+            """Get item cache hit/miss statistics"""
+            return jsonify(self.tracker.cache.stats())
+
+        @self.app.route('/api/scrape/health')
+        def get_scrape_health():
+            """Items in retry backoff and the circuit breaker state of failing domains"""
+            return jsonify(self.tracker.resilience.stats())
+
+        @self.app.route('/api/scrape/skips')
+        def get_scrape_skips():
+            """Per-item counts of unchanged pages and the share of checks that skipped a full scrape"""
+            return jsonify(self.tracker.fetch_skip_stats())
+
+        @self.app.route('/api/storage/compaction')
+        def get_compaction():
+            """History retention settings and the outcome of the latest compaction run"""
+            return jsonify(self.tracker.compactor.policy())
+
+        @self.app.route('/api/workers')
+        def get_workers():
+            """Work queue task counts and live scrape workers, when scraping runs in worker processes"""
+            if self.tracker.coordinator is None:
+                return jsonify({'success': False, 'message': 'Scrapes run in the dashboard process'}), 404
+            return jsonify(self.tracker.coordinator.queue.stats())
             
         @self.app.route('/api/config/items')
         def get_config_items():
@@ -69,25 +207,25 @@ class Dashboard:
             """Add new item to track"""
             data = request.json
             success, message = self.config_manager.add_item(data['name'], data['url'])
+            job_id = None
             if success:
-                # Reinitialize tracker with new configuration
-                items = self.config_manager.get_items()
-                self.tracker.update_configuration(items)
-                # Update prices immediately for the new item
-                self.tracker.update_all_prices()
-            return jsonify({'success': success, 'message': message})
-            
+                # Add the new item to the tracker and queue a scrape of it
+                added_ids, _ = self.tracker.update_configuration(self.config_manager.get_items())
+                job_id = self._queue_scrape(data['url'], added_ids)
+            else:
+                # A repeated add of a URL still being scraped reports the existing job
+                job = self.jobs.find_active(normalize_url(data['url']))
+                job_id = job.id if job else None
+            return jsonify({'success': success, 'message': message, 'job_id': job_id})
+
         @self.app.route('/api/config/remove', methods=['POST'])
         def remove_item():
             """Remove item from tracking"""
             data = request.json
             success, message = self.config_manager.remove_item(data['url'])
             if success:
-                # Reinitialize tracker with new configuration
-                items = self.config_manager.get_items()
-                self.tracker.update_configuration(items)
-                # Update prices immediately for the new item
-                #self.tracker.update_all_prices()
+                # Drop the removed item from the tracker
+                self.tracker.update_configuration(self.config_manager.get_items())
             return jsonify({'success': success, 'message': message})
             
         @self.app.route('/api/history')
@@ -100,17 +238,45 @@ class Dashboard:
             """Restore an item from history"""
             data = request.json
             success, message = self.config_manager.restore_item(data['url'])
+            job_id = None
             if success:
-                # Reinitialize tracker with new configuration
-                items = self.config_manager.get_items()
-                self.tracker.update_configuration(items)
-                # Update prices immediately for the restored item
-                self.tracker.update_all_prices()
-            return jsonify({'success': success, 'message': message})
+                # Add the restored item back and queue a scrape of only it
+                added_ids, _ = self.tracker.update_configuration(self.config_manager.get_items())
+                job_id = self._queue_scrape(data['url'], added_ids)
+            return jsonify({'success': success, 'message': message, 'job_id': job_id})
+
+        @self.app.route('/api/jobs')
+        def list_jobs():
+            """Get all recent jobs"""
+            return jsonify([job.to_dict() for job in self.jobs.list()])
+
+        @self.app.route('/api/jobs/<job_id>')
+        def get_job(job_id):
+            """Get a job's status and progress"""
+            job = self.jobs.get(job_id)
+            if job is None:
+                return jsonify({'success': False, 'message': 'Job not found'}), 404
+            return jsonify(job.to_dict())
+
+        @self.app.route('/api/jobs/<job_id>/result')
+        def get_job_result(job_id):
+            """Get a finished job's result"""
+            job = self.jobs.get(job_id)
+            if job is None:
+                return jsonify({'success': False, 'message': 'Job not found'}), 404
+            return jsonify(job.to_dict(include_result=True))
             
         @self.app.route('/static/<path:filename>')
         def serve_static(filename):
             return send_from_directory('static', filename)
+
+        @self.app.route('/static/thumbnails/<path:filename>')
+        def serve_thumbnail(filename):
+            """Thumbnails are named by content hash, so they can be cached indefinitely"""
+            response = send_from_directory(self.tracker.thumbnails.root, filename,
+                                           max_age=self.thumbnail_max_age)
+            response.cache_control.immutable = True
+            return response
         
         @self.app.route('/api/status')
         def get_status():
@@ -127,30 +293,50 @@ class Dashboard:
                 except Exception as e:
                     statuses[item['scraper'].url] = 'error'
             return jsonify(statuses)
-            
-        @self.app.route('/api/status/stream')
-        def stream_status():
-            """SSE endpoint for status updates"""
-            def generate_status():
-                while True:
-                    # Get latest status for all items
-                    config_items = self.config_manager.get_items()
-                    statuses = {item['url']: item.get('status', 'checking') 
-                            for item in config_items}
-                    
-                    # Format as SSE data
-                    data = f"data: {json.dumps(statuses)}\n\n"
-                    yield data
-                    time.sleep(1)  # Check every second
 
-            return Response(
-                generate_status(),
-                mimetype='text/event-stream',
-                headers={
-                    'Cache-Control': 'no-cache',
-                    'Connection': 'keep-alive'
-                }
-            )            
+    def _filter_summaries(self, summaries, query='', status='', change=''):
+        """Summaries matching a name/title/URL substring, a status and a change direction"""
+        def matches(summary):
+            if query and not any(query in (summary.get(field) or '').lower()
+                                 for field in ('name', 'title', 'url')):
+                return False
+            if status and summary['status'] != status:
+                return False
+            if change and not CHANGE_FILTERS[change](summary['change']):
+                return False
+            return True
+        return [summary for summary in summaries if matches(summary)]
+
+    def _generate_status_events(self, last_event_id=None):
+        """Yield SSE messages from the status bus: a snapshot or resumed deltas, then live deltas"""
+        bus = self.tracker.status_bus
+        yield f"retry: {self.sse_retry_ms}\n\n"
+
+        events = None
+        if last_event_id and last_event_id.isdigit():
+            events = bus.events_since(int(last_event_id))
+        if events is None:
+            # New client, or it missed more than the bus remembers
+            last_id, statuses = bus.snapshot()
+            yield f"id: {last_id}\ndata: {json.dumps(statuses)}\n\n"
+            events = []
+        else:
+            last_id = int(last_event_id)
+
+        while True:
+            for event_id, event_type, payload in events:
+                last_id = event_id
+                if event_type == 'status':
+                    yield f"id: {event_id}\ndata: {json.dumps(payload)}\n\n"
+                else:
+                    yield f"id: {event_id}\nevent: {event_type}\ndata: {json.dumps(payload)}\n\n"
+            events = bus.wait(last_id, self.sse_heartbeat_seconds)
+            if events is None:
+                last_id, statuses = bus.snapshot()
+                yield f"id: {last_id}\ndata: {json.dumps(statuses)}\n\n"
+                events = []
+            elif not events:
+                yield ": heartbeat\n\n"
 
     def run(self, host='0.0.0.0', port=5000):
         """Run the Flask application"""
@@ -1,8 +1,11 @@
 #data_manager.py
 
-import csv
 import json
-from datetime import datetime
+from price_store import PriceStore, import_csv, export_csv, timestamp_to_date, timestamp_to_time
+from price_history import Rollups, compact_runs
+from metrics import timed
+import threading
+import time
 import os
 import logging
 
@@ -12,70 +15,202 @@ class PriceDataManager:
     def __init__(self, item_id):
         self.item_id = item_id
         self.data_dir = "data"
-        os.makedirs(self.data_dir, exist_ok=True)
         self.price_file = f"{self.data_dir}/{item_id}_prices.csv"
+        self.store = PriceStore(f"{self.data_dir}/{item_id}_prices.bin")
         self.metadata_file = f"{self.data_dir}/{item_id}_metadata.json"
+        self.rollups_file = f"{self.data_dir}/{item_id}_rollups.json"
+        self._rollups = None
         self.logger = logging.getLogger(__name__)
-        self.ensure_files_exist()
+        self._writes = 0
+        # Files are checked on first use rather than here, so creating a manager costs no I/O
+        self._ready = False
+        self._ready_lock = threading.Lock()
         
     def ensure_files_exist(self):
-        """Create necessary files if they don't exist"""
+        """Create necessary files if they don't exist, migrating a legacy CSV history"""
+        if self._ready:
+            return
         try:
-            if not os.path.exists(self.price_file):
-                with open(self.price_file, 'w', newline='') as f:
-                    writer = csv.writer(f)
-                    writer.writerow(['Date', 'Price'])
-                self.logger.info(f"Created new price file: {self.price_file}")
-                
-            if not os.path.exists(self.metadata_file):
-                self.save_metadata({})
-                
+            with self._ready_lock:
+                if not self._ready:
+                    self._create_files()
+                    self._ready = True
         except Exception as e:
             self.logger.error(f"Error creating files: {e}")
+
+    def _create_files(self):
+        os.makedirs(self.data_dir, exist_ok=True)
+        if self.store.exists():
+            self.store.upgrade()
+        else:
+            if os.path.exists(self.price_file):
+                count = import_csv(self.store, self.price_file)
+                os.replace(self.price_file, self.price_file + '.migrated')
+                self.logger.info(f"Migrated {count} prices from {self.price_file}")
+            else:
+                self.store.create()
+                self.logger.info(f"Created new price store: {self.store.path}")
+            
+        if not os.path.exists(self.metadata_file):
+            self.save_metadata({})
     
+    @timed('storage_seconds', op='save_price', backend='files')
     def save_price(self, price):
-        """Save price and timestamp to CSV file"""
+        """Record a price observed now; returns True if it started a new run
+
+        A repeat of the latest price on the same day only extends that run.
+        """
+        self.ensure_files_exist()
         if price is None:
             self.logger.warning("Attempted to save None price value")
-            return
+            return False
             
         try:
-            date = datetime.now().strftime('%Y-%m-%d')
-            existing_data = self.load_price_history()
-            today_entry_exists = any(entry['Date'] == date for entry in existing_data)
-            
-            if not today_entry_exists:
-                with open(self.price_file, 'a', newline='') as f:
-                    writer = csv.writer(f)
-                    writer.writerow([date, f"{price:.2f}"])
-                self.logger.info(f"Saved new price {price} for date {date}")
+            timestamp, price = int(time.time()), round(price, 2)
+            rollups = self._get_rollups()
+            stored = self.store.observe(timestamp, price)
+            self._writes += 1
+            if stored:
+                rollups.add(timestamp, price)
+                self._save_rollups()
+                self.logger.info(f"Saved new price {price} at {timestamp_to_date(timestamp)} {timestamp_to_time(timestamp)}")
+            return stored
                 
         except Exception as e:
             self.logger.error(f"Error saving price: {e}")
+        return False
             
+    @timed('storage_seconds', op='save_metadata', backend='files')
     def save_metadata(self, metadata):
         """Save item metadata to JSON file"""
         try:
             with open(self.metadata_file, 'w') as f:
                 json.dump(metadata, f)
+            self._writes += 1
             self.logger.info(f"Saved metadata for item {self.item_id}")
         except Exception as e:
             self.logger.error(f"Error saving metadata: {e}")
             
+    def get_revision(self):
+        """Cheap token that changes whenever the stored price or metadata changes"""
+        revision = [self._writes]
+        for path in (self.store.path, self.metadata_file):
+            try:
+                stat = os.stat(path)
+                revision.extend((stat.st_mtime_ns, stat.st_size))
+            except OSError:
+                revision.extend((0, 0))
+        return tuple(revision)
+
+    @timed('storage_seconds', op='load_price_history', backend='files')
     def load_price_history(self):
-        """Load price history from CSV file"""
+        """Load price history as Date/Time/Price rows, matching the CSV export"""
+        self.ensure_files_exist()
         try:
-            if not os.path.exists(self.price_file):
-                return []
-                
-            with open(self.price_file, 'r') as f:
-                reader = csv.DictReader(f)
-                return list(reader)
+            timestamps, prices = self.store.read_columns()
+            return [
+                {'Date': timestamp_to_date(timestamp), 'Time': timestamp_to_time(timestamp), 'Price': f"{price:.2f}"}
+                for timestamp, price in zip(timestamps, prices)
+            ]
                 
         except Exception as e:
             self.logger.error(f"Error loading price history: {e}")
             return []
+
+    @timed('storage_seconds', op='load_price_columns', backend='files')
+    def load_price_columns(self, start=None, end=None):
+        """Load prices with start <= timestamp <= end as (timestamps, prices) arrays"""
+        self.ensure_files_exist()
+        try:
+            return self.store.read_range(start, end)
+        except Exception as e:
+            self.logger.error(f"Error loading price history: {e}")
+            return [], []
+
+    @timed('storage_seconds', op='load_recent_prices', backend='files')
+    def load_recent_prices(self, count):
+        """Load the prices of the latest count runs, oldest first"""
+        self.ensure_files_exist()
+        try:
+            return list(self.store.read_last(count)[1])
+        except Exception as e:
+            self.logger.error(f"Error loading recent prices: {e}")
+            return []
+
+    def compact(self, raw_before, daily_before):
+        """Roll runs older than raw_before into daily, and older than daily_before into weekly, OHLC runs
+
+        Returns the (before, after) number of records in the compacted range.
+        """
+        self.ensure_files_exist()
+        try:
+            runs = list(zip(*self.store.read_runs(end=raw_before - 1)))
+            compacted = compact_runs(runs, daily_before)
+            if len(compacted) < len(runs):
+                # The rollups no longer match the record count and are rebuilt on next use
+                self.store.replace_before(raw_before, compacted)
+                self._writes += 1
+            return len(runs), len(compacted)
+        except Exception as e:
+            self.logger.error(f"Error compacting price history: {e}")
+            return 0, 0
+
+    def _get_rollups(self):
+        """Weekly/monthly aggregates, rebuilt from the store when missing or out of date"""
+        self.ensure_files_exist()
+        if self._rollups is None and os.path.exists(self.rollups_file):
+            try:
+                with open(self.rollups_file, 'r') as f:
+                    self._rollups = Rollups.from_dict(json.load(f))
+            except Exception as e:
+                self.logger.error(f"Error loading rollups: {e}")
+        if self._rollups is None or self._rollups.count != len(self.store):
+            self._rollups = Rollups.from_columns(*self.store.read_columns())
+            self._save_rollups()
+        return self._rollups
+
+    def _save_rollups(self):
+        try:
+            tmp_path = f"{self.rollups_file}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(self._rollups.to_dict(), f)
+            os.replace(tmp_path, self.rollups_file)
+        except Exception as e:
+            self.logger.error(f"Error saving rollups: {e}")
+
+    @timed('storage_seconds', op='load_rollups', backend='files')
+    def load_rollups(self, period, start=None, end=None):
+        """(start_ts, count, min, max, sum) rows for 'week' or 'month' buckets"""
+        try:
+            return self._get_rollups().rows(period, start, end)
+        except Exception as e:
+            self.logger.error(f"Error loading rollups: {e}")
+            return []
+
+    def get_latest_price(self):
+        """Return the (date, price) of the latest observation without reading the history"""
+        self.ensure_files_exist()
+        try:
+            latest = self.store.latest()
+            if latest is None:
+                return None
+            return timestamp_to_date(latest[0]), latest[1]
+        except Exception as e:
+            self.logger.error(f"Error loading latest price: {e}")
+            return None
+
+    def export_csv(self, path=None):
+        """Write the price history to a Date,Time,Price CSV"""
+        self.ensure_files_exist()
+        try:
+            path = path or self.price_file
+            export_csv(self.store, path)
+            return path
+        except Exception as e:
+            self.logger.error(f"Error exporting price history: {e}")
+            return None
             
+    @timed('storage_seconds', op='load_metadata', backend='files')
     def load_metadata(self):
         """Load item metadata from JSON file"""
         try:
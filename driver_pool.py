@@ -0,0 +1,190 @@
+#driver_pool.py
+
+from contextlib import contextmanager
+from metrics import get_default_metrics
+from collections import deque
+import threading
+import logging
+import atexit
+import os
+
+def create_firefox_driver():
+    """Start Firefox in headless mode"""
+    # Selenium is imported on first use, keeping it off the startup path
+    from selenium import webdriver
+    from selenium.webdriver.firefox.options import Options
+
+    options = Options()
+    options.add_argument('--headless')
+    options.add_argument('--no-sandbox')
+    options.add_argument('--disable-dev-shm-usage')
+    options.add_argument('--window-size=1920,1080')
+    return webdriver.Firefox(options=options)
+
+def available_memory_mb():
+    """Return available system memory in MB, or None if it cannot be determined"""
+    try:
+        with open('/proc/meminfo', 'r') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) // 1024
+    except OSError:
+        pass
+    try:
+        return os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE') // (1024 * 1024)
+    except (ValueError, OSError, AttributeError):
+        return None
+
+class PooledDriver:
+    """A WebDriver session owned by the pool, with its usage count"""
+
+    def __init__(self, driver):
+        self.driver = driver
+        self.uses = 0
+
+class DriverPool:
+    """Keeps warm headless browser sessions and lends them out to scrapers"""
+
+    def __init__(self, max_drivers=None, max_uses=50, memory_per_driver_mb=400,
+                 driver_factory=create_firefox_driver):
+        """
+        max_drivers: hard cap on live browsers, defaults to what available memory allows
+        max_uses: recycle a session after this many scrapes
+        memory_per_driver_mb: memory budget assumed per browser when sizing the pool
+        driver_factory: callable returning a new WebDriver
+        """
+        self.logger = logging.getLogger(__name__)
+        self.max_uses = max_uses
+        self.driver_factory = driver_factory
+        self.max_drivers = self._size_for_memory(max_drivers, memory_per_driver_mb)
+        self._idle = deque()
+        self._live = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        self.metrics = get_default_metrics()
+        self.metrics.gauge('driver_pool_drivers', lambda: [
+            ({'state': state}, value) for state, value in self.stats().items()
+        ], 'Browser sessions by state')
+        atexit.register(self.close_all)
+
+    def _size_for_memory(self, max_drivers, memory_per_driver_mb):
+        """Cap the number of live browsers by available memory"""
+        available = available_memory_mb()
+        if available is None:
+            return max_drivers or 4
+        by_memory = max(1, available // memory_per_driver_mb)
+        size = min(max_drivers, by_memory) if max_drivers else by_memory
+        self.logger.info(f"Driver pool sized to {size} browsers ({available} MB available)")
+        return size
+
+    def acquire(self, timeout=None):
+        """Borrow a driver, starting a new one if below the cap, else wait for one"""
+        with self.metrics.timer('driver_pool_acquire_seconds'):
+            return self._acquire(timeout)
+
+    def _acquire(self, timeout):
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise RuntimeError("Driver pool is closed")
+                if self._idle:
+                    return self._idle.popleft()
+                if self._live < self.max_drivers:
+                    self._live += 1
+                    break
+                if not self._cond.wait(timeout):
+                    raise TimeoutError("Timed out waiting for a browser session")
+        try:
+            with self.metrics.timer('driver_start_seconds'):
+                return PooledDriver(self.driver_factory())
+        except Exception:
+            with self._cond:
+                self._live -= 1
+                self._cond.notify()
+            raise
+
+    def release(self, pooled, broken=False):
+        """Return a driver to the pool, recycling it if crashed or worn out"""
+        pooled.uses += 1
+        if not broken and pooled.uses < self.max_uses and not self._closed:
+            broken = not self._reset(pooled.driver)
+            if not broken:
+                with self._cond:
+                    self._idle.append(pooled)
+                    self._cond.notify()
+                return
+        reason = 'broken' if broken else 'closed' if self._closed else 'worn_out'
+        self.metrics.inc('driver_pool_recycled_total', reason=reason)
+        self._discard(pooled)
+
+    @contextmanager
+    def driver(self):
+        """Context manager lending a driver for one scrape"""
+        from selenium.common.exceptions import WebDriverException, TimeoutException
+        pooled = self.acquire()
+        broken = False
+        try:
+            yield pooled.driver
+        except WebDriverException as e:
+            # Timeouts leave the session usable, anything else may mean a dead browser
+            broken = not isinstance(e, TimeoutException)
+            raise
+        finally:
+            self.release(pooled, broken)
+
+    def _reset(self, driver):
+        """Clear cookies and storage and navigate away, returning False if the session is dead"""
+        from selenium.common.exceptions import WebDriverException
+        try:
+            driver.delete_all_cookies()
+            try:
+                driver.execute_script("window.localStorage.clear(); window.sessionStorage.clear();")
+            except WebDriverException:
+                # Storage is unavailable on some pages (e.g. about:blank or opaque origins)
+                pass
+            driver.get('about:blank')
+            return True
+        except Exception as e:
+            self.logger.warning(f"Browser session failed reset, recycling: {e}")
+            return False
+
+    def _discard(self, pooled):
+        """Quit a driver and free its slot"""
+        try:
+            pooled.driver.quit()
+        except Exception as e:
+            self.logger.warning(f"Error quitting browser session: {e}")
+        with self._cond:
+            self._live -= 1
+            self._cond.notify()
+
+    def close_all(self):
+        """Quit every idle driver and refuse further borrowing"""
+        with self._cond:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+            self._cond.notify_all()
+        for pooled in idle:
+            self._discard(pooled)
+
+    def stats(self):
+        """Current pool utilization"""
+        with self._cond:
+            return {
+                'max_drivers': self.max_drivers,
+                'live': self._live,
+                'idle': len(self._idle),
+                'in_use': self._live - len(self._idle)
+            }
+
+_default_pool = None
+_default_pool_lock = threading.Lock()
+
+def get_default_pool():
+    """Shared pool for scrapers created without an explicit one"""
+    global _default_pool
+    with _default_pool_lock:
+        if _default_pool is None:
+            _default_pool = DriverPool()
+        return _default_pool
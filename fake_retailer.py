@@ -0,0 +1,174 @@
+#fake_retailer.py
+
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from datetime import date, datetime, timezone
+from email.utils import format_datetime
+import threading
+import argparse
+import zlib
+import time
+import re
+
+# Page kinds in rotation: product N gets PAGE_KINDS[N % len(PAGE_KINDS)]
+PAGE_KINDS = ('meta', 'css', 'js', 'missing')
+
+def product_price(product_id, day=None):
+    """Deterministic price of a product on a day, drifting slowly over time"""
+    day = (day or date.today()).toordinal()
+    base = 10 + zlib.crc32(str(product_id).encode()) % 99000 / 100
+    return round(base * (1 + ((product_id * 7 + day // 3) % 11 - 5) / 100), 2)
+
+def product_kind(product_id):
+    return PAGE_KINDS[product_id % len(PAGE_KINDS)]
+
+def _png_pixel():
+    """A valid 1x1 PNG, served as every product image"""
+    def chunk(kind, data):
+        return (len(data).to_bytes(4, 'big') + kind + data +
+                zlib.crc32(kind + data).to_bytes(4, 'big'))
+    return (b'\x89PNG\r\n\x1a\n' +
+            chunk(b'IHDR', (1).to_bytes(4, 'big') * 2 + bytes([8, 2, 0, 0, 0])) +
+            chunk(b'IDAT', zlib.compress(b'\x00\xcc\x33\x33')) +
+            chunk(b'IEND', b''))
+
+PRODUCT_IMAGE = _png_pixel()
+
+def render_product(product_id, js_delay_ms=500, padding_kb=50):
+    """HTML of a synthetic product page of the product's kind
+
+    meta: price and title in Open Graph/product meta tags
+    css: price only in a .price element
+    js: price inserted by script after js_delay_ms, invisible to plain HTTP
+    missing: no price anywhere
+    """
+    kind = product_kind(product_id)
+    price = product_price(product_id)
+    title = f"Synthetic Product {product_id}"
+    head = [f'<meta property="og:image" content="/images/{product_id}.png">']
+    body = [f'<h1 class="page-title">{title}</h1>']
+    if kind == 'meta':
+        head.append(f'<meta property="og:title" content="{title}">')
+        head.append(f'<meta property="product:price:amount" content="{price:.2f}">')
+    elif kind == 'css':
+        body.append(f'<div class="product-info"><span class="price">${price:,.2f}</span></div>')
+    elif kind == 'js':
+        body.append(f'<div id="price-root" data-js-price="{price:.2f}" data-js-delay="{js_delay_ms}"></div>')
+        body.append(
+            '<script>setTimeout(function () {'
+            'var root = document.getElementById("price-root");'
+            'root.innerHTML = \'<span class="price">$\' + root.dataset.jsPrice + \'</span>\';'
+            f'}}, {js_delay_ms});</script>'
+        )
+    # Realistic page weight: navigation, reviews and scripts around the product data
+    filler = '<p class="filler">' + 'Lorem ipsum dolor sit amet. ' * 36 + '</p>\n'
+    body.append(filler * max(0, padding_kb))
+    return (f'<!DOCTYPE html><html><head><title>{title}</title>{"".join(head)}</head>'
+            f'<body>{"".join(body)}</body></html>')
+
+class FakeRetailer:
+    """Local HTTP server of synthetic product pages, for benchmarks"""
+
+    def __init__(self, host='127.0.0.1', port=0, latency_ms=0, js_delay_ms=500, padding_kb=50,
+                 validators=True):
+        """
+        port: 0 picks a free port
+        latency_ms: delay added to every response
+        js_delay_ms: time before script-rendered prices appear
+        padding_kb: filler added to every page
+        validators: send ETag and Last-Modified and answer conditional requests with 304
+        """
+        self.latency = latency_ms / 1000
+        self.js_delay_ms = js_delay_ms
+        self.padding_kb = padding_kb
+        self.validators = validators
+        self.requests = 0
+        self.not_modified = 0
+        self._lock = threading.Lock()
+        retailer = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                retailer._count()
+                if retailer.latency:
+                    time.sleep(retailer.latency)
+                match = re.fullmatch(r'/(product|images)/(\d+)(?:\.png)?', self.path)
+                if not match:
+                    self._send(404, 'text/plain', b'Not found')
+                elif match.group(1) == 'images':
+                    self._send(200, 'image/png', PRODUCT_IMAGE)
+                else:
+                    body = render_product(int(match.group(2)), retailer.js_delay_ms, retailer.padding_kb).encode()
+                    headers = {}
+                    if retailer.validators:
+                        # Prices change at most daily, so pages are stamped with the start of today
+                        headers = {
+                            'ETag': f'"{zlib.crc32(body):08x}"',
+                            'Last-Modified': format_datetime(
+                                datetime.combine(date.today(), datetime.min.time(), timezone.utc), usegmt=True)
+                        }
+                        if self.headers.get('If-None-Match') == headers['ETag']:
+                            retailer._count(not_modified=True)
+                            self._send(304, None, b'', headers)
+                            return
+                    self._send(200, 'text/html; charset=utf-8', body, headers)
+
+            def _send(self, status, content_type, body, headers=None):
+                self.send_response(status)
+                if content_type:
+                    self.send_header('Content-Type', content_type)
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self._thread = None
+
+    def _count(self, not_modified=False):
+        with self._lock:
+            if not_modified:
+                self.not_modified += 1
+            else:
+                self.requests += 1
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def product_url(self, product_id):
+        return f"{self.base_url}/product/{product_id}"
+
+    def start(self):
+        """Serve from a background thread"""
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+def main():
+    """Serve synthetic product pages until interrupted"""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument('--port', type=int, default=8900)
+    parser.add_argument('--latency-ms', type=int, default=0)
+    parser.add_argument('--js-delay-ms', type=int, default=500)
+    args = parser.parse_args()
+    retailer = FakeRetailer(port=args.port, latency_ms=args.latency_ms, js_delay_ms=args.js_delay_ms)
+    print(f"Serving synthetic products at {retailer.base_url}/product/<n>")
+    try:
+        retailer.server.serve_forever()
+    except KeyboardInterrupt:
+        retailer.stop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+#file_lock.py
+
+from contextlib import contextmanager
+import threading
+import json
+import os
+
+try:
+    import fcntl
+except ImportError:
+    # Without flock (Windows) only threads of one process are serialized
+    fcntl = None
+
+_thread_locks = {}
+_thread_locks_guard = threading.Lock()
+
+def _thread_lock(path):
+    with _thread_locks_guard:
+        return _thread_locks.setdefault(os.path.abspath(path), threading.Lock())
+
+@contextmanager
+def locked(path):
+    """Hold an exclusive lock on path across threads and processes
+
+    The lock is taken on a separate path.lock file, so path itself can be
+    replaced atomically while the lock is held.
+    """
+    with _thread_lock(path):
+        if fcntl is None:
+            yield
+            return
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(f"{path}.lock", 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            yield
+
+def load_json(path, default=None):
+    """Parsed JSON from path, or default when the file does not exist"""
+    if not os.path.exists(path):
+        return default
+    with open(path, 'r') as f:
+        return json.load(f)
+
+def write_json(path, data, indent=None):
+    """Replace path with data as JSON atomically"""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, indent=indent)
+    os.replace(tmp_path, path)
@@ -0,0 +1,278 @@
+#http_fetcher.py
+
+from html.parser import HTMLParser
+from urllib.parse import urlparse
+from urllib.request import Request, urlopen
+from urllib.error import HTTPError
+from profiles import get_default_registry
+from file_lock import locked, load_json, write_json
+import threading
+import hashlib
+import logging
+import re
+
+USER_AGENT = ('Mozilla/5.0 (X11; Linux x86_64; rv:128.0) '
+              'Gecko/20100101 Firefox/128.0')
+MAX_PAGE_BYTES = 5 * 1024 * 1024
+
+# Fetch outcomes that reused the stored data without parsing or rendering the page
+SKIP_OUTCOMES = ('not_modified', 'body_unchanged')
+
+VOID_ELEMENTS = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input',
+                 'link', 'meta', 'source', 'track', 'wbr'}
+
+class SimpleSelector:
+    """A single compound CSS selector: tag, .class and [attr="value"] parts"""
+
+    _part = re.compile(r'\.([\w-]+)|\[([\w:-]+)(?:=["\']?([^"\'\]]*)["\']?)?\]')
+
+    def __init__(self, selector):
+        self.selector = selector
+        match = re.match(r'[\w-]*', selector)
+        self.tag = match.group(0).lower() or None
+        self.classes = []
+        self.attrs = []
+        for cls, attr, value in self._part.findall(selector[match.end():]):
+            if cls:
+                self.classes.append(cls)
+            else:
+                self.attrs.append((attr.lower(), value if value else None))
+
+    def matches(self, tag, attrs):
+        """Check an element given its tag and attribute dict"""
+        if self.tag and self.tag != tag:
+            return False
+        element_classes = (attrs.get('class') or '').split()
+        if any(cls not in element_classes for cls in self.classes):
+            return False
+        for name, value in self.attrs:
+            if name not in attrs:
+                return False
+            if value is not None and attrs[name] != value:
+                return False
+        return True
+
+class SelectorExtractor(HTMLParser):
+    """Collects the first element matching each selector with its text and attributes"""
+
+    def __init__(self, selectors):
+        super().__init__(convert_charrefs=True)
+        self.selectors = [SimpleSelector(selector) for selector in selectors]
+        self.found = {}
+        self._open = []
+
+    def handle_starttag(self, tag, attrs):
+        attrs = {name: value or '' for name, value in attrs}
+        for element in self._open:
+            if element['tag'] == tag:
+                element['depth'] += 1
+        for selector in self.selectors:
+            if selector.selector in self.found or not selector.matches(tag, attrs):
+                continue
+            element = {'tag': tag, 'attrs': attrs, 'text': [], 'depth': 0}
+            self.found[selector.selector] = element
+            if tag not in VOID_ELEMENTS:
+                self._open.append(element)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        for element in list(self._open):
+            if element['tag'] != tag:
+                continue
+            if element['depth'] == 0:
+                self._open.remove(element)
+            else:
+                element['depth'] -= 1
+
+    def handle_data(self, data):
+        for element in self._open:
+            element['text'].append(data)
+
+    def value(self, selector):
+        """Return (text, attrs) of the element matched by selector, or None"""
+        element = self.found.get(selector)
+        if element is None:
+            return None
+        return ' '.join(''.join(element['text']).split()), element['attrs']
+
+IMAGE_SELECTOR = 'meta[property="og:image"]'
+
+def extract_fields(html, profile=None):
+    """Extract price, title and og:image URL from static HTML using a domain's extraction profile"""
+    profile = profile or get_default_registry().default
+    extractor = SelectorExtractor(profile.price_selectors + profile.title_selectors + [IMAGE_SELECTOR])
+    extractor.feed(html)
+    extractor.close()
+
+    price = None
+    for rule in profile.price_rules:
+        found = extractor.value(rule.selector)
+        if not found:
+            continue
+        try:
+            price = profile.rule_price(rule, *found)
+            break
+        except ValueError:
+            continue
+
+    title = None
+    for rule in profile.title_rules:
+        found = extractor.value(rule.selector)
+        if not found:
+            continue
+        title = rule.value(*found)
+        if title:
+            break
+
+    image = extractor.value(IMAGE_SELECTOR)
+    return {
+        'price': price,
+        'title': title,
+        'image_url': image[1].get('content') or None if image else None
+    }
+
+def extract_item(html, profile=None):
+    """Extract price and title from static HTML using a domain's extraction profile"""
+    fields = extract_fields(html, profile)
+    return fields['price'], fields['title']
+
+def content_hash(*parts):
+    """Short stable hash of strings or bytes, used to tell whether content changed"""
+    digest = hashlib.sha1()
+    for part in parts:
+        digest.update(part if isinstance(part, bytes) else str(part).encode())
+        digest.update(b'\0')
+    return digest.hexdigest()[:20]
+
+def fetch_page(url, etag=None, last_modified=None, timeout=10):
+    """
+    Fetch a page over plain HTTP, conditionally when validators are given
+    Returns (html, validators); html is None when the server answered 304 Not Modified.
+    validators holds the response's etag, last_modified and body_hash.
+    """
+    headers = {
+        'User-Agent': USER_AGENT,
+        'Accept': 'text/html,application/xhtml+xml'
+    }
+    if etag:
+        headers['If-None-Match'] = etag
+    if last_modified:
+        headers['If-Modified-Since'] = last_modified
+    try:
+        with urlopen(Request(url, headers=headers), timeout=timeout) as response:
+            body = response.read(MAX_PAGE_BYTES)
+            charset = response.headers.get_content_charset() or 'utf-8'
+            validators = {
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+                'body_hash': content_hash(body)
+            }
+            return body.decode(charset, errors='replace'), validators
+    except HTTPError as e:
+        if e.code != 304:
+            raise
+        return None, {
+            'etag': e.headers.get('ETag') or etag,
+            'last_modified': e.headers.get('Last-Modified') or last_modified
+        }
+
+def skip_rate(fetch_stats):
+    """Share of checks that skipped the parse and render, or None before the first check"""
+    checks = (fetch_stats or {}).get('checks')
+    if not checks:
+        return None
+    return round(sum(fetch_stats.get(outcome, 0) for outcome in SKIP_OUTCOMES) / checks, 3)
+
+def fetch_html(url, timeout=10):
+    """Fetch a page over plain HTTP and return its decoded HTML"""
+    return fetch_page(url, timeout=timeout)[0]
+
+class FetchTierStats:
+    """Per-domain hit rates of the HTTP fast path, used to pick the starting tier
+
+    Worker processes learn from their own scrapes; save() adds the counts
+    recorded since the last save to the shared file rather than replacing it.
+    """
+
+    def __init__(self, stats_file='data/fetch_tiers.json', min_samples=3,
+                 min_hit_rate=0.5, probe_every=20):
+        """
+        stats_file: where hit counts persist between runs
+        min_samples: HTTP attempts needed before a domain can be moved to the browser tier
+        min_hit_rate: HTTP hit rate below which a domain starts on the browser tier
+        probe_every: retry the HTTP tier this often on browser-tier domains to re-learn
+        """
+        self.stats_file = stats_file
+        self.min_samples = min_samples
+        self.min_hit_rate = min_hit_rate
+        self.probe_every = probe_every
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        # Counts recorded since the last save, per domain
+        self._pending = {}
+        self.domains = self._load()
+
+    def _load(self):
+        """Load stats from file"""
+        try:
+            return load_json(self.stats_file, {})
+        except Exception as e:
+            self.logger.error(f"Error loading fetch tier stats: {e}")
+        return {}
+
+    def save(self):
+        """Add the counts recorded since the last save to the stats file"""
+        try:
+            with locked(self.stats_file):
+                domains = self._load()
+                with self._lock:
+                    for domain, counts in self._pending.items():
+                        entry = self._entry(domain, domains)
+                        for key, count in counts.items():
+                            entry[key] += count
+                    self.domains = domains
+                    self._pending = {}
+                write_json(self.stats_file, domains, indent=4)
+        except Exception as e:
+            self.logger.error(f"Error saving fetch tier stats: {e}")
+
+    def _entry(self, domain, domains=None):
+        return (self.domains if domains is None else domains).setdefault(domain, {
+            'http_attempts': 0,
+            'http_hits': 0,
+            'browser_attempts': 0,
+            'browser_hits': 0
+        })
+
+    def record(self, url, tier, hit):
+        """Record the outcome of a fetch on a tier ('http' or 'browser')"""
+        domain = urlparse(url).netloc.lower()
+        with self._lock:
+            for entry in (self._entry(domain), self._entry(domain, self._pending)):
+                entry[f'{tier}_attempts'] += 1
+                if hit:
+                    entry[f'{tier}_hits'] += 1
+
+    def should_try_http(self, url):
+        """Whether to start with the HTTP tier for this URL's domain"""
+        with self._lock:
+            entry = self._entry(urlparse(url).netloc.lower())
+            attempts = entry['http_attempts']
+            if attempts < self.min_samples:
+                return True
+            if entry['http_hits'] / attempts >= self.min_hit_rate:
+                return True
+            # Occasionally probe again in case the site changed
+            return entry['browser_attempts'] % self.probe_every == 0
+
+    def hit_rates(self):
+        """HTTP hit rate per domain"""
+        with self._lock:
+            return {
+                domain: round(entry['http_hits'] / entry['http_attempts'], 3)
+                if entry['http_attempts'] else None
+                for domain, entry in self.domains.items()
+            }
@@ -0,0 +1,60 @@
+#item_cache.py
+
+import threading
+
+class ItemCache:
+    """In-process cache of parsed item state, validated against storage revisions
+
+    Each entry remembers the data manager revision it was loaded at. A revision
+    changes whenever save_price/save_metadata writes, or the underlying files or
+    database change on disk, so stale entries are reloaded on the next read.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, item_id, revision, loader):
+        """Return the cached value for item_id at revision, calling loader() on a miss"""
+        with self._lock:
+            entry = self._entries.get(item_id)
+            if entry is not None and entry[0] == revision:
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+        value = loader()
+        with self._lock:
+            self._entries[item_id] = (revision, value)
+        return value
+
+    def invalidate(self, item_id=None):
+        """Drop one entry, or everything when item_id is None"""
+        with self._lock:
+            if item_id is None:
+                self.invalidations += len(self._entries)
+                self._entries.clear()
+            elif self._entries.pop(item_id, None) is not None:
+                self.invalidations += 1
+
+    def retain(self, item_ids):
+        """Drop entries for items that are no longer tracked"""
+        item_ids = set(item_ids)
+        with self._lock:
+            for item_id in [key for key in self._entries if key not in item_ids]:
+                del self._entries[item_id]
+                self.invalidations += 1
+
+    def stats(self):
+        """Hit/miss statistics"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'invalidations': self.invalidations,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else None
+            }
@@ -0,0 +1,146 @@
+#item_registry.py
+
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+import hashlib
+
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+def generate_item_id(url):
+    """Generate a unique ID for the item based on URL"""
+    return hashlib.md5(url.encode()).hexdigest()[:10]
+
+def normalize_url(url):
+    """Canonical form of a URL used to spot duplicates
+
+    Lowercases scheme and host, drops default ports, fragments, trailing
+    slashes and utm_* tracking parameters, and sorts the query string.
+    """
+    try:
+        parts = urlsplit(url.strip())
+        scheme = parts.scheme.lower()
+        host = (parts.hostname or '').lower()
+        if parts.port and parts.port != DEFAULT_PORTS.get(scheme):
+            host = f"{host}:{parts.port}"
+        path = parts.path.rstrip('/') or '/'
+        query = urlencode(sorted(
+            (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+            if not key.lower().startswith('utm_')
+        ))
+        return urlunsplit((scheme, host, path, query, ''))
+    except ValueError:
+        return url.strip()
+
+class ItemRegistry:
+    """Active and removed items indexed by URL, normalized URL and item ID
+
+    Entries are the plain config dicts stored in items_config.json and
+    items_history.json. Both collections are insertion-ordered dicts keyed by
+    URL, so lookups, additions, removals and restores are all O(1).
+    """
+
+    def __init__(self, items=None, history=None):
+        self.load(items or [], history or [])
+
+    def load(self, items, history):
+        """Replace both collections"""
+        self.load_items(items)
+        self.load_history(history)
+
+    def load_items(self, items):
+        """Replace the active items and rebuild their indexes"""
+        self._items = {}
+        self._items_by_normalized = {}
+        self._items_by_id = {}
+        for item in items:
+            self._index_item(dict(item))
+
+    def load_history(self, history):
+        """Replace the removed items and rebuild their indexes"""
+        self._history = {}
+        self._history_by_normalized = {}
+        for item in history:
+            self._index_history(dict(item))
+
+    def _index_item(self, item):
+        self._items[item['url']] = item
+        self._items_by_normalized[normalize_url(item['url'])] = item
+        self._items_by_id[generate_item_id(item['url'])] = item
+
+    def _unindex_item(self, item):
+        self._items.pop(item['url'], None)
+        normalized = normalize_url(item['url'])
+        if self._items_by_normalized.get(normalized) is item:
+            del self._items_by_normalized[normalized]
+        self._items_by_id.pop(generate_item_id(item['url']), None)
+
+    def _index_history(self, item):
+        # A URL removed again replaces its older history entry
+        self._unindex_history(item)
+        self._history[item['url']] = item
+        self._history_by_normalized[normalize_url(item['url'])] = item
+
+    def _unindex_history(self, item):
+        previous = self._history_by_normalized.pop(normalize_url(item['url']), None)
+        if previous is not None:
+            self._history.pop(previous['url'], None)
+        self._history.pop(item['url'], None)
+
+    def get(self, url):
+        """Active entry for url, matching exactly or by normalized URL"""
+        return self._items.get(url) or self._items_by_normalized.get(normalize_url(url))
+
+    def get_by_id(self, item_id):
+        """Active entry for an item ID"""
+        return self._items_by_id.get(item_id)
+
+    def get_removed(self, url):
+        """History entry for url, matching exactly or by normalized URL"""
+        return self._history.get(url) or self._history_by_normalized.get(normalize_url(url))
+
+    def is_tracked(self, url):
+        """Whether url, or an equivalent URL, is being tracked"""
+        return self.get(url) is not None
+
+    def add(self, item):
+        """Start tracking a new entry"""
+        self._index_item(dict(item))
+
+    def remove(self, url, **extra):
+        """Move an active entry to history, returning it or None if not tracked"""
+        item = self.get(url)
+        if item is None:
+            return None
+        self._unindex_item(item)
+        removed = {**item, **extra}
+        self._index_history(removed)
+        return removed
+
+    def restore(self, url, **extra):
+        """Move a history entry back to the active items, returning it or None"""
+        item = self.get_removed(url)
+        if item is None:
+            return None
+        self._unindex_history(item)
+        restored = {key: value for key, value in item.items() if key != 'removed_at'}
+        restored.update(extra)
+        self._index_item(restored)
+        return restored
+
+    def set_status(self, url, status):
+        """Set an active entry's status, returning True if it changed"""
+        item = self.get(url)
+        if item is None or item.get('status') == status:
+            return False
+        item['status'] = status
+        return True
+
+    def items(self):
+        """Copies of the active entries in insertion order"""
+        return [dict(item) for item in self._items.values()]
+
+    def history(self):
+        """Copies of the removed entries in removal order"""
+        return [dict(item) for item in self._history.values()]
+
+    def __len__(self):
+        return len(self._items)
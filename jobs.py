@@ -0,0 +1,136 @@
+#jobs.py
+
+from collections import OrderedDict, deque
+from datetime import datetime
+import threading
+import logging
+import uuid
+
+class Job:
+    """A queued scrape of one or more items, with progress and result"""
+
+    def __init__(self, kind, key, item_ids):
+        self.id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.key = key
+        self.item_ids = list(item_ids)
+        self.status = 'queued'
+        self.done = 0
+        self.total = len(self.item_ids)
+        self.result = None
+        self.error = None
+        self.created_at = datetime.now().isoformat()
+        self.started_at = None
+        self.finished_at = None
+
+    @property
+    def active(self):
+        return self.status in ('queued', 'running')
+
+    def to_dict(self, include_result=False):
+        """JSON-friendly view of the job"""
+        data = {
+            'id': self.id,
+            'kind': self.kind,
+            'key': self.key,
+            'status': self.status,
+            'progress': {'done': self.done, 'total': self.total},
+            'error': self.error,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at
+        }
+        if include_result:
+            data['result'] = self.result
+        return data
+
+class JobQueue:
+    """Background queue running scrape jobs for dashboard mutations
+
+    Jobs are deduplicated by key while queued or running, so repeated requests
+    for the same URL share one job. Progress is published on the status bus as
+    'job' events.
+    """
+
+    def __init__(self, runner, status_bus=None, workers=1, max_finished=200):
+        """
+        runner: callable(item_ids, on_progress) doing the scrape, returns a result dict
+        status_bus: optional StatusBus receiving job progress events
+        workers: number of jobs run at once
+        max_finished: finished jobs kept for the progress/result endpoints
+        """
+        self.runner = runner
+        self.status_bus = status_bus
+        self.max_finished = max_finished
+        self.logger = logging.getLogger(__name__)
+        self._cond = threading.Condition()
+        self._queue = deque()
+        self._jobs = OrderedDict()
+        self._active_by_key = {}
+        for i in range(max(1, workers)):
+            threading.Thread(target=self._work, name=f'job-worker-{i}', daemon=True).start()
+
+    def submit(self, kind, key, item_ids):
+        """Queue a job, returning (job, created); an active job with the same key is reused"""
+        with self._cond:
+            existing = self._active_by_key.get(key)
+            if existing is not None:
+                return existing, False
+            job = Job(kind, key, item_ids)
+            self._jobs[job.id] = job
+            self._active_by_key[key] = job
+            self._queue.append(job)
+            self._prune()
+            self._cond.notify()
+        self._publish(job)
+        return job, True
+
+    def get(self, job_id):
+        """Look up a job by ID"""
+        with self._cond:
+            return self._jobs.get(job_id)
+
+    def find_active(self, key):
+        """The queued or running job for key, if any"""
+        with self._cond:
+            return self._active_by_key.get(key)
+
+    def list(self):
+        """All known jobs, newest first"""
+        with self._cond:
+            return list(reversed(self._jobs.values()))
+
+    def _prune(self):
+        """Forget the oldest finished jobs beyond max_finished"""
+        finished = [job_id for job_id, job in self._jobs.items() if not job.active]
+        for job_id in finished[:max(0, len(finished) - self.max_finished)]:
+            del self._jobs[job_id]
+
+    def _publish(self, job):
+        if self.status_bus is not None:
+            self.status_bus.publish('job', job.to_dict())
+
+    def _work(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._queue)
+                job = self._queue.popleft()
+                job.status = 'running'
+                job.started_at = datetime.now().isoformat()
+            self._publish(job)
+
+            def on_progress(done, total):
+                job.done, job.total = done, total
+                self._publish(job)
+
+            try:
+                result, error, status = self.runner(job.item_ids, on_progress), None, 'done'
+            except Exception as e:
+                self.logger.error(f"Job {job.id} failed: {e}")
+                result, error, status = None, str(e), 'failed'
+            with self._cond:
+                job.result, job.error, job.status = result, error, status
+                job.finished_at = datetime.now().isoformat()
+                if self._active_by_key.get(job.key) is job:
+                    del self._active_by_key[job.key]
+            self._publish(job)
@@ -1,12 +1,39 @@
 #!/usr/bin/env python3
 #main.py
 
+import time
+# Taken before the other imports so startup timing includes them
+STARTED = time.perf_counter()
+
 from tracker import PriceTracker
 from dashboard import Dashboard
 from config_manager import ConfigManager  # Ensure this import is correct
+from sqlite_storage import SQLiteStorage, SQLiteConfigManager
+from work_queue import WorkQueue, QueueCoordinator
+from compaction import PriceCompactor
+from metrics import get_default_metrics
+import threading
+import argparse
 import logging
 import os
 
+class StartupTimer:
+    """Durations of the startup phases, logged and exposed as the startup_seconds gauge"""
+
+    def __init__(self, started):
+        self.started = started
+        self.phases = {}
+        self._last = started
+
+    def mark(self, phase):
+        """End a phase that began when the previous one ended"""
+        now = time.perf_counter()
+        self.phases[phase] = round(now - self._last, 3)
+        self._last = now
+
+    def total(self):
+        return round(self._last - self.started, 3)
+
 def setup_logging():
     """Setup logging configuration"""
     logging.basicConfig(
@@ -24,25 +51,85 @@ def ensure_directories():
     for directory in directories:
         os.makedirs(directory, exist_ok=True)
 
+def parse_args():
+    """Parse command line options"""
+    parser = argparse.ArgumentParser(description='Price tracker dashboard')
+    parser.add_argument('--storage', choices=['files', 'sqlite'], default='files',
+                        help='keep item data in per-item files or a single SQLite database')
+    parser.add_argument('--db', default='data/price_tracker.db',
+                        help='SQLite database path when --storage sqlite is used')
+    parser.add_argument('--queue', default=None,
+                        help='hand scrapes to worker.py processes through this work queue database')
+    parser.add_argument('--initial-refresh', choices=['stale', 'all', 'none'], default='stale',
+                        help='items scraped in the background at startup')
+    parser.add_argument('--stale-hours', type=float, default=24,
+                        help='age of the last successful scrape that makes an item stale')
+    parser.add_argument('--wait-for-refresh', action='store_true',
+                        help='finish the initial refresh before serving the dashboard')
+    parser.add_argument('--raw-days', type=int, default=14,
+                        help='days every price change is kept before it is rolled into daily summaries')
+    parser.add_argument('--daily-days', type=int, default=365,
+                        help='days daily price summaries are kept before they are rolled into weekly ones')
+    return parser.parse_args()
+
+def initial_refresh(tracker, mode, stale_hours, timer=None):
+    """Scrape the items that need it at startup, recording the duration on timer if given"""
+    start = time.perf_counter()
+    if mode == 'all':
+        tracker.update_all_prices()
+    else:
+        tracker.update_stale_prices(stale_hours)
+    duration = round(time.perf_counter() - start, 3)
+    if timer is not None:
+        timer.phases['initial_refresh'] = duration
+    logging.info(f"Initial refresh finished in {duration:.1f}s")
+
 def main():
     """Main entry point"""
+    timer = StartupTimer(STARTED)
+    timer.mark('imports')
+    args = parse_args()
+    
     # Setup
     setup_logging()
     ensure_directories()
+    get_default_metrics().gauge('startup_seconds', lambda: [
+        ({'phase': phase}, seconds) for phase, seconds in timer.phases.items()
+    ], 'Time spent in each startup phase')
     
     # Initialize configuration manager
-    config_manager = ConfigManager()
+    storage = None
+    if args.storage == 'sqlite':
+        storage = SQLiteStorage(args.db)
+        config_manager = SQLiteConfigManager(storage)
+    else:
+        config_manager = ConfigManager()
     
     # Initialize components
     items_config = config_manager.get_items()  # Ensure this returns the correct structure
-    tracker = PriceTracker(items_config, config_manager)
+    timer.mark('config')
+    coordinator = QueueCoordinator(WorkQueue(args.queue)) if args.queue else None
+    tracker = PriceTracker(items_config, config_manager, storage=storage, coordinator=coordinator,
+                           compactor=PriceCompactor(args.raw_days, args.daily_days))
+    timer.mark('tracker')
     
-    # Initial price update
-    logging.info("Performing initial price update...")
-    tracker.update_all_prices()
+    # Initial price update; by default in the background so the dashboard serves stored data right away
+    if args.initial_refresh != 'none':
+        logging.info(f"Performing initial price update ({args.initial_refresh} items)...")
+        if args.wait_for_refresh:
+            initial_refresh(tracker, args.initial_refresh, args.stale_hours)
+            timer.mark('initial_refresh')
+        else:
+            threading.Thread(target=initial_refresh, name='initial-refresh', daemon=True,
+                             args=(tracker, args.initial_refresh, args.stale_hours, timer)).start()
     
     # Initialize and run dashboard
     dashboard = Dashboard(tracker, config_manager)
+    timer.mark('dashboard')
+    logging.info(
+        f"Ready to serve {len(tracker.items)} items after {timer.total():.2f}s (" +
+        ', '.join(f"{phase} {seconds:.2f}s" for phase, seconds in timer.phases.items()) + ")"
+    )
     dashboard.run()
 
 if __name__ == "__main__":
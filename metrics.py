@@ -0,0 +1,190 @@
+#metrics.py
+
+from contextlib import contextmanager
+from bisect import bisect_left
+from functools import wraps
+import threading
+import time
+
+# Bucket upper bounds in seconds, from fast disk writes to slow page loads
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60)
+
+# HELP text of the metrics recorded by the tracker
+METRIC_HELP = {
+    'scrape_phase_seconds': 'Time spent in each scrape phase, per domain',
+    'scrape_duration_seconds': 'Total time of one item scrape, per domain',
+    'scrapes_total': 'Finished item scrapes by outcome',
+    'scrape_tier_total': 'Fetch tier attempts (http or browser) by outcome',
+    'scrape_errors_total': 'Failed item scrapes by error kind',
+    'scrapes_skipped_total': 'Item scrapes skipped for retry backoff or an open circuit breaker',
+    'fetch_outcomes_total': 'Successful scrapes by whether the page was unchanged or parsed in full',
+    'driver_pool_acquire_seconds': 'Time waiting for a browser session, including startup',
+    'driver_start_seconds': 'Time to start a new browser session',
+    'driver_pool_recycled_total': 'Browser sessions discarded by reason',
+    'storage_seconds': 'Time of price and metadata storage operations',
+    'price_records_compacted_total': 'Price history records removed by rolling old runs into daily and weekly summaries'
+}
+
+def _label_key(labels):
+    return tuple(sorted(labels.items())) if labels else ()
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+               for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+class MetricsRegistry:
+    """In-process counters, histograms and gauges rendered in Prometheus text format
+
+    Recording is a dict lookup and a few additions under one lock, cheap
+    enough to leave on in every scrape. Gauges are callbacks evaluated only
+    when the metrics are rendered.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._help = dict(METRIC_HELP)
+        self._counters = {}
+        self._histograms = {}
+        self._gauges = {}
+
+    def describe(self, name, help_text):
+        """Set the HELP line of a metric"""
+        self._help[name] = help_text
+
+    def inc(self, name, value=1, **labels):
+        """Add to a counter"""
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        """Record one value in a histogram"""
+        key = (name, _label_key(labels))
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            histogram[0][index] += 1
+            histogram[1] += value
+            histogram[2] += 1
+
+    @contextmanager
+    def timer(self, name, **labels):
+        """Time a block into a histogram, in seconds"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def gauge(self, name, callback, help_text=None):
+        """Register a gauge; callback returns a number or a list of (labels, value)"""
+        self._gauges[name] = callback
+        if help_text:
+            self.describe(name, help_text)
+
+    def snapshot(self):
+        """Copy of counters and histograms, for diffing around a run"""
+        with self._lock:
+            return (
+                dict(self._counters),
+                {key: (list(counts), total, count) for key, (counts, total, count) in self._histograms.items()}
+            )
+
+    def _quantile(self, counts, count, q):
+        """Upper bucket bound holding the q-th quantile, None past the largest bucket"""
+        rank, seen = q * count, 0
+        for bound, bucket_count in zip(self.buckets, counts):
+            seen += bucket_count
+            if seen >= rank:
+                return bound
+        return None
+
+    def summarize(self, before, after=None):
+        """Counters and histogram summaries (count, sum, mean, p50, p95) between two snapshots"""
+        after = after or self.snapshot()
+        counters = {}
+        for (name, labels), value in after[0].items():
+            delta = value - before[0].get((name, labels), 0)
+            if delta:
+                counters[f"{name}{_format_labels(labels)}"] = delta
+        histograms = {}
+        for (name, labels), (counts, total, count) in after[1].items():
+            old_counts, old_total, old_count = before[1].get((name, labels), ([0] * len(counts), 0.0, 0))
+            count -= old_count
+            if not count:
+                continue
+            counts = [new - old for new, old in zip(counts, old_counts)]
+            total -= old_total
+            histograms[f"{name}{_format_labels(labels)}"] = {
+                'count': count,
+                'sum': round(total, 4),
+                'mean': round(total / count, 4),
+                'p50': self._quantile(counts, count, 0.5),
+                'p95': self._quantile(counts, count, 0.95)
+            }
+        return {'counters': counters, 'histograms': histograms}
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        counters, histograms = self.snapshot()
+        lines = []
+        described = set()
+
+        def header(name, kind):
+            if name in described:
+                return
+            described.add(name)
+            if name in self._help:
+                lines.append(f"# HELP {name} {self._help[name]}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        for (name, labels), value in sorted(counters.items()):
+            header(name, 'counter')
+            lines.append(f"{name}{_format_labels(labels)} {value}")
+
+        for (name, labels), (counts, total, count) in sorted(histograms.items()):
+            header(name, 'histogram')
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f"{name}_bucket{_format_labels(labels, [('le', le)])} {cumulative}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {total}")
+            lines.append(f"{name}_count{_format_labels(labels)} {count}")
+
+        for name, callback in sorted(self._gauges.items()):
+            try:
+                value = callback()
+            except Exception:
+                continue
+            header(name, 'gauge')
+            if isinstance(value, list):
+                for labels, sample in value:
+                    if sample is not None:
+                        lines.append(f"{name}{_format_labels(_label_key(labels))} {sample}")
+            elif value is not None:
+                lines.append(f"{name} {value}")
+        return '\n'.join(lines) + '\n'
+
+_default_metrics = MetricsRegistry()
+
+def get_default_metrics():
+    """Process-wide registry shared by the instrumented modules"""
+    return _default_metrics
+
+def timed(name, **labels):
+    """Decorator timing every call of a function into a histogram of the default registry"""
+    def decorator(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            with _default_metrics.timer(name, **labels):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
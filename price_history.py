@@ -0,0 +1,181 @@
+#price_history.py
+
+from datetime import datetime, timedelta
+import time
+
+PERIODS = ('week', 'month')
+
+def period_start(timestamp, period):
+    """Unix timestamp of the local midnight starting the day, week (Monday) or month of timestamp"""
+    day = datetime.fromtimestamp(timestamp).date()
+    if period == 'day':
+        start = day
+    elif period == 'week':
+        start = day - timedelta(days=day.weekday())
+    else:
+        start = day.replace(day=1)
+    return int(time.mktime(start.timetuple()))
+
+def parse_timestamp(value):
+    """Accept a YYYY-MM-DD date or a Unix timestamp, returning an int or None"""
+    if value in (None, ''):
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        return int(datetime.strptime(value, '%Y-%m-%d').timestamp())
+
+class Rollups:
+    """Weekly and monthly count/min/max/sum aggregates of a price history
+
+    add() folds in one new price in O(1), so the aggregates stay current as
+    prices are saved instead of being recomputed from the raw history.
+    """
+
+    def __init__(self, periods=None, count=0):
+        # {period: {start_ts: [count, min, max, sum]}}
+        self.periods = periods or {period: {} for period in PERIODS}
+        self.count = count
+
+    @classmethod
+    def from_columns(cls, timestamps, prices):
+        """Build aggregates from a full history"""
+        rollups = cls()
+        for timestamp, price in zip(timestamps, prices):
+            rollups.add(timestamp, price)
+        return rollups
+
+    @classmethod
+    def from_dict(cls, data):
+        """Load the JSON form written by to_dict"""
+        return cls(
+            {period: {int(start): bucket for start, bucket in data['periods'][period].items()}
+             for period in PERIODS},
+            data['count']
+        )
+
+    def to_dict(self):
+        return {'count': self.count, 'periods': self.periods}
+
+    def add(self, timestamp, price):
+        """Fold one price into its week and month buckets"""
+        for period in PERIODS:
+            start = period_start(timestamp, period)
+            bucket = self.periods[period].get(start)
+            if bucket is None:
+                self.periods[period][start] = [1, price, price, price]
+            else:
+                bucket[0] += 1
+                bucket[1] = min(bucket[1], price)
+                bucket[2] = max(bucket[2], price)
+                bucket[3] += price
+        self.count += 1
+
+    def rows(self, period, start=None, end=None):
+        """(start_ts, count, min, max, sum) rows of a period within [start, end], oldest first"""
+        return [
+            (bucket_start, *bucket)
+            for bucket_start, bucket in sorted(self.periods[period].items())
+            if (start is None or bucket_start >= period_start(start, period))
+            and (end is None or bucket_start <= end)
+        ]
+
+def compact_runs(runs, daily_before):
+    """Reduce (first_seen, last_seen, count, price) runs to the open, high, low and close runs of each bucket
+
+    Runs starting before daily_before are bucketed by week, later ones by day.
+    A dropped run's observations and time span are folded into the kept run
+    before it and equal neighbours are merged, so every bucket keeps its
+    first, last, lowest and highest price and the observation total is
+    unchanged. Compacting already compacted runs changes nothing.
+    """
+    compacted = []
+    i = 0
+    while i < len(runs):
+        period = 'week' if runs[i][0] < daily_before else 'day'
+        bucket = period_start(runs[i][0], period)
+        j = i + 1
+        while (j < len(runs) and (runs[j][0] < daily_before) == (period == 'week')
+               and period_start(runs[j][0], period) == bucket):
+            j += 1
+        keep = {i, j - 1,
+                min(range(i, j), key=lambda k: runs[k][3]),
+                max(range(i, j), key=lambda k: runs[k][3])}
+        bucket_runs = []
+        for k in range(i, j):
+            first_seen, last_seen, count, price = runs[k]
+            if k in keep and not (bucket_runs and bucket_runs[-1][3] == price):
+                bucket_runs.append([first_seen, last_seen, count, price])
+            else:
+                previous = bucket_runs[-1]
+                previous[1] = max(previous[1], last_seen)
+                previous[2] += count
+        compacted.extend(tuple(run) for run in bucket_runs)
+        i = j
+    return compacted
+
+def rollup_columns(rows):
+    """Columnar form of rollup rows"""
+    return {
+        't': [row[0] for row in rows],
+        'count': [row[1] for row in rows],
+        'min': [round(row[2], 2) for row in rows],
+        'max': [round(row[3], 2) for row in rows],
+        'avg': [round(row[4] / row[1], 2) for row in rows]
+    }
+
+def lttb(timestamps, prices, threshold):
+    """Largest-Triangle-Three-Buckets downsampling, keeping the points that shape the line"""
+    length = len(timestamps)
+    if threshold >= length or threshold < 3:
+        return list(timestamps), list(prices)
+
+    sampled_t, sampled_p = [timestamps[0]], [prices[0]]
+    every = (length - 2) / (threshold - 2)
+    a = 0
+    for i in range(threshold - 2):
+        # Average of the next bucket is the third triangle vertex
+        next_start = int((i + 1) * every) + 1
+        next_end = min(int((i + 2) * every) + 1, length)
+        count = next_end - next_start
+        avg_t = sum(timestamps[next_start:next_end]) / count
+        avg_p = sum(prices[next_start:next_end]) / count
+
+        bucket_start = int(i * every) + 1
+        bucket_end = int((i + 1) * every) + 1
+        point_t, point_p = timestamps[a], prices[a]
+        best_area, best = -1, bucket_start
+        for j in range(bucket_start, bucket_end):
+            area = abs((point_t - avg_t) * (prices[j] - point_p) -
+                       (point_t - timestamps[j]) * (avg_p - point_p))
+            if area > best_area:
+                best_area, best = area, j
+        sampled_t.append(timestamps[best])
+        sampled_p.append(prices[best])
+        a = best
+
+    sampled_t.append(timestamps[-1])
+    sampled_p.append(prices[-1])
+    return sampled_t, sampled_p
+
+def minmax(timestamps, prices, threshold):
+    """Keep the lowest and highest price of each bucket, so no spike is lost"""
+    length = len(timestamps)
+    buckets = threshold // 2
+    if threshold >= length or buckets < 1:
+        return list(timestamps), list(prices)
+
+    sampled_t, sampled_p = [], []
+    size = length / buckets
+    for i in range(buckets):
+        start, end = int(i * size), int((i + 1) * size)
+        if start >= end:
+            continue
+        low = min(range(start, end), key=prices.__getitem__)
+        high = max(range(start, end), key=prices.__getitem__)
+        for j in sorted({low, high}):
+            sampled_t.append(timestamps[j])
+            sampled_p.append(prices[j])
+    return sampled_t, sampled_p
+
+DOWNSAMPLERS = {'lttb': lttb, 'minmax': minmax}
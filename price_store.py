@@ -0,0 +1,380 @@
+#price_store.py
+
+from contextlib import contextmanager
+from array import array
+from datetime import datetime
+import threading
+import argparse
+import logging
+import struct
+import time
+import glob
+import csv
+import os
+import sys
+
+try:
+    import fcntl
+except ImportError:
+    # Without flock (Windows) writes are only serialized between threads of one process
+    fcntl = None
+
+class PriceStore:
+    """Append-only binary store of price runs for one item
+
+    The file is a small header followed by fixed-size little-endian records of
+    int64 first-seen and last-seen Unix timestamps, an int64 observation count
+    and a float64 price. Repeated observations of the same price on the same
+    day extend the latest run in place instead of adding a record, so appends
+    and the latest entry are O(1) and the columns load straight into arrays.
+    Version 1 files, one (timestamp, price) record per day, are upgraded on
+    first use. Writers hold an exclusive flock on the file, so worker
+    processes and compaction can update the same store. The cached latest
+    run and record count are dropped whenever the file's inode, size or
+    modification time no longer match those they were read at, and are not
+    trusted while the file was modified within the last second.
+    """
+
+    MAGIC = b'PTPS'
+    VERSION = 2
+    HEADER = struct.Struct('<4sI')
+    RECORD = struct.Struct('<qqqd')
+    RECORD_V1 = struct.Struct('<qd')
+
+    def __init__(self, path):
+        self.path = path
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        self._latest = None
+        self._count = None
+        self._stamp = None
+
+    def exists(self):
+        """Whether the store file has been created"""
+        return os.path.exists(self.path)
+
+    def create(self):
+        """Create an empty store file"""
+        with self._lock:
+            with open(self.path, 'wb') as f:
+                f.write(self.HEADER.pack(self.MAGIC, self.VERSION))
+            self._latest = None
+            self._count = 0
+
+    def _check_header(self, f):
+        magic, version = self.HEADER.unpack(f.read(self.HEADER.size))
+        if magic != self.MAGIC or version != self.VERSION:
+            raise ValueError(f"Unsupported price store format in {self.path}")
+
+    @contextmanager
+    def _open_locked(self):
+        """Open the store for update, holding the thread lock and an exclusive flock
+
+        replace_before() swaps in a new file, so a lock granted on a file that
+        has since been replaced is dropped and taken again on the current one.
+        """
+        with self._lock:
+            while True:
+                with open(self.path, 'r+b') as f:
+                    if fcntl is not None:
+                        fcntl.flock(f, fcntl.LOCK_EX)
+                        if os.fstat(f.fileno()).st_ino != os.stat(self.path).st_ino:
+                            continue
+                    yield f
+                    return
+
+    def upgrade(self):
+        """Rewrite a version 1 store as single-observation runs; returns True if it was upgraded"""
+        with self._open_locked() as f:
+            magic, version = self.HEADER.unpack(f.read(self.HEADER.size))
+            if magic != self.MAGIC or version != 1:
+                return False
+            data = f.read()
+            size = len(data) - len(data) % self.RECORD_V1.size
+            records = [(ts, ts, 1, price) for ts, price in self.RECORD_V1.iter_unpack(data[:size])]
+            self._write(records)
+        self.logger.info(f"Upgraded price store {self.path} to version {self.VERSION}")
+        return True
+
+    def _write(self, records):
+        """Atomically replace the file with records, holding the lock"""
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(self.HEADER.pack(self.MAGIC, self.VERSION))
+            f.write(b''.join(self.RECORD.pack(*record) for record in records))
+        os.replace(tmp_path, self.path)
+        self._latest = records[-1] if records else None
+        self._count = len(records)
+
+    def _record_bytes(self, f):
+        """Size of the record area, ignoring a torn trailing record"""
+        size = os.fstat(f.fileno()).st_size - self.HEADER.size
+        return max(0, size - size % self.RECORD.size)
+
+    def _read_latest(self, f):
+        size = self._record_bytes(f)
+        if not size:
+            return None
+        f.seek(self.HEADER.size + size - self.RECORD.size)
+        return self.RECORD.unpack(f.read(self.RECORD.size))
+
+    def observe(self, timestamp, price):
+        """Record one observation; returns True if it started a new run
+
+        An observation of the latest run's price on the same local day only
+        moves that run's last-seen time and count. Runs are closed at midnight
+        so every observed day keeps a record of its own.
+        """
+        timestamp, price = int(timestamp), float(price)
+        with self._open_locked() as f:
+            self._check_header(f)
+            # Read rather than cached, another process may have appended since
+            latest = self._read_latest(f)
+            # Drop any torn record left by an interrupted write
+            end = self.HEADER.size + self._record_bytes(f)
+            if (latest is not None and latest[3] == price
+                    and timestamp_to_date(latest[0]) == timestamp_to_date(timestamp)):
+                run = (latest[0], max(latest[1], timestamp), latest[2] + 1, price)
+                f.seek(end - self.RECORD.size)
+                f.write(self.RECORD.pack(*run))
+                f.truncate()
+                self._remember(f, run, (end - self.HEADER.size) // self.RECORD.size)
+                return False
+            if latest is not None and timestamp <= latest[0]:
+                # Keep run starts strictly increasing when the clock has not moved on
+                timestamp = latest[0] + 1
+            run = (timestamp, timestamp, 1, price)
+            f.seek(end)
+            f.truncate()
+            f.write(self.RECORD.pack(*run))
+            self._remember(f, run, (end - self.HEADER.size) // self.RECORD.size + 1)
+            return True
+
+    def append(self, timestamp, price):
+        """Append one single-observation run"""
+        self.extend([(timestamp, price)])
+
+    def extend(self, records):
+        """Append many (timestamp, price) observations at once, one run each"""
+        records = [(int(ts), int(ts), 1, float(price)) for ts, price in records]
+        if not records:
+            return
+        with self._open_locked() as f:
+            self._check_header(f)
+            size = self._record_bytes(f)
+            f.seek(self.HEADER.size + size)
+            f.truncate()
+            f.write(b''.join(self.RECORD.pack(*record) for record in records))
+            self._remember(f, records[-1], size // self.RECORD.size + len(records))
+
+    def _remember(self, f, latest, count):
+        """Cache the latest run and record count of the file just written through f"""
+        f.flush()
+        self._latest = latest
+        self._count = count
+        self._stamp = self._file_stamp(os.fstat(f.fileno()))
+
+    @staticmethod
+    def _file_stamp(stat):
+        return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+    def _revalidate(self):
+        """Drop the cached latest run and count if another process has written the file"""
+        try:
+            stamp = self._file_stamp(os.stat(self.path))
+        except OSError:
+            stamp = None
+        # A write within the filesystem's timestamp granularity may leave size and mtime unchanged
+        if stamp != self._stamp or (stamp is not None and time.time_ns() - stamp[2] < 1_000_000_000):
+            self._latest = None
+            self._count = None
+            self._stamp = stamp
+        return stamp is not None
+
+    def latest(self):
+        """Return the (last_seen, price) of the most recent run, or None if empty"""
+        with self._lock:
+            if self._revalidate() and self._latest is None:
+                with open(self.path, 'rb') as f:
+                    self._check_header(f)
+                    self._latest = self._read_latest(f)
+            return (self._latest[1], self._latest[3]) if self._latest else None
+
+    def __len__(self):
+        with self._lock:
+            if not self._revalidate():
+                return 0
+            if self._count is None:
+                with open(self.path, 'rb') as f:
+                    self._count = self._record_bytes(f) // self.RECORD.size
+            return self._count
+
+    def read_columns(self):
+        """Return the whole history as (timestamps, prices) arrays of run starts"""
+        return self.read_range()
+
+    def _search(self, f, count, timestamp):
+        """Index of the first record starting at or after timestamp, by binary search over the file"""
+        low, high = 0, count
+        while low < high:
+            mid = (low + high) // 2
+            f.seek(self.HEADER.size + mid * self.RECORD.size)
+            if self.RECORD.unpack(f.read(self.RECORD.size))[0] < timestamp:
+                low = mid + 1
+            else:
+                high = mid
+        return low
+
+    def read_runs(self, start=None, end=None):
+        """Return runs starting within [start, end] as (first_seen, last_seen, count, price) arrays
+
+        Records are in timestamp order, so the bounds are found by binary search
+        and only the matching slice of the file is read.
+        """
+        if not self.exists():
+            return self._columns(b'')
+        with self._lock:
+            with open(self.path, 'rb') as f:
+                self._check_header(f)
+                count = self._record_bytes(f) // self.RECORD.size
+                first = 0 if start is None else self._search(f, count, start)
+                last = count if end is None else self._search(f, count, end + 1)
+                f.seek(self.HEADER.size + first * self.RECORD.size)
+                data = f.read(max(0, last - first) * self.RECORD.size)
+        return self._columns(data)
+
+    def read_last(self, count):
+        """Return the latest count runs as (timestamps, prices) arrays, reading only their records"""
+        data = b''
+        if self.exists():
+            with self._lock:
+                with open(self.path, 'rb') as f:
+                    self._check_header(f)
+                    size = self._record_bytes(f)
+                    length = min(size, max(0, count) * self.RECORD.size)
+                    f.seek(self.HEADER.size + size - length)
+                    data = f.read(length)
+        timestamps, _, _, prices = self._columns(data)
+        return timestamps, prices
+
+    def _columns(self, data):
+        """Split packed records into (first_seen, last_seen, count, price) arrays"""
+        columns = array('q'), array('q'), array('q'), array('d')
+        # Records interleave four 8-byte fields, so every fourth element is one column
+        raw_ints, raw_floats = array('q'), array('d')
+        raw_ints.frombytes(data)
+        raw_floats.frombytes(data)
+        if sys.byteorder != 'little':
+            raw_ints.byteswap()
+            raw_floats.byteswap()
+        for column, values in zip(columns, (raw_ints[0::4], raw_ints[1::4], raw_ints[2::4], raw_floats[3::4])):
+            column.extend(values)
+        return columns
+
+    def read_range(self, start=None, end=None):
+        """Return runs starting within [start, end] as (timestamps, prices) arrays"""
+        timestamps, _, _, prices = self.read_runs(start, end)
+        return timestamps, prices
+
+    def replace_before(self, timestamp, runs):
+        """Replace the runs starting before timestamp with runs, keeping the later ones
+
+        The file stays locked until the new one replaces it, so observations
+        from other processes wait and then go to the new file.
+        """
+        with self._open_locked() as f:
+            self._check_header(f)
+            count = self._record_bytes(f) // self.RECORD.size
+            offset = self.HEADER.size + self._search(f, count, timestamp) * self.RECORD.size
+            f.seek(offset)
+            tail = f.read(self.HEADER.size + count * self.RECORD.size - offset)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'wb') as out:
+                out.write(self.HEADER.pack(self.MAGIC, self.VERSION))
+                out.write(b''.join(self.RECORD.pack(*run) for run in runs))
+                out.write(tail)
+            os.replace(tmp_path, self.path)
+            self._latest = None
+            self._count = None
+
+def date_to_timestamp(date_str):
+    """Convert a YYYY-MM-DD date to the Unix timestamp of its local midnight"""
+    return int(datetime.strptime(date_str, '%Y-%m-%d').timestamp())
+
+def timestamp_to_date(timestamp):
+    """Convert a Unix timestamp to a local YYYY-MM-DD date"""
+    return datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d')
+
+def timestamp_to_time(timestamp):
+    """Convert a Unix timestamp to a local HH:MM:SS time of day"""
+    return datetime.fromtimestamp(timestamp).strftime('%H:%M:%S')
+
+def row_to_timestamp(row):
+    """Unix timestamp of a Date[,Time] CSV row; legacy rows without a Time are at midnight"""
+    if row.get('Time'):
+        return int(datetime.strptime(f"{row['Date']} {row['Time']}", '%Y-%m-%d %H:%M:%S').timestamp())
+    return date_to_timestamp(row['Date'])
+
+def import_csv(store, csv_path):
+    """Load Date,Time,Price or legacy Date,Price rows from a CSV into an empty store"""
+    records = []
+    with open(csv_path, 'r', newline='') as f:
+        for row in csv.DictReader(f):
+            try:
+                records.append((row_to_timestamp(row), float(row['Price'])))
+            except (KeyError, TypeError, ValueError):
+                continue
+    records.sort()
+    store.create()
+    store.extend(records)
+    return len(records)
+
+def export_csv(store, csv_path):
+    """Write the store out as a Date,Time,Price CSV, one row per run start"""
+    timestamps, prices = store.read_columns()
+    with open(csv_path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['Date', 'Time', 'Price'])
+        for timestamp, price in zip(timestamps, prices):
+            writer.writerow([timestamp_to_date(timestamp), timestamp_to_time(timestamp), f"{price:.2f}"])
+    return len(timestamps)
+
+def migrate_data_dir(data_dir='data'):
+    """Convert every legacy {item_id}_prices.csv in data_dir to a binary store
+
+    Version 1 binary stores are upgraded in the same pass.
+    """
+    migrated = 0
+    for bin_path in sorted(glob.glob(os.path.join(data_dir, '*_prices.bin'))):
+        if PriceStore(bin_path).upgrade():
+            migrated += 1
+    for csv_path in sorted(glob.glob(os.path.join(data_dir, '*_prices.csv'))):
+        store = PriceStore(csv_path[:-len('.csv')] + '.bin')
+        if store.exists():
+            continue
+        count = import_csv(store, csv_path)
+        os.replace(csv_path, csv_path + '.migrated')
+        logging.getLogger(__name__).info(f"Migrated {count} rows from {csv_path}")
+        migrated += 1
+    return migrated
+
+def main():
+    """Migrate legacy CSV histories, or export binary stores back to CSV"""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument('--data-dir', default='data')
+    parser.add_argument('--export', action='store_true',
+                        help='write {item_id}_prices.csv next to every binary store')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    if args.export:
+        for bin_path in sorted(glob.glob(os.path.join(args.data_dir, '*_prices.bin'))):
+            store = PriceStore(bin_path)
+            store.upgrade()
+            count = export_csv(store, bin_path[:-len('.bin')] + '.csv')
+            print(f"Exported {count} rows from {bin_path}")
+    else:
+        print(f"Migrated {migrate_data_dir(args.data_dir)} price histories")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+#profiles.py
+
+from urllib.parse import urlparse
+import threading
+import logging
+import json
+import re
+import os
+
+# Profile used for domains without their own entry; mirrors the original hardcoded selectors
+DEFAULT_PROFILE = {
+    'price': [
+        {'selector': 'meta[property="product:price:amount"]', 'source': 'attr', 'attribute': 'content'},
+        {'selector': '.price', 'source': 'text'},
+        {'selector': '.regular-price', 'source': 'text'},
+        {'selector': 'span[data-price-type="finalPrice"]', 'source': 'text'},
+        {'selector': '.product-price', 'source': 'text'}
+    ],
+    'title': [
+        {'selector': 'meta[property="og:title"]', 'source': 'attr', 'attribute': 'content'},
+        {'selector': 'h1.page-title', 'source': 'text'}
+    ],
+    'decimal_separator': 'auto'
+}
+
+# First number in the text, which may start with its decimal point as in "$.99";
+# for ranges such as "$10 - $20" that is the low end
+NUMBER_PATTERN = r"(?:\d|[.,]\d)[\d.,'\s\u00a0\u202f]*"
+
+class Rule:
+    """Where to read a field: a CSS selector plus the element text or an attribute"""
+
+    def __init__(self, selector, source='text', attribute='content'):
+        self.selector = selector
+        self.source = source
+        self.attribute = attribute
+
+    def value(self, text, attrs):
+        """Pick the configured source from an element's text and attributes"""
+        if self.source == 'attr':
+            return (attrs.get(self.attribute) or '').strip()
+        # Elements with empty text may still carry the value in a content attribute
+        return (text or attrs.get('content') or '').strip()
+
+class ExtractionProfile:
+    """Compiled selectors and price parsing rules for one domain"""
+
+    def __init__(self, domain, price, title, decimal_separator='auto', price_pattern=None,
+                 js_only=False):
+        """
+        domain: domain the profile applies to, '*' for the default profile
+        price / title: lists of rule dicts with selector, source ('text' or 'attr') and attribute
+        decimal_separator: '.', ',' or 'auto' to infer it from each price string
+        price_pattern: regex locating the amount, may use a named group 'amount'
+        js_only: the site needs a browser, skip the HTTP fast path
+        """
+        self.domain = domain
+        self.price_rules = [Rule(**rule) for rule in price]
+        self.title_rules = [Rule(**rule) for rule in title]
+        self.decimal_separator = decimal_separator
+        self.price_pattern = re.compile(price_pattern or NUMBER_PATTERN)
+        self.js_only = js_only
+
+    @classmethod
+    def from_dict(cls, domain, data):
+        """Build a profile from its JSON form, falling back to the defaults for missing keys"""
+        return cls(
+            domain,
+            data.get('price', DEFAULT_PROFILE['price']),
+            data.get('title', DEFAULT_PROFILE['title']),
+            data.get('decimal_separator', DEFAULT_PROFILE['decimal_separator']),
+            data.get('price_pattern'),
+            data.get('js_only', False)
+        )
+
+    @property
+    def price_selectors(self):
+        return [rule.selector for rule in self.price_rules]
+
+    @property
+    def title_selectors(self):
+        return [rule.selector for rule in self.title_rules]
+
+    def rule(self, field, selector):
+        """The rule for a selector of 'price' or 'title'"""
+        rules = self.price_rules if field == 'price' else self.title_rules
+        for rule in rules:
+            if rule.selector == selector:
+                return rule
+        return None
+
+    def rule_price(self, rule, text, attrs):
+        """Parse the price a rule reads from an element's text and attributes
+
+        Attribute values such as product:price:amount are machine formatted,
+        so they always use '.' as the decimal separator whatever the page's locale.
+        """
+        machine = rule.source == 'attr' or not text
+        return self.parse_price(rule.value(text, attrs), '.' if machine else None)
+
+    def parse_price(self, text, decimal_separator=None):
+        """Convert a price string to a float, handling currency, locales and ranges
+
+        decimal_separator overrides the profile's setting, e.g. '.' for machine-formatted values
+        """
+        match = self.price_pattern.search(text or '')
+        if not match:
+            raise ValueError(f"No price in {text!r}")
+        amount = match.group('amount') if 'amount' in self.price_pattern.groupindex else match.group(0)
+        amount = re.sub(r"[\s\u00a0\u202f']", '', amount).rstrip('.,')
+
+        decimal = decimal_separator or self.decimal_separator
+        if decimal == 'auto':
+            decimal = self._infer_decimal(amount)
+        thousands = ',' if decimal == '.' else '.'
+        return float(amount.replace(thousands, '').replace(decimal, '.'))
+
+    def _infer_decimal(self, amount):
+        """Guess the decimal separator: the last separator if both appear, else by digit count"""
+        last_dot, last_comma = amount.rfind('.'), amount.rfind(',')
+        if last_dot >= 0 and last_comma >= 0:
+            return '.' if last_dot > last_comma else ','
+        separator = '.' if last_dot >= 0 else ',' if last_comma >= 0 else '.'
+        # "1,299" and "1.299" are thousands groups, "12,99" and "12.99" are decimals
+        if amount.count(separator) == 1 and len(amount) - amount.rfind(separator) - 1 != 3:
+            return separator
+        return '.' if separator == ',' else ','
+
+class ProfileRegistry:
+    """Per-domain extraction profiles, loaded once from JSON and cached by domain"""
+
+    def __init__(self, profiles_file='data/profiles.json'):
+        self.profiles_file = profiles_file
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        self.default = ExtractionProfile.from_dict('*', DEFAULT_PROFILE)
+        self._profiles = self._load()
+        self._by_domain = {}
+
+    def _load(self):
+        """Load and compile profiles from file"""
+        profiles = {}
+        try:
+            if os.path.exists(self.profiles_file):
+                with open(self.profiles_file, 'r') as f:
+                    for domain, data in json.load(f).items():
+                        profiles[domain.lower()] = ExtractionProfile.from_dict(domain.lower(), data)
+                self.logger.info(f"Loaded {len(profiles)} extraction profiles")
+        except Exception as e:
+            self.logger.error(f"Error loading extraction profiles: {e}")
+        return profiles
+
+    def reload(self):
+        """Re-read the profiles file"""
+        profiles = self._load()
+        with self._lock:
+            self._profiles = profiles
+            self._by_domain = {}
+
+    def for_url(self, url):
+        """Profile for a URL's domain, trying parent domains before the default"""
+        host = urlparse(url).netloc.lower().split(':')[0]
+        with self._lock:
+            profile = self._by_domain.get(host)
+            if profile is None:
+                profile = self.default
+                parts = host.split('.')
+                for i in range(len(parts) - 1):
+                    candidate = self._profiles.get('.'.join(parts[i:]))
+                    if candidate is not None:
+                        profile = candidate
+                        break
+                self._by_domain[host] = profile
+            return profile
+
+_default_registry = None
+
+def get_default_registry():
+    """Shared registry for code paths created without an explicit one"""
+    global _default_registry
+    if _default_registry is None:
+        _default_registry = ProfileRegistry()
+    return _default_registry
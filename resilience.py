@@ -0,0 +1,296 @@
+#resilience.py
+
+from urllib.error import HTTPError, URLError
+from http.client import HTTPException
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+import threading
+import logging
+import random
+import socket
+import json
+import time
+import os
+
+# Kinds of scrape failure
+TIMEOUT = 'timeout'
+NOT_FOUND = 'not_found'
+BLOCKED = 'blocked'
+PARSE = 'parse'
+NETWORK = 'network'
+UNKNOWN = 'unknown'
+
+# Failures that say the retailer is down or refusing us, rather than one page being wrong
+DOMAIN_ERRORS = (TIMEOUT, BLOCKED, NETWORK)
+
+NOT_FOUND_STATUS = (404, 410)
+BLOCKED_STATUS = (401, 403, 429)
+
+# Page titles of bot walls and access-denied pages
+BLOCK_MARKERS = ('captcha', 'access denied', 'are you a robot', 'are you human',
+                 'attention required', 'request blocked', 'unusual traffic')
+
+class ScrapeError(Exception):
+    """A failed scrape, classified by kind"""
+
+    def __init__(self, kind, message, retry_after=None):
+        """
+        kind: one of TIMEOUT, NOT_FOUND, BLOCKED, PARSE, NETWORK, UNKNOWN
+        retry_after: seconds the site asked us to wait, if it said
+        """
+        super().__init__(message)
+        self.kind = kind
+        self.retry_after = retry_after
+
+class CircuitOpenError(ScrapeError):
+    """Scrape skipped because its domain's circuit breaker is open"""
+
+    def __init__(self, domain, retry_at):
+        super().__init__('circuit_open', f"Circuit open for {domain} until {time.ctime(retry_at)}")
+        self.domain = domain
+        self.retry_at = retry_at
+
+def _retry_after(headers):
+    """Seconds from a Retry-After header (delta or HTTP date), or None"""
+    value = headers.get('Retry-After') if headers else None
+    if not value:
+        return None
+    try:
+        return max(0, int(value))
+    except ValueError:
+        pass
+    try:
+        return max(0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+def looks_blocked(title):
+    """Whether a page title looks like a bot wall"""
+    title = (title or '').lower()
+    return any(marker in title for marker in BLOCK_MARKERS)
+
+def classify_error(error):
+    """The ScrapeError describing any exception raised while scraping"""
+    if isinstance(error, ScrapeError):
+        return error
+    message = str(error) or type(error).__name__
+    if isinstance(error, HTTPError):
+        retry_after = _retry_after(error.headers)
+        if error.code in NOT_FOUND_STATUS:
+            return ScrapeError(NOT_FOUND, f"HTTP {error.code}")
+        if error.code in BLOCKED_STATUS or (error.code == 503 and retry_after is not None):
+            return ScrapeError(BLOCKED, f"HTTP {error.code}", retry_after)
+        return ScrapeError(NETWORK, f"HTTP {error.code}", retry_after)
+    reason = error.reason if isinstance(error, URLError) else error
+    # Matched by name so this module does not need Selenium
+    if isinstance(reason, (socket.timeout, TimeoutError)) or type(reason).__name__ == 'TimeoutException':
+        return ScrapeError(TIMEOUT, message)
+    if isinstance(reason, (OSError, HTTPException)):
+        return ScrapeError(NETWORK, message)
+    if type(error).__name__ == 'WebDriverException' and ('neterror' in message or 'Reached error page' in message):
+        return ScrapeError(NETWORK, message.strip().splitlines()[0])
+    if isinstance(error, ValueError):
+        return ScrapeError(PARSE, message)
+    return ScrapeError(UNKNOWN, message)
+
+def backoff_delay(failures, base, cap, jitter=0.5):
+    """Exponential delay after consecutive failures, reduced by a random fraction up to jitter"""
+    delay = min(cap, base * 2 ** max(0, failures - 1))
+    return delay * random.uniform(1 - jitter, 1)
+
+class ResilienceTracker:
+    """Per-item retry backoff and per-domain circuit breakers, persisted between runs
+
+    Every failed scrape pushes the item's next attempt back exponentially.
+    Consecutive timeouts, blocks and network errors on one domain open its
+    breaker: its items are skipped for a cooldown, after which a single probe
+    scrape is let through. A successful probe closes the breaker, a failed one
+    reopens it with a doubled cooldown.
+    """
+
+    def __init__(self, state_file='data/resilience.json', retry_base_minutes=15,
+                 retry_cap_hours=24, not_found_base_hours=6, not_found_cap_hours=168,
+                 failure_threshold=5, cooldown_minutes=10, cooldown_cap_hours=6):
+        """
+        state_file: where backoff and breaker state persist between runs
+        retry_base_minutes / retry_cap_hours: first and longest item backoff
+        not_found_base_hours / not_found_cap_hours: backoff for pages that are gone
+        failure_threshold: consecutive domain errors that open a breaker
+        cooldown_minutes / cooldown_cap_hours: first and longest breaker cooldown
+        """
+        self.state_file = state_file
+        self.retry_base = retry_base_minutes * 60
+        self.retry_cap = retry_cap_hours * 3600
+        self.not_found_base = not_found_base_hours * 3600
+        self.not_found_cap = not_found_cap_hours * 3600
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown_minutes * 60
+        self.cooldown_cap = cooldown_cap_hours * 3600
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        state = self._load()
+        self.items = state.get('items', {})
+        self.domains = state.get('domains', {})
+
+    def _load(self):
+        """Load persisted state"""
+        try:
+            if os.path.exists(self.state_file):
+                with open(self.state_file, 'r') as f:
+                    return json.load(f)
+        except Exception as e:
+            self.logger.error(f"Error loading resilience state: {e}")
+        return {}
+
+    def save(self):
+        """Persist state atomically"""
+        try:
+            with self._lock:
+                data = json.dumps({'items': self.items, 'domains': self.domains}, indent=4)
+                os.makedirs(os.path.dirname(self.state_file) or '.', exist_ok=True)
+                tmp_path = f"{self.state_file}.tmp"
+                with open(tmp_path, 'w') as f:
+                    f.write(data)
+                os.replace(tmp_path, self.state_file)
+        except Exception as e:
+            self.logger.error(f"Error saving resilience state: {e}")
+
+    @staticmethod
+    def get_domain(url):
+        return urlparse(url).netloc.lower()
+
+    def _state(self, breaker, now):
+        if breaker is None or breaker.get('open_until') is None:
+            return 'closed'
+        return 'open' if now < breaker['open_until'] else 'half_open'
+
+    def domain_state(self, url, now=None):
+        """'closed', 'open' or 'half_open' for the URL's domain"""
+        with self._lock:
+            return self._state(self.domains.get(self.get_domain(url)), now or time.time())
+
+    def allow(self, item_id, url, now=None):
+        """(allowed, reason) for scraping an item now; reason is 'backoff' or 'circuit_open'
+
+        Admitting an item on a half-open domain makes it that domain's probe;
+        other items of the domain are refused until the probe reports back.
+        """
+        now = now or time.time()
+        domain = self.get_domain(url)
+        with self._lock:
+            breaker = self.domains.get(domain)
+            state = self._state(breaker, now)
+            if state == 'open':
+                return False, 'circuit_open'
+            entry = self.items.get(item_id)
+            if entry and entry.get('next_attempt', 0) > now:
+                return False, 'backoff'
+            if state == 'half_open':
+                # A probe that never reported back (e.g. a crash) expires after one cooldown
+                if breaker.get('probe_started', 0) > now - breaker.get('cooldown', self.cooldown):
+                    return False, 'circuit_open'
+                breaker['probe_started'] = now
+            return True, None
+
+    def check_domain(self, url, now=None):
+        """Raise CircuitOpenError if the URL's domain breaker opened since the item was admitted"""
+        now = now or time.time()
+        domain = self.get_domain(url)
+        with self._lock:
+            breaker = self.domains.get(domain)
+            if self._state(breaker, now) == 'open':
+                raise CircuitOpenError(domain, breaker['open_until'])
+
+    def record_success(self, item_id, url):
+        """Clear an item's backoff and close its domain breaker"""
+        domain = self.get_domain(url)
+        with self._lock:
+            self.items.pop(item_id, None)
+            breaker = self.domains.pop(domain, None)
+        if breaker and breaker.get('open_until') is not None:
+            self.logger.info(f"Circuit closed for {domain}")
+
+    def record_failure(self, item_id, url, error, now=None):
+        """Back off an item after a failure and count it against the domain; returns the ScrapeError"""
+        error = classify_error(error)
+        if isinstance(error, CircuitOpenError):
+            return error
+        now = now or time.time()
+        domain = self.get_domain(url)
+        with self._lock:
+            entry = self.items.setdefault(item_id, {'failures': 0})
+            entry['failures'] += 1
+            if error.kind == NOT_FOUND:
+                delay = backoff_delay(entry['failures'], self.not_found_base, self.not_found_cap)
+            else:
+                delay = backoff_delay(entry['failures'], self.retry_base, self.retry_cap)
+            entry.update({
+                'next_attempt': now + max(delay, error.retry_after or 0),
+                'last_error': error.kind,
+                'message': str(error)[:200]
+            })
+
+            breaker = self.domains.get(domain)
+            if error.kind in DOMAIN_ERRORS:
+                breaker = self.domains.setdefault(domain, {'failures': 0, 'open_until': None})
+                breaker['failures'] += 1
+                breaker['last_error'] = error.kind
+                state = self._state(breaker, now)
+                if state == 'half_open' or (state == 'closed' and breaker['failures'] >= self.failure_threshold):
+                    cooldown = breaker.get('cooldown')
+                    cooldown = min(self.cooldown_cap, cooldown * 2) if state == 'half_open' and cooldown else self.cooldown
+                    breaker.update({
+                        'open_until': now + max(cooldown, error.retry_after or 0),
+                        'cooldown': cooldown,
+                        'probe_started': 0
+                    })
+                    self.logger.warning(
+                        f"Circuit opened for {domain} for {cooldown / 60:.0f} minutes "
+                        f"after {breaker['failures']} failures ({error.kind})"
+                    )
+            elif breaker and error.kind in (PARSE, NOT_FOUND):
+                # The site answered and only this page is wrong, which ends the run of domain errors
+                self.domains.pop(domain, None)
+        return error
+
+    def retry_at(self, item_id, url):
+        """Earliest time an item may be scraped again, or None if it may be scraped now"""
+        now = time.time()
+        with self._lock:
+            times = [self.items.get(item_id, {}).get('next_attempt', 0)]
+            breaker = self.domains.get(self.get_domain(url))
+            if self._state(breaker, now) == 'open':
+                times.append(breaker['open_until'])
+        retry_at = max(times)
+        return retry_at if retry_at > now else None
+
+    def retain(self, item_ids):
+        """Forget items that are no longer tracked"""
+        with self._lock:
+            for item_id in [item_id for item_id in self.items if item_id not in item_ids]:
+                del self.items[item_id]
+
+    def breaker_states(self):
+        """[(labels, 1 if open else 0)] per domain with failures, for the metrics gauge"""
+        now = time.time()
+        with self._lock:
+            return [({'domain': domain}, 1 if self._state(breaker, now) == 'open' else 0)
+                    for domain, breaker in self.domains.items()]
+
+    def stats(self):
+        """Items in backoff and domain breakers, for the dashboard API"""
+        now = time.time()
+        with self._lock:
+            return {
+                'items_in_backoff': sum(1 for entry in self.items.values()
+                                        if entry.get('next_attempt', 0) > now),
+                'domains': {
+                    domain: {
+                        'state': self._state(breaker, now),
+                        'failures': breaker['failures'],
+                        'last_error': breaker.get('last_error'),
+                        'open_until': breaker.get('open_until')
+                    }
+                    for domain, breaker in self.domains.items()
+                }
+            }
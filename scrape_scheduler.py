@@ -0,0 +1,164 @@
+#scrape_scheduler.py
+
+from collections import deque
+from update_engine import UpdateEngine
+import threading
+import logging
+import random
+import json
+import time
+import os
+
+HOUR = 3600
+
+class AdaptiveScheduler:
+    """Spreads item scrapes across the day, adapting each item's interval to its price volatility
+
+    Every tick picks the items whose next run is due, within a per-domain hourly
+    budget, scrapes them, and schedules each again after an interval between
+    min_interval and max_interval hours: volatile prices are checked often,
+    static ones rarely. Next-run times persist so a restart resumes the plan.
+    """
+
+    def __init__(self, tracker, schedule_file='data/schedule.json', min_interval_hours=4,
+                 max_interval_hours=72, default_interval_hours=24, jitter=0.15,
+                 domain_budget_per_hour=30, max_batch=None, volatility_window=30):
+        """
+        tracker: PriceTracker doing the scrapes
+        schedule_file: where next-run times persist between restarts
+        min_interval_hours / max_interval_hours: bounds of the adaptive refresh interval
+        default_interval_hours: interval for items without enough history
+        jitter: random fraction added to or removed from every interval
+        domain_budget_per_hour: maximum scrapes started per domain in any hour
+        max_batch: maximum items scraped per tick, defaults to four per worker
+        volatility_window: number of recent prices used to measure volatility
+        """
+        self.tracker = tracker
+        self.schedule_file = schedule_file
+        self.min_interval = min_interval_hours * HOUR
+        self.max_interval = max_interval_hours * HOUR
+        self.default_interval = default_interval_hours * HOUR
+        self.jitter = jitter
+        self.domain_budget_per_hour = domain_budget_per_hour
+        self.max_batch = max_batch or tracker.engine.max_workers * 4
+        self.volatility_window = volatility_window
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        self._domain_runs = {}
+        self.schedule = self._load()
+
+    def _load(self):
+        """Load persisted schedule entries"""
+        try:
+            if os.path.exists(self.schedule_file):
+                with open(self.schedule_file, 'r') as f:
+                    return json.load(f)
+        except Exception as e:
+            self.logger.error(f"Error loading schedule: {e}")
+        return {}
+
+    def save(self):
+        """Persist schedule entries atomically"""
+        try:
+            with self._lock:
+                data = json.dumps(self.schedule, indent=4)
+            tmp_path = f"{self.schedule_file}.tmp"
+            with open(tmp_path, 'w') as f:
+                f.write(data)
+            os.replace(tmp_path, self.schedule_file)
+        except Exception as e:
+            self.logger.error(f"Error saving schedule: {e}")
+
+    def volatility(self, item):
+        """Score in [0, 1] of how much an item's recent prices move, or None without history"""
+        prices = item['data_manager'].load_recent_prices(self.volatility_window)
+        if len(prices) < 3:
+            return None
+        changes = [abs(b - a) / a for a, b in zip(prices, prices[1:]) if a]
+        if not changes:
+            return None
+        change_rate = sum(1 for change in changes if change > 0) / len(changes)
+        mean_move = sum(changes) / len(changes)
+        # Frequent changes dominate; large moves (a 5% average move saturates) add on top
+        return min(1.0, 0.7 * change_rate + 0.3 * min(1.0, mean_move / 0.05))
+
+    def interval_for(self, item):
+        """Refresh interval in seconds for an item, with jitter"""
+        score = self.volatility(item)
+        if score is None:
+            interval = self.default_interval
+        else:
+            interval = self.max_interval - score * (self.max_interval - self.min_interval)
+        return interval * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def _first_run(self, item, now):
+        """Initial next-run time for an item the schedule has not seen"""
+        if item['data_manager'].get_latest_price() is None:
+            return now
+        # Spread known items over one default interval instead of scraping them all at once
+        return now + random.uniform(0, self.default_interval)
+
+    def _within_budget(self, domain, now):
+        runs = self._domain_runs.setdefault(domain, deque())
+        while runs and runs[0] <= now - HOUR:
+            runs.popleft()
+        return len(runs) < self.domain_budget_per_hour
+
+    def due_items(self, now=None):
+        """Item IDs due for a scrape, oldest first, limited by domain budgets and batch size"""
+        now = now or time.time()
+        items = self.tracker.items
+        changed = False
+        with self._lock:
+            for item_id in [key for key in self.schedule if key not in items]:
+                del self.schedule[item_id]
+                changed = True
+            for item_id, item in items.items():
+                if item_id not in self.schedule:
+                    self.schedule[item_id] = {'next_run': self._first_run(item, now)}
+                    changed = True
+
+            due = sorted(
+                (entry['next_run'], item_id) for item_id, entry in self.schedule.items()
+                if entry['next_run'] <= now
+            )
+            selected = []
+            for _, item_id in due:
+                if len(selected) >= self.max_batch:
+                    break
+                domain = UpdateEngine.get_domain(items[item_id]['scraper'].url)
+                if not self._within_budget(domain, now):
+                    continue
+                self._domain_runs[domain].append(now)
+                selected.append(item_id)
+        if changed:
+            self.save()
+        return selected
+
+    def tick(self):
+        """Scrape the items that are due and schedule their next runs"""
+        selected = self.due_items()
+        if not selected:
+            return []
+        self.logger.info(f"Scheduled scrape of {len(selected)} items")
+        self.tracker.update_prices(selected)
+
+        now = time.time()
+        items = self.tracker.items
+        with self._lock:
+            for item_id in selected:
+                if item_id in items:
+                    interval = self.interval_for(items[item_id])
+                    entry = {
+                        'next_run': now + interval,
+                        'interval_hours': round(interval / HOUR, 2),
+                        'last_run': now
+                    }
+                    # Failed and skipped items come back when their backoff or breaker cooldown ends
+                    retry_at = self.tracker.resilience.retry_at(item_id, items[item_id]['scraper'].url)
+                    if retry_at is not None:
+                        entry['next_run'] = retry_at
+                        entry['retry'] = True
+                    self.schedule[item_id] = entry
+        self.save()
+        return selected
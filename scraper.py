@@ -1,53 +1,257 @@
 #scraper.py
 
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.firefox.options import Options
-import os
+from driver_pool import get_default_pool
+from http_fetcher import fetch_page, extract_fields, content_hash
+from file_lock import locked, load_json, write_json
+from thumbnails import get_default_store, download_image
+from profiles import get_default_registry
+from metrics import get_default_metrics
+from item_registry import generate_item_id
+from resilience import ScrapeError, classify_error, looks_blocked, BLOCKED, NETWORK, NOT_FOUND, TIMEOUT
+from urllib.parse import urlparse
+import threading
+import time
 import logging
-import hashlib
+
+# Looks up every candidate [selector, attribute] in one round trip,
+# returning [text, {attribute: value, content: value}] or null for each
+FIND_SELECTORS_SCRIPT = """
+return arguments[0].map(function (rule) {
+    try {
+        var element = document.querySelector(rule[0]);
+        if (!element) { return null; }
+        var attrs = {content: element.getAttribute('content') || ''};
+        attrs[rule[1]] = element.getAttribute(rule[1]) || '';
+        return [element.innerText || element.textContent || '', attrs];
+    } catch (e) {
+        return null;
+    }
+});
+"""
+
+class SelectorStats:
+    """Per-domain record of which selectors matched, so the last winner is tried first
+
+    save() merges the matches recorded since the last save into the shared
+    file, so worker processes add to each other's stats.
+    """
+
+    def __init__(self, stats_file='data/selector_stats.json'):
+        self.stats_file = stats_file
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        # Matches recorded since the last save, in the same layout as domains
+        self._pending = {}
+        self.domains = self._load()
+
+    def _load(self):
+        """Load stats from file"""
+        try:
+            return load_json(self.stats_file, {})
+        except Exception as e:
+            self.logger.error(f"Error loading selector stats: {e}")
+        return {}
+
+    def save(self):
+        """Add the matches recorded since the last save to the stats file"""
+        try:
+            with locked(self.stats_file):
+                domains = self._load()
+                with self._lock:
+                    for domain, fields in self._pending.items():
+                        for field, pending in fields.items():
+                            entry = domains.setdefault(domain, {}).setdefault(field, {'last': None, 'hits': {}})
+                            entry['last'] = pending['last']
+                            for selector, hits in pending['hits'].items():
+                                entry['hits'][selector] = entry['hits'].get(selector, 0) + hits
+                    self.domains = domains
+                    self._pending = {}
+                write_json(self.stats_file, domains, indent=4)
+        except Exception as e:
+            self.logger.error(f"Error saving selector stats: {e}")
+
+    def order(self, url, field, selectors):
+        """Selectors for a field, last winner first, then by hit count, then default order"""
+        with self._lock:
+            entry = self.domains.get(urlparse(url).netloc.lower(), {}).get(field)
+        if not entry:
+            return list(selectors)
+        hits = entry.get('hits', {})
+        return sorted(selectors, key=lambda selector: (
+            selector != entry.get('last'),
+            -hits.get(selector, 0),
+            selectors.index(selector)
+        ))
+
+    def record(self, url, field, selector):
+        """Remember the selector that produced a field's value"""
+        domain = urlparse(url).netloc.lower()
+        with self._lock:
+            for domains in (self.domains, self._pending):
+                entry = domains.setdefault(domain, {}).setdefault(field, {'last': None, 'hits': {}})
+                entry['last'] = selector
+                entry['hits'][selector] = entry['hits'].get(selector, 0) + 1
 
 class PriceScraper:
     """Handles web scraping of prices and item details"""
     
-    def __init__(self, url):
+    def __init__(self, url, driver_pool=None, tier_stats=None, js_only=False,
+                 selector_stats=None, page_deadline=20, profile_registry=None,
+                 thumbnail_store=None, revalidate_hours=24, title_grace=2.0):
+        """
+        url: product page to scrape
+        driver_pool: DriverPool to borrow browsers from, defaults to the shared pool
+        tier_stats: FetchTierStats deciding whether to try plain HTTP first
+        js_only: skip the HTTP fast path for pages that need JavaScript
+        selector_stats: SelectorStats ordering selectors by what worked last time
+        page_deadline: overall seconds allowed for loading a page and finding its price
+        profile_registry: ProfileRegistry with the extraction rules for this URL's domain
+        thumbnail_store: ThumbnailStore keeping the compressed product images
+        revalidate_hours: longest time unchanged responses are trusted before a full parse or render
+        title_grace: seconds to keep waiting for a title once the price has rendered
+        """
         self.url = url
+        self.driver_pool = driver_pool or get_default_pool()
+        self.tier_stats = tier_stats
+        self.js_only = js_only
+        self.selector_stats = selector_stats
+        self.page_deadline = page_deadline
+        self.revalidate_hours = revalidate_hours
+        self.title_grace = title_grace
+        self.profile = (profile_registry or get_default_registry()).for_url(url)
         self.item_id = self._generate_item_id(url)
-        self.screenshot_dir = "static/thumbnails"
-        os.makedirs(self.screenshot_dir, exist_ok=True)
+        self.domain = urlparse(url).netloc.lower()
+        self.metrics = get_default_metrics()
+        self.thumbnails = thumbnail_store or get_default_store()
         self.logger = logging.getLogger(__name__)
         
     def _generate_item_id(self, url):
         """Generate a unique ID for the item based on URL"""
-        return hashlib.md5(url.encode()).hexdigest()[:10]
-        
-    def setup_driver(self):
-        """Setup Firefox in headless mode"""
-        options = Options()
-        options.add_argument('--headless')
-        options.add_argument('--no-sandbox')
-        options.add_argument('--disable-dev-shm-usage')
-        options.add_argument('--window-size=1920,1080')
-        return webdriver.Firefox(options=options)
+        return generate_item_id(url)
         
-    def get_item_data(self):
-        """Fetch price, title, and thumbnail"""
-        driver = None
+    def get_item_data(self, previous=None):
+        """Fetch price, title, and thumbnail, trying plain HTTP before a browser
+
+        previous is the item's stored metadata. When its price came from static
+        markup in a full scrape within revalidate_hours, the page is requested
+        conditionally: a 304 or an identical body returns the stored data as
+        unchanged, with no parse. Browser-tier pages are always rendered, since
+        an unchanged HTML shell says nothing about a script-loaded price.
+        Raises ScrapeError, classified by kind, when no tier finds the price.
+        """
+        previous = previous or {}
+        old = previous.get('validators') or {}
+        js_only = self.js_only or self.profile.js_only
+        if not js_only and self._should_try_http():
+            conditional = self._can_skip(previous)
+            try:
+                with self._phase('http_fetch'):
+                    if conditional:
+                        html, validators = fetch_page(self.url, old.get('etag'), old.get('last_modified'))
+                    else:
+                        html, validators = fetch_page(self.url)
+            except Exception as e:
+                error = classify_error(e)
+                # An unreachable site or a missing page will not load in a browser either
+                if error.kind in (TIMEOUT, NETWORK, NOT_FOUND):
+                    raise error
+                self._record_tier('http', False)
+                self.logger.info(f"HTTP fast path failed for {self.url}: {error}")
+            else:
+                if conditional and (html is None or validators['body_hash'] == old.get('body_hash')):
+                    return self._unchanged(previous, {**old, **validators},
+                                           'not_modified' if html is None else 'body_unchanged')
+                try:
+                    data = self._get_item_data_http(html)
+                except Exception as e:
+                    self.logger.info(f"HTTP fast path failed for {self.url}: {e}")
+                    data = None
+                self._record_tier('http', data is not None)
+                # Pages without an og:image still need a browser for the first thumbnail
+                if data and data['thumbnail_path']:
+                    return self._changed(data, old, {**validators, 'tier': 'http'})
+
         try:
-            driver = self.setup_driver()
-            driver.get(self.url)
-            wait = WebDriverWait(driver, 10)
-            
-            # Get price
-            price = self._get_price(wait)
+            data = self._get_item_data_browser()
+        except Exception as e:
+            self._record_tier('browser', False)
+            raise classify_error(e)
+        self._record_tier('browser', True)
+        # No validators: the next scrape renders the page again
+        return self._changed(data, old, {})
+
+    def _can_skip(self, previous):
+        """Whether the stored price came from static markup recently enough to trust an unchanged response"""
+        old = previous.get('validators') or {}
+        return (previous.get('price') is not None and previous.get('thumbnail_path') is not None
+                and old.get('tier') == 'http'
+                and old.get('verified_at', 0) > time.time() - self.revalidate_hours * 3600
+                and any(old.get(key) for key in ('etag', 'last_modified', 'body_hash')))
+
+    def _unchanged(self, previous, validators, outcome):
+        """The stored item data, returned for a page that has not changed"""
+        return {
+            'item_id': self.item_id,
+            'price': previous['price'],
+            'title': previous.get('title') or "Unknown Title",
+            'url': self.url,
+            'thumbnail_path': previous.get('thumbnail_path'),
+            'validators': validators,
+            'fetch_outcome': outcome
+        }
+
+    def _changed(self, data, old, validators):
+        """Freshly scraped data with new validators; fragment_unchanged if price and title are the same"""
+        fragment_hash = content_hash(data['price'], data['title'])
+        data['validators'] = {**validators, 'fragment_hash': fragment_hash, 'verified_at': time.time()}
+        data['fetch_outcome'] = 'fragment_unchanged' if fragment_hash == old.get('fragment_hash') else 'changed'
+        return data
+
+    def _record_tier(self, tier, hit):
+        if self.tier_stats:
+            self.tier_stats.record(self.url, tier, hit)
+        self.metrics.inc('scrape_tier_total', tier=tier, domain=self.domain, outcome='hit' if hit else 'miss')
+
+    def _phase(self, phase):
+        """Time one scrape phase into the per-domain histogram"""
+        return self.metrics.timer('scrape_phase_seconds', phase=phase, domain=self.domain)
+
+    def _should_try_http(self):
+        """Whether the learned tier stats favour the HTTP fast path for this domain"""
+        return self.tier_stats is None or self.tier_stats.should_try_http(self.url)
+
+    def _get_item_data_http(self, html):
+        """Read price, title and og:image from a fetched page's static meta tags and markup
+
+        Returns None if the page has no static price.
+        """
+        with self._phase('http_extract'):
+            fields = extract_fields(html, self.profile)
+        if fields['price'] is None:
+            return None
+        return {
+            'item_id': self.item_id,
+            'price': fields['price'],
+            'title': fields['title'] or "Unknown Title",
+            'url': self.url,
+            'thumbnail_path': self._get_or_download_thumbnail(fields['image_url'])
+        }
+
+    def _get_item_data_browser(self):
+        """Fetch price, title, and thumbnail using a browser borrowed from the pool"""
+        with self.driver_pool.driver() as driver:
+            deadline = time.monotonic() + self.page_deadline
+            driver.set_page_load_timeout(self.page_deadline)
+            with self._phase('page_load'):
+                driver.get(self.url)
             
-            # Get title
-            title = self._get_title(wait)
+            # Get price and title
+            with self._phase('selector_wait'):
+                price, title = self._wait_for_fields(driver, deadline)
             
-            # Take screenshot if not exists
-            thumbnail_path = self._get_or_create_thumbnail(driver)
+            # Capture the product image if not stored yet
+            with self._phase('thumbnail'):
+                thumbnail_path = self._get_or_create_thumbnail(driver)
             
             return {
                 'item_id': self.item_id,
@@ -56,65 +260,84 @@ class PriceScraper:
                 'url': self.url,
                 'thumbnail_path': thumbnail_path
             }
-                
-        except Exception as e:
-            self.logger.error(f"Error fetching item data: {e}")
-            return None
-            
-        finally:
-            if driver:
-                driver.quit()
-                
-    def _get_price(self, wait):
-        """Extract price from page"""
+
+    def _ordered(self, field, rules):
+        """A field's rules, ordered by selector stats when available"""
+        if self.selector_stats is None:
+            return list(rules)
+        by_selector = {rule.selector: rule for rule in rules}
+        return [by_selector[selector] for selector in
+                self.selector_stats.order(self.url, field, list(by_selector))]
+
+    def _price_value(self, rule, found):
+        """Parse a price from a [text, attrs] match, or None if it is not a price"""
         try:
-            price_element = wait.until(
-                EC.presence_of_element_located((By.CSS_SELECTOR, 'meta[property="product:price:amount"]'))
-            )
-            return float(price_element.get_attribute('content'))
-        except:
-            # Try alternative selectors
-            selectors = ['.price', '.regular-price', 'span[data-price-type="finalPrice"]', '.product-price']
-            for selector in selectors:
-                try:
-                    price_element = wait.until(
-                        EC.presence_of_element_located((By.CSS_SELECTOR, selector))
-                    )
-                    price_text = price_element.text or price_element.get_attribute('content')
-                    if price_text:
-                        return float(price_text.replace('$', '').replace(',', '').strip())
-                except:
+            return self.profile.rule_price(rule, *found)
+        except ValueError:
+            return None
+
+    def _title_value(self, rule, found):
+        """Title from a [text, attrs] match"""
+        return rule.value(*found) or None
+
+    def _wait_for_fields(self, driver, deadline):
+        """Race all price and title selectors in one wait, returning the first matches
+
+        Once a price is found, polling goes on for up to title_grace seconds
+        for a title that renders after it.
+        """
+        # Selenium is imported on first use, keeping it off the startup path
+        from selenium.common.exceptions import TimeoutException
+        from selenium.webdriver.support.ui import WebDriverWait
+
+        rules = ([('price', rule) for rule in self._ordered('price', self.profile.price_rules)] +
+                 [('title', rule) for rule in self._ordered('title', self.profile.title_rules)])
+        lookups = [[rule.selector, rule.attribute] for _, rule in rules]
+        found = {}
+        found_at = {}
+
+        def fields_ready(driver):
+            values = driver.execute_script(FIND_SELECTORS_SCRIPT, lookups)
+            for (field, rule), value in zip(rules, values):
+                if value is None or field in found:
                     continue
-            raise ValueError("Price not found")
-            
-    def _get_title(self, wait):
-        """Extract title from page"""
+                if field == 'price':
+                    result = self._price_value(rule, value)
+                else:
+                    result = self._title_value(rule, value)
+                if result is not None:
+                    found[field] = (rule.selector, result)
+                    found_at[field] = time.monotonic()
+            if 'price' not in found:
+                return False
+            return 'title' in found or time.monotonic() - found_at['price'] >= self.title_grace
+
         try:
-            title_element = wait.until(
-                EC.presence_of_element_located((By.CSS_SELECTOR, 'meta[property="og:title"]'))
-            )
-            return title_element.get_attribute('content')
-        except:
-            try:
-                title_element = wait.until(
-                    EC.presence_of_element_located((By.CSS_SELECTOR, 'h1.page-title'))
-                )
-                return title_element.text.strip()
-            except:
-                return "Unknown Title"
+            WebDriverWait(driver, max(0.5, deadline - time.monotonic()), poll_frequency=0.25).until(fields_ready)
+        except TimeoutException:
+            # Reaching the deadline while only the title is missing still returns the price
+            if 'price' not in found:
+                if looks_blocked(driver.title):
+                    raise ScrapeError(BLOCKED, f"Blocked page: {driver.title}")
+                raise ValueError("Price not found")
+
+        if self.selector_stats is not None:
+            for field, (selector, _) in found.items():
+                self.selector_stats.record(self.url, field, selector)
+        return found['price'][1], found.get('title', (None, "Unknown Title"))[1]
                 
+    def _get_or_download_thumbnail(self, image_url):
+        """Get the stored thumbnail or build one from the page's og:image"""
+        thumbnail_path = self.thumbnails.get(self.item_id)
+        if thumbnail_path or not image_url:
+            return thumbnail_path
+        try:
+            with self._phase('thumbnail'):
+                return self.thumbnails.put(self.item_id, download_image(image_url, self.url))
+        except Exception as e:
+            self.logger.info(f"Image download failed for {self.url}: {e}")
+            return None
+
     def _get_or_create_thumbnail(self, driver):
-        """Get existing thumbnail or create new one"""
-        thumbnail_path = f"{self.screenshot_dir}/{self.item_id}.png"
-        
-        if not os.path.exists(thumbnail_path):
-            try:
-                # Ensure the product image is in view
-                driver.execute_script("window.scrollTo(0, 0)")
-                driver.save_screenshot(thumbnail_path)
-                self.logger.info(f"Created new thumbnail: {thumbnail_path}")
-            except Exception as e:
-                self.logger.error(f"Error creating thumbnail: {e}")
-                return None
-                
-        return thumbnail_path
\ No newline at end of file
+        """Get the stored thumbnail or capture one from the loaded page"""
+        return self.thumbnails.get(self.item_id) or self.thumbnails.capture(self.item_id, driver, self.url)
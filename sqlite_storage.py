@@ -0,0 +1,553 @@
+#sqlite_storage.py
+
+from contextlib import contextmanager
+from config_manager import ConfigManager
+from item_registry import ItemRegistry
+from price_store import PriceStore, row_to_timestamp, timestamp_to_date, timestamp_to_time
+from price_history import PERIODS, Rollups, compact_runs, period_start
+from metrics import timed
+import threading
+import argparse
+import logging
+import sqlite3
+import json
+import glob
+import time
+import csv
+import os
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS prices (
+    item_id TEXT NOT NULL,
+    ts INTEGER NOT NULL,
+    price REAL NOT NULL,
+    last_seen INTEGER NOT NULL DEFAULT 0,
+    count INTEGER NOT NULL DEFAULT 1,
+    PRIMARY KEY (item_id, ts)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS prices_ts ON prices (ts);
+CREATE TABLE IF NOT EXISTS rollups (
+    item_id TEXT NOT NULL,
+    period TEXT NOT NULL,
+    start_ts INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    min REAL NOT NULL,
+    max REAL NOT NULL,
+    sum REAL NOT NULL,
+    PRIMARY KEY (item_id, period, start_ts)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS metadata (
+    item_id TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS items (
+    position INTEGER PRIMARY KEY,
+    url TEXT NOT NULL UNIQUE,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS history (
+    position INTEGER PRIMARY KEY,
+    url TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS history_url ON history (url);
+"""
+
+# Bumped with every change to existing tables; see SQLiteStorage._migrate
+SCHEMA_VERSION = 1
+
+ROLLUP_UPSERT = """
+INSERT INTO rollups (item_id, period, start_ts, count, min, max, sum) VALUES (?, ?, ?, 1, ?, ?, ?)
+ON CONFLICT (item_id, period, start_ts) DO UPDATE SET
+    count = count + 1,
+    min = MIN(min, excluded.min),
+    max = MAX(max, excluded.max),
+    sum = sum + excluded.sum
+"""
+
+class SQLiteStorage:
+    """Single embedded database holding prices, metadata and item configuration"""
+
+    def __init__(self, db_path='data/price_tracker.db', batch_size=200, batch_seconds=2.0,
+                 busy_timeout=30):
+        """
+        db_path: SQLite database file
+        batch_size: writes grouped into one transaction inside batch()
+        batch_seconds: longest time a batch transaction stays open
+        busy_timeout: seconds a write waits for another process's lock before failing
+        """
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.batch_seconds = batch_seconds
+        self.logger = logging.getLogger(__name__)
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        self._lock = threading.RLock()
+        self._batch_depth = 0
+        self._atomic_depth = 0
+        self._pending_writes = 0
+        self._batch_started = 0
+        self.conn = sqlite3.connect(db_path, timeout=busy_timeout, check_same_thread=False,
+                                    isolation_level=None)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(SCHEMA)
+        self._migrate()
+
+    def _migrate(self):
+        """Bring tables created by older versions up to SCHEMA_VERSION"""
+        (version,), = self.conn.execute('PRAGMA user_version').fetchall()
+        if version >= SCHEMA_VERSION:
+            return
+        self.conn.execute('BEGIN IMMEDIATE')
+        try:
+            columns = {row[1] for row in self.conn.execute('PRAGMA table_info(prices)')}
+            if 'last_seen' not in columns:
+                # Version 0 kept one price per day; each becomes a single-observation run
+                self.conn.execute('ALTER TABLE prices ADD COLUMN last_seen INTEGER NOT NULL DEFAULT 0')
+                self.conn.execute('ALTER TABLE prices ADD COLUMN count INTEGER NOT NULL DEFAULT 1')
+                self.conn.execute('UPDATE prices SET last_seen = ts')
+                self.logger.info(f"Migrated {self.db_path} to schema version {SCHEMA_VERSION}")
+            self.conn.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+        except Exception:
+            self.conn.execute('ROLLBACK')
+            raise
+        self.conn.execute('COMMIT')
+
+    def query(self, sql, params=()):
+        """Run a read query and return all rows"""
+        with self._lock:
+            return self.conn.execute(sql, params).fetchall()
+
+    def write(self, sql, params=(), many=False):
+        """Run a write, committing periodically while inside a batch"""
+        with self._lock:
+            if many:
+                self.conn.executemany(sql, params)
+            else:
+                self.conn.execute(sql, params)
+            if self._batch_depth:
+                self._pending_writes += 1
+                if not self._atomic_depth and (self._pending_writes >= self.batch_size
+                        or time.monotonic() - self._batch_started >= self.batch_seconds):
+                    self.conn.execute('COMMIT')
+                    self._begin()
+
+    def _begin(self):
+        self.conn.execute('BEGIN IMMEDIATE')
+        self._pending_writes = 0
+        self._batch_started = time.monotonic()
+
+    @contextmanager
+    def batch(self):
+        """Group writes from all threads into a few transactions
+
+        If the outermost batch exits with an error, writes since its last
+        periodic commit are rolled back.
+        """
+        with self._lock:
+            if self._batch_depth == 0:
+                self._begin()
+            self._batch_depth += 1
+        try:
+            yield self
+        except BaseException:
+            with self._lock:
+                self._batch_depth -= 1
+                if self._batch_depth == 0:
+                    self.conn.execute('ROLLBACK')
+            raise
+        with self._lock:
+            self._batch_depth -= 1
+            if self._batch_depth == 0:
+                self.conn.execute('COMMIT')
+
+    @contextmanager
+    def transaction(self):
+        """Run several writes atomically"""
+        with self._lock:
+            if self.conn.in_transaction:
+                # Inside a batch or another transaction: a savepoint lets this part roll back
+                # alone, and the depth holds off the batch's periodic commits meanwhile
+                self._atomic_depth += 1
+                savepoint = f'atomic_{self._atomic_depth}'
+                self.conn.execute(f'SAVEPOINT {savepoint}')
+                try:
+                    yield self
+                except Exception:
+                    self.conn.execute(f'ROLLBACK TO {savepoint}')
+                    self.conn.execute(f'RELEASE {savepoint}')
+                    raise
+                else:
+                    self.conn.execute(f'RELEASE {savepoint}')
+                finally:
+                    self._atomic_depth -= 1
+                return
+            self.conn.execute('BEGIN IMMEDIATE')
+            try:
+                yield self
+            except Exception:
+                self.conn.execute('ROLLBACK')
+                raise
+            self.conn.execute('COMMIT')
+
+    def data_version(self):
+        """Counter that changes when another connection commits to the database"""
+        return self.query('PRAGMA data_version')[0][0]
+
+    def close(self):
+        """Close the database connection"""
+        with self._lock:
+            self.conn.close()
+
+class SQLitePriceDataManager:
+    """PriceDataManager backed by the shared SQLite database"""
+
+    def __init__(self, item_id, storage):
+        self.item_id = item_id
+        self.storage = storage
+        self.logger = logging.getLogger(__name__)
+        self._writes = 0
+
+    def ensure_files_exist(self):
+        """Nothing to create, tables are set up by SQLiteStorage"""
+
+    @timed('storage_seconds', op='save_price', backend='sqlite')
+    def save_price(self, price):
+        """Record a price observed now; returns True if it started a new run
+
+        A repeat of the latest price on the same day only extends that run.
+        """
+        if price is None:
+            self.logger.warning("Attempted to save None price value")
+            return False
+
+        try:
+            timestamp, price = int(time.time()), round(price, 2)
+            with self.storage.transaction():
+                rows = self.storage.query(
+                    'SELECT ts, price FROM prices WHERE item_id = ? ORDER BY ts DESC LIMIT 1', (self.item_id,)
+                )
+                if rows and rows[0][1] == price and timestamp_to_date(rows[0][0]) == timestamp_to_date(timestamp):
+                    self.storage.write(
+                        'UPDATE prices SET last_seen = MAX(last_seen, ?), count = count + 1 '
+                        'WHERE item_id = ? AND ts = ?',
+                        (timestamp, self.item_id, rows[0][0])
+                    )
+                    stored = False
+                else:
+                    if rows and timestamp <= rows[0][0]:
+                        # Keep run starts unique when the clock has not moved on
+                        timestamp = rows[0][0] + 1
+                    self.storage.write(
+                        'INSERT OR IGNORE INTO prices (item_id, ts, price, last_seen) VALUES (?, ?, ?, ?)',
+                        (self.item_id, timestamp, price, timestamp)
+                    )
+                    self.storage.write(ROLLUP_UPSERT, [
+                        (self.item_id, period, period_start(timestamp, period), price, price, price)
+                        for period in PERIODS
+                    ], many=True)
+                    stored = True
+            self._writes += 1
+            if stored:
+                self.logger.info(f"Saved new price {price} at {timestamp_to_date(timestamp)} {timestamp_to_time(timestamp)}")
+            return stored
+        except Exception as e:
+            self.logger.error(f"Error saving price: {e}")
+        return False
+
+    @timed('storage_seconds', op='save_metadata', backend='sqlite')
+    def save_metadata(self, metadata):
+        """Save item metadata"""
+        try:
+            self.storage.write(
+                'INSERT OR REPLACE INTO metadata (item_id, data) VALUES (?, ?)',
+                (self.item_id, json.dumps(metadata))
+            )
+            self._writes += 1
+            self.logger.info(f"Saved metadata for item {self.item_id}")
+        except Exception as e:
+            self.logger.error(f"Error saving metadata: {e}")
+
+    def get_revision(self):
+        """Token that changes on local writes or commits from other connections"""
+        return self._writes, self.storage.data_version()
+
+    @timed('storage_seconds', op='load_price_history', backend='sqlite')
+    def load_price_history(self):
+        """Load price history as Date/Time/Price rows"""
+        try:
+            rows = self.storage.query(
+                'SELECT ts, price FROM prices WHERE item_id = ? ORDER BY ts', (self.item_id,)
+            )
+            return [{'Date': timestamp_to_date(ts), 'Time': timestamp_to_time(ts), 'Price': f"{price:.2f}"}
+                    for ts, price in rows]
+        except Exception as e:
+            self.logger.error(f"Error loading price history: {e}")
+            return []
+
+    @timed('storage_seconds', op='load_price_columns', backend='sqlite')
+    def load_price_columns(self, start=None, end=None):
+        """Load prices with start <= timestamp <= end as (timestamps, prices) lists"""
+        try:
+            rows = self.storage.query(
+                'SELECT ts, price FROM prices WHERE item_id = ? AND ts >= ? AND ts <= ? ORDER BY ts',
+                (self.item_id, start if start is not None else -2**63, end if end is not None else 2**63 - 1)
+            )
+            return [ts for ts, _ in rows], [price for _, price in rows]
+        except Exception as e:
+            self.logger.error(f"Error loading price history: {e}")
+            return [], []
+
+    @timed('storage_seconds', op='load_recent_prices', backend='sqlite')
+    def load_recent_prices(self, count):
+        """Load the prices of the latest count runs, oldest first"""
+        try:
+            rows = self.storage.query(
+                'SELECT price FROM prices WHERE item_id = ? ORDER BY ts DESC LIMIT ?', (self.item_id, count)
+            )
+            return [price for price, in reversed(rows)]
+        except Exception as e:
+            self.logger.error(f"Error loading recent prices: {e}")
+            return []
+
+    def compact(self, raw_before, daily_before):
+        """Roll runs older than raw_before into daily, and older than daily_before into weekly, OHLC runs
+
+        Returns the (before, after) number of records in the compacted range.
+        """
+        try:
+            with self.storage.transaction():
+                runs = self.storage.query(
+                    'SELECT ts, MAX(ts, last_seen), count, price FROM prices '
+                    'WHERE item_id = ? AND ts < ? ORDER BY ts',
+                    (self.item_id, raw_before)
+                )
+                compacted = compact_runs(runs, daily_before)
+                if len(compacted) < len(runs):
+                    self.storage.write('DELETE FROM prices WHERE item_id = ? AND ts < ?', (self.item_id, raw_before))
+                    self.storage.write(
+                        'INSERT INTO prices (item_id, ts, last_seen, count, price) VALUES (?, ?, ?, ?, ?)',
+                        [(self.item_id, *run) for run in compacted], many=True
+                    )
+            if len(compacted) < len(runs):
+                self.rebuild_rollups()
+                self._writes += 1
+            return len(runs), len(compacted)
+        except Exception as e:
+            self.logger.error(f"Error compacting price history: {e}")
+            return 0, 0
+
+    def rebuild_rollups(self):
+        """Recompute the weekly/monthly aggregates from the raw prices"""
+        timestamps, prices = self.load_price_columns()
+        rollups = Rollups.from_columns(timestamps, prices)
+        with self.storage.transaction():
+            self.storage.write('DELETE FROM rollups WHERE item_id = ?', (self.item_id,))
+            self.storage.write(
+                'INSERT INTO rollups (item_id, period, start_ts, count, min, max, sum) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                [(self.item_id, period, *row) for period in PERIODS for row in rollups.rows(period)],
+                many=True
+            )
+
+    @timed('storage_seconds', op='load_rollups', backend='sqlite')
+    def load_rollups(self, period, start=None, end=None):
+        """(start_ts, count, min, max, sum) rows for 'week' or 'month' buckets"""
+        try:
+            # Prices imported or written without rollups leave the totals out of step
+            (prices,), = self.storage.query('SELECT COUNT(*) FROM prices WHERE item_id = ?', (self.item_id,))
+            (counted,), = self.storage.query(
+                "SELECT COALESCE(SUM(count), 0) FROM rollups WHERE item_id = ? AND period = 'month'",
+                (self.item_id,)
+            )
+            if prices != counted:
+                self.rebuild_rollups()
+            return self.storage.query(
+                'SELECT start_ts, count, min, max, sum FROM rollups '
+                'WHERE item_id = ? AND period = ? AND start_ts >= ? AND start_ts <= ? ORDER BY start_ts',
+                (self.item_id, period,
+                 period_start(start, period) if start is not None else -2**63,
+                 end if end is not None else 2**63 - 1)
+            )
+        except Exception as e:
+            self.logger.error(f"Error loading rollups: {e}")
+            return []
+
+    @timed('storage_seconds', op='load_metadata', backend='sqlite')
+    def load_metadata(self):
+        """Load item metadata"""
+        try:
+            rows = self.storage.query('SELECT data FROM metadata WHERE item_id = ?', (self.item_id,))
+            return json.loads(rows[0][0]) if rows else {}
+        except Exception as e:
+            self.logger.error(f"Error loading metadata: {e}")
+            return {}
+
+    def get_latest_price(self):
+        """Return the (date, price) of the latest observation"""
+        try:
+            rows = self.storage.query(
+                'SELECT MAX(ts, last_seen), price FROM prices WHERE item_id = ? ORDER BY ts DESC LIMIT 1',
+                (self.item_id,)
+            )
+            return (timestamp_to_date(rows[0][0]), rows[0][1]) if rows else None
+        except Exception as e:
+            self.logger.error(f"Error loading latest price: {e}")
+            return None
+
+    def export_csv(self, path=None):
+        """Write the price history to a Date,Time,Price CSV"""
+        try:
+            path = path or f"data/{self.item_id}_prices.csv"
+            with open(path, 'w', newline='') as f:
+                writer = csv.writer(f)
+                writer.writerow(['Date', 'Time', 'Price'])
+                for row in self.load_price_history():
+                    writer.writerow([row['Date'], row['Time'], row['Price']])
+            return path
+        except Exception as e:
+            self.logger.error(f"Error exporting price history: {e}")
+            return None
+
+class SQLiteConfigManager(ConfigManager):
+    """ConfigManager storing tracked and removed items in the shared SQLite database"""
+
+    def __init__(self, storage):
+        self.storage = storage
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.RLock()
+        self._items_dirty = False
+        self._flush_timer = None
+        self._data_version = None
+        self.registry = ItemRegistry()
+        self._refresh()
+
+    def ensure_config_files(self):
+        """Nothing to create, tables are set up by SQLiteStorage"""
+
+    def _refresh(self):
+        """Reload the registry when another connection has committed changes"""
+        data_version = self.storage.data_version()
+        if data_version == self._data_version:
+            return
+        try:
+            self.registry.load(
+                [json.loads(data) for data, in
+                 self.storage.query('SELECT data FROM items ORDER BY position')],
+                [json.loads(data) for data, in
+                 self.storage.query('SELECT data FROM history ORDER BY position')]
+            )
+            self._data_version = data_version
+        except Exception as e:
+            self.logger.error(f"Error loading config: {e}")
+
+    def _replace_table(self, table, entries):
+        with self.storage.transaction():
+            self.storage.write(f'DELETE FROM {table}')
+            self.storage.write(
+                f'INSERT INTO {table} (position, url, data) VALUES (?, ?, ?)',
+                [(i, item['url'], json.dumps(item)) for i, item in enumerate(entries)],
+                many=True
+            )
+
+    def _write_items(self):
+        """Replace the items table with the registry's active items"""
+        try:
+            self._replace_table('items', self.registry.items())
+            return True
+        except Exception as e:
+            self.logger.error(f"Error saving config: {e}")
+            self._data_version = None
+            return False
+
+    def _write_history(self):
+        """Replace the history table with the registry's removed items"""
+        try:
+            self._replace_table('history', self.registry.history())
+            return True
+        except Exception as e:
+            self.logger.error(f"Error saving history: {e}")
+            self._data_version = None
+            return False
+
+    def update_status(self, url, status):
+        """Update one item's status in place, grouped with other writes inside a batch"""
+        with self._lock:
+            if not self.registry.set_status(url, status):
+                return
+            try:
+                self.storage.write(
+                    "UPDATE items SET data = json_set(data, '$.status', ?) WHERE url = ?",
+                    (status, self.registry.get(url)['url'])
+                )
+            except Exception as e:
+                self.logger.error(f"Error saving status: {e}")
+
+    def flush(self):
+        """Status updates are written directly, nothing to flush"""
+        return True
+
+def import_data_dir(storage, data_dir='data'):
+    """Import items config, history, metadata and price histories from a data directory"""
+    logger = logging.getLogger(__name__)
+    file_config = ConfigManager(
+        config_file=os.path.join(data_dir, 'items_config.json'),
+        history_file=os.path.join(data_dir, 'items_history.json')
+    )
+    config_manager = SQLiteConfigManager(storage)
+    counts = {'items': 0, 'history': 0, 'metadata': 0, 'prices': 0}
+
+    with storage.batch():
+        items = file_config.load_items()
+        history = file_config.load_history()
+        config_manager.save_items(items)
+        config_manager.save_history(history)
+        counts['items'], counts['history'] = len(items), len(history)
+
+        for metadata_path in glob.glob(os.path.join(data_dir, '*_metadata.json')):
+            item_id = os.path.basename(metadata_path)[:-len('_metadata.json')]
+            with open(metadata_path, 'r') as f:
+                SQLitePriceDataManager(item_id, storage).save_metadata(json.load(f))
+            counts['metadata'] += 1
+
+        for bin_path in glob.glob(os.path.join(data_dir, '*_prices.bin')):
+            item_id = os.path.basename(bin_path)[:-len('_prices.bin')]
+            store = PriceStore(bin_path)
+            store.upgrade()
+            rows = [(item_id, *run) for run in zip(*store.read_runs())]
+            storage.write('INSERT OR IGNORE INTO prices (item_id, ts, last_seen, count, price) VALUES (?, ?, ?, ?, ?)',
+                          rows, many=True)
+            counts['prices'] += len(rows)
+
+        for csv_path in glob.glob(os.path.join(data_dir, '*_prices.csv')):
+            item_id = os.path.basename(csv_path)[:-len('_prices.csv')]
+            rows = []
+            with open(csv_path, 'r', newline='') as f:
+                for row in csv.DictReader(f):
+                    try:
+                        timestamp = row_to_timestamp(row)
+                        rows.append((item_id, timestamp, float(row['Price']), timestamp))
+                    except (KeyError, TypeError, ValueError):
+                        continue
+            storage.write('INSERT OR IGNORE INTO prices (item_id, ts, price, last_seen) VALUES (?, ?, ?, ?)',
+                          rows, many=True)
+            counts['prices'] += len(rows)
+
+    logger.info(f"Imported {counts} from {data_dir} into {storage.db_path}")
+    return counts
+
+def main():
+    """Import an existing data directory into the SQLite database"""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument('--data-dir', default='data')
+    parser.add_argument('--db', default='data/price_tracker.db')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    storage = SQLiteStorage(args.db)
+    counts = import_data_dir(storage, args.data_dir)
+    storage.close()
+    print(f"Imported {counts['items']} items, {counts['history']} removed items, "
+          f"{counts['metadata']} metadata records and {counts['prices']} prices")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+#status_bus.py
+
+from collections import deque
+import threading
+
+class StatusBus:
+    """Publish/subscribe bus for item status changes, shared by all SSE clients
+
+    Publishers append numbered events to a bounded in-memory log and wake every
+    waiting subscriber; subscribers remember the last event ID they saw, so a
+    reconnecting client can resume from Last-Event-ID without any disk reads.
+    """
+
+    def __init__(self, history_size=1000):
+        self._cond = threading.Condition()
+        self._events = deque(maxlen=history_size)
+        self._last_id = 0
+        self._statuses = {}
+
+    def seed(self, statuses):
+        """Set the initial status map without emitting events"""
+        with self._cond:
+            self._statuses.update(statuses)
+
+    def publish(self, event_type, payload):
+        """Append an event and wake subscribers, returning its ID"""
+        with self._cond:
+            self._last_id += 1
+            self._events.append((self._last_id, event_type, payload))
+            self._cond.notify_all()
+            return self._last_id
+
+    def publish_status(self, url, status):
+        """Publish a status change for url, ignoring repeats of the current status"""
+        with self._cond:
+            if self._statuses.get(url) == status:
+                return None
+            if status is None:
+                self._statuses.pop(url, None)
+            else:
+                self._statuses[url] = status
+            return self.publish('status', {url: status})
+
+    def remove(self, url):
+        """Forget an item that is no longer tracked"""
+        return self.publish_status(url, None)
+
+    def snapshot(self):
+        """Return (last event ID, copy of the full status map)"""
+        with self._cond:
+            return self._last_id, dict(self._statuses)
+
+    def events_since(self, last_id):
+        """Events after last_id, or None if they have been dropped from the log"""
+        with self._cond:
+            if last_id > self._last_id:
+                return None
+            if self._events and self._events[0][0] > last_id + 1:
+                return None
+            if not self._events and last_id < self._last_id:
+                return None
+            return [event for event in self._events if event[0] > last_id]
+
+    def wait(self, last_id, timeout):
+        """Block until events after last_id exist or timeout passes, then return them"""
+        with self._cond:
+            self._cond.wait_for(lambda: self._last_id > last_id, timeout)
+            return self.events_since(last_id)
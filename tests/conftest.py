@@ -0,0 +1,24 @@
+#conftest.py
+
+import sys
+import os
+
+# The modules live at the repository root, next to main.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_retailer import FakeRetailer
+import thumbnails
+import pytest
+
+@pytest.fixture
+def retailer():
+    """A FakeRetailer on a free local port, without page padding"""
+    retailer = FakeRetailer(padding_kb=0).start()
+    yield retailer
+    retailer.stop()
+
+@pytest.fixture
+def thumbnail_store(tmp_path, monkeypatch):
+    """A ThumbnailStore in a temporary directory that may download from the local retailer"""
+    monkeypatch.setattr(thumbnails, 'ALLOWED_PRIVATE_HOSTS', {'127.0.0.1'})
+    return thumbnails.ThumbnailStore(str(tmp_path / 'thumbnails'), str(tmp_path / 'thumbnails.json'))
@@ -0,0 +1,243 @@
+#test_alerts.py
+
+from alerts import RollingWindow, PriceAggregates, AlertRule, AlertEngine, AlertDispatcher
+from sqlite_storage import SQLiteStorage, SQLitePriceDataManager
+import pytest
+import random
+import json
+import time
+
+class StubSink:
+    """Records every batch it is sent"""
+
+    def __init__(self, fail=False):
+        self.batches = []
+        self.fail = fail
+
+    def send(self, alerts):
+        self.batches.append([alert['item_id'] for alert in alerts])
+        if self.fail:
+            raise ConnectionError('sink down')
+
+class StubDispatcher:
+    def __init__(self):
+        self.alerts = []
+
+    def submit(self, alert):
+        self.alerts.append(alert)
+
+class StubHistory:
+    """Data manager holding prices in memory; save() precedes on_price like the tracker"""
+
+    def __init__(self, prices=()):
+        self.prices = list(prices)
+        self.loads = 0
+
+    def save(self, price):
+        self.prices.append(price)
+
+    def load_price_columns(self, start=None, end=None):
+        self.loads += 1
+        rows = [(ts, price) for ts, price in enumerate(self.prices)
+                if (start is None or ts >= start) and (end is None or ts <= end)]
+        return [ts for ts, _ in rows], [price for _, price in rows]
+
+def make_engine(tmp_path, rules, dispatcher=None):
+    rules_file = tmp_path / 'alerts.json'
+    rules_file.write_text(json.dumps({'rules': rules}))
+    return AlertEngine(str(rules_file), str(tmp_path / 'alert_state.json'), dispatcher or StubDispatcher())
+
+def feed(engine, history, prices, item_id='item'):
+    """Save and evaluate each price, returning the rules fired per price"""
+    fired = []
+    for price in prices:
+        history.save(price)
+        fired.append([alert['rule'] for alert in engine.on_price(item_id, 'Item', 'http://x', price, history)])
+    return fired
+
+def test_rolling_window_matches_brute_force():
+    rng = random.Random(7)
+    window = RollingWindow(5)
+    values = []
+    for _ in range(500):
+        value = rng.choice([rng.randint(1, 20), values[-1] if values else 3])
+        window.add(value)
+        values.append(value)
+        recent = values[-5:]
+        assert window.min == min(recent)
+        assert abs(window.avg - sum(recent) / len(recent)) < 1e-9
+        assert len(window) == len(recent)
+
+def test_rolling_window_keeps_duplicate_minimums():
+    window = RollingWindow(3)
+    for value in (2, 2, 5, 6):
+        window.add(value)
+    assert window.min == 2
+    window.add(7)
+    assert window.min == 5
+    assert RollingWindow(3).min is None and RollingWindow(3).avg is None
+
+def test_aggregates_round_trip():
+    aggregates = PriceAggregates([3])
+    for price in (5, 3, 8, 7):
+        aggregates.add(price)
+    restored = PriceAggregates.from_dict(json.loads(json.dumps(aggregates.to_dict())), [3])
+    assert (restored.count, restored.min, restored.max, restored.last) == (4, 3, 8, 7)
+    assert restored.windows[3].min == 3
+
+def test_threshold_rule_fires_on_the_edge_only(tmp_path):
+    engine = make_engine(tmp_path, [{'name': 'cheap', 'type': 'threshold', 'below': 10}])
+    fired = feed(engine, StubHistory(), [12, 9, 8, 11, 9])
+    assert fired == [[], ['cheap'], [], [], ['cheap']]
+
+def test_drop_rules_fire_on_the_edge_after_min_history(tmp_path):
+    engine = make_engine(tmp_path, [
+        {'name': 'min', 'type': 'drop_from_min', 'percent': 10, 'window': 3},
+        {'name': 'avg', 'type': 'drop_from_avg', 'percent': 10, 'window': 3}
+    ])
+    fired = feed(engine, StubHistory(), [90, 100, 110, 89, 80, 100, 100, 100, 70])
+    # 89 is 11% below the average only; at 80 the average rule is still active
+    assert fired == [[], [], [], ['avg'], ['min'], [], [], [], ['min', 'avg']]
+
+def test_all_time_low_fires_for_every_new_low(tmp_path):
+    engine = make_engine(tmp_path, [{'name': 'low', 'type': 'all_time_low', 'min_history': 2}])
+    fired = feed(engine, StubHistory(), [10, 9, 8, 7, 7, 6])
+    assert fired == [[], [], ['low'], ['low'], [], ['low']]
+
+def test_rules_only_apply_to_their_items(tmp_path):
+    engine = make_engine(tmp_path, [{'name': 'cheap', 'type': 'threshold', 'below': 10, 'item_ids': ['a']}])
+    assert feed(engine, StubHistory(), [5], item_id='b') == [[]]
+    assert feed(engine, StubHistory(), [5], item_id='a') == [['cheap']]
+
+def test_active_rules_survive_a_restart(tmp_path):
+    rules = [{'name': 'cheap', 'type': 'threshold', 'below': 10}]
+    history = StubHistory()
+    engine = make_engine(tmp_path, rules)
+    assert feed(engine, history, [9]) == [['cheap']]
+    engine.save()
+    assert feed(make_engine(tmp_path, rules), history, [8]) == [[]]
+
+def test_persisted_aggregates_are_reused_while_history_matches(tmp_path):
+    rules = [{'name': 'low', 'type': 'all_time_low'}]
+    history = StubHistory()
+    engine = make_engine(tmp_path, rules)
+    feed(engine, history, [10, 11, 12])
+    engine.save()
+
+    restarted = make_engine(tmp_path, rules)
+    # Only a marker the stored history cannot produce shows the state was not rebuilt
+    restarted.aggregates['item'].max = 99
+    history.loads = 0
+    feed(restarted, history, [13, 14])
+    assert restarted.aggregates['item'].max == 99
+    assert restarted.aggregates['item'].count == 5
+    # One whole-history check, then only the runs since the latest one folded in
+    assert history.loads == 2
+
+def test_aggregates_are_rebuilt_when_history_changed_behind_them(tmp_path):
+    rules = [{'name': 'low', 'type': 'all_time_low'}]
+    history = StubHistory()
+    engine = make_engine(tmp_path, rules)
+    feed(engine, history, [10, 11, 12])
+    engine.save()
+
+    # Prices saved by a process without the alert state
+    history.prices += [4, 5]
+    restarted = make_engine(tmp_path, rules)
+    assert feed(restarted, history, [6]) == [[]]
+    aggregates = restarted.aggregates['item']
+    assert (aggregates.count, aggregates.min) == (6, 4)
+
+def test_aggregates_are_rebuilt_after_compaction(tmp_path):
+    storage = SQLiteStorage(str(tmp_path / 'prices.db'))
+    data_manager = SQLitePriceDataManager('item', storage)
+    now = int(time.time())
+    day = 86400
+    # Four distinct prices a day for 40 days
+    storage.write('INSERT INTO prices (item_id, ts, last_seen, count, price) VALUES (?, ?, ?, ?, ?)',
+                  [('item', now - 40 * day + i * day // 4, now - 40 * day + i * day // 4, 1, 20 + i % 7)
+                   for i in range(160)], many=True)
+    rules = [{'name': 'low', 'type': 'all_time_low'}]
+    engine = make_engine(tmp_path, rules)
+    engine.on_price('item', 'Item', 'http://x', 20 + 159 % 7, data_manager)
+    assert engine.aggregates['item'].count == 160
+    engine.save()
+
+    before, after = data_manager.compact(now - 14 * day, now - 365 * day)
+    assert after < before
+    _, prices = data_manager.load_price_columns()
+
+    restarted = make_engine(tmp_path, rules)
+    storage.write('INSERT INTO prices (item_id, ts, last_seen, count, price) VALUES (?, ?, ?, ?, ?)',
+                  ('item', now, now, 1, 25))
+    restarted.on_price('item', 'Item', 'http://x', 25, data_manager)
+    aggregates = restarted.aggregates['item']
+    assert aggregates.count == len(prices) + 1
+    assert (aggregates.min, aggregates.max) == (min(prices), max(prices))
+    storage.close()
+
+def test_engines_sharing_a_history_alert_once(tmp_path):
+    # Two worker processes scraping the same item in turn
+    rules = [{'name': 'cheap', 'type': 'threshold', 'below': 10},
+             {'name': 'low', 'type': 'all_time_low', 'min_history': 1}]
+    history = StubHistory()
+    first, second = make_engine(tmp_path, rules), make_engine(tmp_path, rules)
+    fired = []
+    for engine, price in zip([first, second] * 3, [12, 9, 8, 11, 9, 9.5]):
+        fired += feed(engine, history, [price])
+    assert fired == [[], ['cheap', 'low'], ['low'], [], ['cheap'], []]
+    for engine in (first, second):
+        aggregates = engine.aggregates['item']
+        assert (aggregates.count, aggregates.min, aggregates.last) in [(5, 8, 9), (6, 8, 9.5)]
+
+def test_saves_from_several_engines_keep_the_latest_state(tmp_path):
+    rules = [{'name': 'cheap', 'type': 'threshold', 'below': 10}]
+    history = StubHistory()
+    first, second = make_engine(tmp_path, rules), make_engine(tmp_path, rules)
+    feed(first, history, [12])
+    feed(second, history, [9])
+    second.save()
+    # The stale engine saving last does not roll the shared state back
+    first.save()
+    restarted = make_engine(tmp_path, rules)
+    assert restarted.aggregates['item'].count == 2
+    assert restarted.active['item'] == {'cheap'}
+
+def test_dispatcher_groups_alerts_into_batches():
+    sink = StubSink()
+    dispatcher = AlertDispatcher([sink], batch_size=3, flush_seconds=60)
+    for i in range(7):
+        dispatcher.submit({'item_id': i})
+    dispatcher.close()
+    assert sink.batches == [[0, 1, 2], [3, 4, 5], [6]]
+    assert dispatcher.sent == 7
+
+def test_dispatcher_flushes_partial_batches_after_flush_seconds():
+    sink = StubSink()
+    dispatcher = AlertDispatcher([sink], batch_size=10, flush_seconds=0.05)
+    dispatcher.submit({'item_id': 1})
+    deadline = time.monotonic() + 5
+    while not sink.batches and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert sink.batches == [[1]]
+    dispatcher.close()
+
+def test_dispatcher_keeps_delivering_when_a_sink_fails():
+    failing, working = StubSink(fail=True), StubSink()
+    dispatcher = AlertDispatcher([failing, working], batch_size=2, flush_seconds=60)
+    for i in range(3):
+        dispatcher.submit({'item_id': i})
+    dispatcher.close()
+    assert failing.batches == working.batches == [[0, 1], [2]]
+
+def test_dispatcher_drops_alerts_when_the_queue_is_full():
+    dispatcher = AlertDispatcher([StubSink()], max_queue=1)
+    dispatcher._queue.put(None)
+    dispatcher._thread.join()
+    dispatcher.submit({'item_id': 1})
+    dispatcher.submit({'item_id': 2})
+    assert dispatcher.dropped == 1
+
+def test_rule_rejects_unknown_types():
+    with pytest.raises(ValueError):
+        AlertRule('x', 'price_up')
@@ -0,0 +1,93 @@
+#test_dashboard.py
+
+from dashboard import Dashboard
+from status_bus import StatusBus
+from tracker import PriceTracker
+import pytest
+
+class StubTracker:
+    """Serves fixed item summaries to the dashboard"""
+
+    def __init__(self, summaries):
+        self.summaries = summaries
+        self.status_bus = StatusBus()
+
+    def get_item_summaries(self):
+        return [dict(summary) for summary in self.summaries]
+
+class StubConfigManager:
+    def update_status(self, url, status):
+        pass
+
+def summary(i, **fields):
+    return {'item_id': f"item{i}", 'name': f"Item {i:02d}", 'title': None, 'url': f"https://shop.example.com/{i}",
+            'status': 'ok', 'latest_price': 10.0 + i, 'latest_at': i, 'change': 0, 'change_pct': 0, **fields}
+
+@pytest.fixture
+def make_client(monkeypatch):
+    monkeypatch.setattr(Dashboard, 'setup_scheduler', lambda self: None)
+    return lambda tracker: Dashboard(tracker, StubConfigManager()).app.test_client()
+
+def names(response):
+    return [item['name'] for item in response.get_json()['items']]
+
+def test_summaries_are_paginated(make_client):
+    client = make_client(StubTracker([summary(i) for i in range(45)]))
+    first = client.get('/api/items/summary?per_page=20').get_json()
+    assert (first['page'], first['per_page'], first['total'], first['pages']) == (1, 20, 45, 3)
+    assert [item['name'] for item in first['items']] == [f"Item {i:02d}" for i in range(20)]
+    assert names(client.get('/api/items/summary?per_page=20&page=3')) == [f"Item {i:02d}" for i in range(40, 45)]
+    # Past the last page is empty rather than an error
+    assert names(client.get('/api/items/summary?per_page=20&page=4')) == []
+
+def test_page_size_is_clamped_and_validated(make_client):
+    client = make_client(StubTracker([summary(i) for i in range(3)]))
+    assert client.get('/api/items/summary?per_page=1000').get_json()['per_page'] == 200
+    assert client.get('/api/items/summary?per_page=0&page=0').get_json()['per_page'] == 1
+    assert client.get('/api/items/summary?page=x').status_code == 400
+    assert client.get('/api/items/summary?sort=colour').status_code == 400
+    assert client.get('/api/items/summary?change=sideways').status_code == 400
+    empty = make_client(StubTracker([])).get('/api/items/summary').get_json()
+    assert (empty['total'], empty['pages'], empty['items']) == (0, 1, [])
+
+def test_filters_apply_before_pagination(make_client):
+    client = make_client(StubTracker([
+        summary(1, name='Red kettle', change=-2),
+        summary(2, name='Blue kettle', status='error', change=3),
+        summary(3, name='Toaster', title='Kettle-free toaster', change=0),
+        summary(4, name='Kettle lid', change=None)
+    ]))
+    assert names(client.get('/api/items/summary?q=KETTLE')) == ['Red kettle', 'Blue kettle', 'Toaster', 'Kettle lid']
+    assert names(client.get('/api/items/summary?q=kettle&status=ok')) == ['Red kettle', 'Toaster', 'Kettle lid']
+    assert names(client.get('/api/items/summary?change=down')) == ['Red kettle']
+    assert names(client.get('/api/items/summary?change=unchanged')) == ['Toaster']
+    filtered = client.get('/api/items/summary?q=kettle&per_page=2&page=2').get_json()
+    assert (filtered['total'], filtered['pages']) == (4, 2)
+    assert [item['name'] for item in filtered['items']] == ['Toaster', 'Kettle lid']
+
+def test_sorting_puts_missing_values_last(make_client):
+    client = make_client(StubTracker([summary(1, latest_price=5.0), summary(2, latest_price=None),
+                                      summary(3, latest_price=7.0)]))
+    assert names(client.get('/api/items/summary?sort=price')) == ['Item 01', 'Item 03', 'Item 02']
+    assert names(client.get('/api/items/summary?sort=-price')) == ['Item 03', 'Item 01', 'Item 02']
+
+def test_summary_page_answers_304_until_it_changes(make_client):
+    tracker = StubTracker([summary(i) for i in range(5)])
+    client = make_client(tracker)
+    etag = client.get('/api/items/summary?per_page=2').headers['ETag']
+    assert client.get('/api/items/summary?per_page=2', headers={'If-None-Match': etag}).status_code == 304
+    assert client.get('/api/items/summary?per_page=2&page=2', headers={'If-None-Match': etag}).status_code == 200
+    tracker.summaries[0]['latest_price'] = 1.0
+    assert client.get('/api/items/summary?per_page=2', headers={'If-None-Match': etag}).status_code == 200
+
+def test_tracker_summaries_follow_new_prices(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    tracker = PriceTracker([{'url': 'https://shop.example.com/a', 'name': 'A'}], StubConfigManager())
+    [item] = tracker.items.values()
+    item['data_manager'].save_price(10)
+    [first] = tracker.get_item_summaries()
+    assert (first['latest_price'], first['change'], first['status']) == (10, None, 'checking')
+    item['data_manager'].save_price(8)
+    [second] = tracker.get_item_summaries()
+    assert (second['latest_price'], second['previous_price'], second['change'], second['change_pct']) == (8, 10, -2, -20)
+    assert second['sparkline'] == [10, 8]
@@ -0,0 +1,210 @@
+#test_http_fetcher.py
+
+from http_fetcher import (SelectorExtractor, FetchTierStats, extract_fields, fetch_page,
+                          content_hash, skip_rate)
+from fake_retailer import FakeRetailer, render_product, product_price
+from profiles import ProfileRegistry
+from urllib.error import HTTPError
+from scraper import PriceScraper, SelectorStats
+import pytest
+
+# Product IDs of each FakeRetailer page kind
+META, CSS, JS, MISSING = 4, 5, 6, 7
+
+def extract(html, selectors):
+    extractor = SelectorExtractor(selectors)
+    extractor.feed(html)
+    extractor.close()
+    return {selector: extractor.value(selector) for selector in selectors}
+
+def test_extractor_matches_tag_class_and_attribute_selectors():
+    html = ('<div class="price old">$5</div>'
+            '<span class="price" data-price-type="finalPrice">$4.50</span>'
+            '<meta property="product:price:amount" content="4.50">')
+    found = extract(html, ['.price', 'span[data-price-type="finalPrice"]',
+                           'meta[property="product:price:amount"]', 'h1.page-title'])
+    assert found['.price'][0] == '$5'
+    assert found['span[data-price-type="finalPrice"]'][0] == '$4.50'
+    assert found['meta[property="product:price:amount"]'][1]['content'] == '4.50'
+    assert found['h1.page-title'] is None
+
+def test_extractor_collects_text_of_nested_elements():
+    html = ('<div class="product-price"><div>Now <b>$1,299</b></div>'
+            '<br><img src="x.png"> only</div><div>outside</div>')
+    found = extract(html, ['.product-price'])
+    assert found['.product-price'][0] == 'Now $1,299 only'
+
+def test_extract_fields_reads_static_kinds():
+    meta = extract_fields(render_product(META, padding_kb=0), ProfileRegistry('missing.json').default)
+    assert meta['price'] == product_price(META)
+    assert meta['title'] == f"Synthetic Product {META}"
+    assert meta['image_url'] == f"/images/{META}.png"
+
+    css = extract_fields(render_product(CSS, padding_kb=0))
+    assert css['price'] == product_price(CSS)
+
+def test_extract_fields_finds_no_price_in_script_rendered_pages():
+    assert extract_fields(render_product(JS, padding_kb=0))['price'] is None
+    assert extract_fields(render_product(MISSING, padding_kb=0))['price'] is None
+
+def test_fetch_page_returns_validators(retailer):
+    html, validators = fetch_page(retailer.product_url(META))
+    assert f"Synthetic Product {META}" in html
+    assert validators['etag'] and validators['last_modified']
+    assert validators['body_hash'] == content_hash(html.encode())
+
+def test_fetch_page_conditional_request_gets_304(retailer):
+    _, validators = fetch_page(retailer.product_url(META))
+    html, revalidated = fetch_page(retailer.product_url(META), validators['etag'])
+    assert html is None
+    assert revalidated['etag'] == validators['etag']
+    assert retailer.not_modified == 1
+
+def test_fetch_page_raises_for_missing_pages(retailer):
+    with pytest.raises(HTTPError):
+        fetch_page(f"{retailer.base_url}/nothing")
+
+def test_tier_stats_move_low_hit_rate_domains_to_browser(tmp_path):
+    stats = FetchTierStats(str(tmp_path / 'tiers.json'), min_samples=3, min_hit_rate=0.5, probe_every=4)
+    url = 'https://shop.example.com/item'
+    for _ in range(3):
+        assert stats.should_try_http(url)
+        stats.record(url, 'http', False)
+    # Browser attempts count up to the next HTTP probe
+    tries = []
+    for _ in range(8):
+        stats.record(url, 'browser', True)
+        tries.append(stats.should_try_http(url))
+    assert tries == [False, False, False, True] * 2
+    assert stats.should_try_http('https://other.example.com/item')
+
+def test_tier_stats_keep_http_above_hit_rate_and_persist(tmp_path):
+    stats_file = str(tmp_path / 'tiers.json')
+    stats = FetchTierStats(stats_file, min_samples=2)
+    url = 'https://shop.example.com/item'
+    stats.record(url, 'http', True)
+    stats.record(url, 'http', False)
+    assert stats.should_try_http(url)
+    stats.save()
+    assert FetchTierStats(stats_file).hit_rates() == {'shop.example.com': 0.5}
+
+def test_tier_stats_saved_by_several_processes_are_added(tmp_path):
+    stats_file = str(tmp_path / 'tiers.json')
+    first, second = FetchTierStats(stats_file), FetchTierStats(stats_file)
+    url = 'https://shop.example.com/item'
+    first.record(url, 'http', True)
+    second.record(url, 'http', False)
+    second.record(url, 'browser', True)
+    first.save()
+    second.save()
+    first.save()
+    entry = FetchTierStats(stats_file).domains['shop.example.com']
+    assert (entry['http_attempts'], entry['http_hits'], entry['browser_attempts']) == (2, 1, 1)
+    assert first.domains == second.domains
+
+def test_selector_stats_saved_by_several_processes_are_added(tmp_path):
+    stats_file = str(tmp_path / 'selectors.json')
+    first, second = SelectorStats(stats_file), SelectorStats(stats_file)
+    url = 'https://shop.example.com/item'
+    first.record(url, 'price', '.price')
+    second.record(url, 'price', '.price')
+    second.record(url, 'price', '.product-price')
+    second.save()
+    first.save()
+    entry = SelectorStats(stats_file).domains['shop.example.com']['price']
+    assert entry['hits'] == {'.price': 2, '.product-price': 1}
+    assert entry['last'] == '.price'
+
+def make_scraper(url, tmp_path, thumbnail_store, tier_stats=None, rendered=None, **kwargs):
+    """A PriceScraper whose browser tier returns rendered, or fails if it is None"""
+    scraper = PriceScraper(url, driver_pool=object(), tier_stats=tier_stats,
+                           profile_registry=ProfileRegistry(str(tmp_path / 'profiles.json')),
+                           thumbnail_store=thumbnail_store, **kwargs)
+    scraper.browser_calls = 0
+
+    def browser():
+        scraper.browser_calls += 1
+        if rendered is None:
+            raise RuntimeError('no browser in tests')
+        return {**rendered, 'item_id': scraper.item_id, 'url': url}
+    scraper._get_item_data_browser = browser
+    return scraper
+
+def rendered_data(product_id):
+    return {'price': product_price(product_id), 'title': f"Synthetic Product {product_id}",
+            'thumbnail_path': 'thumbnails/rendered.png'}
+
+def test_static_page_uses_http_tier(retailer, tmp_path, thumbnail_store):
+    stats = FetchTierStats(str(tmp_path / 'tiers.json'))
+    scraper = make_scraper(retailer.product_url(CSS), tmp_path, thumbnail_store, stats)
+    data = scraper.get_item_data()
+    assert data['price'] == product_price(CSS)
+    assert data['validators']['tier'] == 'http'
+    assert data['thumbnail_path']
+    assert scraper.browser_calls == 0
+    assert stats.domains[scraper.domain]['http_hits'] == 1
+
+def test_script_page_falls_back_to_browser_and_reprobes(retailer, tmp_path, thumbnail_store):
+    stats = FetchTierStats(str(tmp_path / 'tiers.json'), min_samples=2, probe_every=3)
+    url = retailer.product_url(JS)
+    requests = []
+    for _ in range(6):
+        before = retailer.requests
+        scraper = make_scraper(url, tmp_path, thumbnail_store, stats, rendered_data(JS))
+        data = scraper.get_item_data()
+        assert data['price'] == product_price(JS)
+        assert scraper.browser_calls == 1
+        requests.append(retailer.requests - before)
+    # Two HTTP misses move the domain to the browser, which probes HTTP every third render
+    assert requests == [1, 1, 0, 1, 0, 0]
+    entry = stats.domains[scraper.domain]
+    assert (entry['http_attempts'], entry['http_hits']) == (3, 0)
+    assert entry['browser_attempts'] == 6
+
+def test_js_only_skips_http(retailer, tmp_path, thumbnail_store):
+    scraper = make_scraper(retailer.product_url(JS), tmp_path, thumbnail_store,
+                           rendered=rendered_data(JS), js_only=True)
+    scraper.get_item_data()
+    assert retailer.requests == 0
+
+def test_unchanged_static_page_is_answered_by_304(retailer, tmp_path, thumbnail_store):
+    scraper = make_scraper(retailer.product_url(META), tmp_path, thumbnail_store)
+    first = scraper.get_item_data()
+    assert first['fetch_outcome'] == 'changed'
+
+    second = scraper.get_item_data(first)
+    assert second['fetch_outcome'] == 'not_modified'
+    assert second['price'] == first['price']
+    assert retailer.not_modified == 1
+
+    third = scraper.get_item_data({**first, 'validators': {**first['validators'], 'verified_at': 0}})
+    assert third['fetch_outcome'] == 'fragment_unchanged'
+    assert retailer.not_modified == 1
+
+def test_unchanged_body_is_detected_by_hash_without_validators(tmp_path, thumbnail_store):
+    retailer = FakeRetailer(padding_kb=0, validators=False).start()
+    try:
+        scraper = make_scraper(retailer.product_url(CSS), tmp_path, thumbnail_store)
+        first = scraper.get_item_data()
+        assert first['validators']['etag'] is None
+        second = scraper.get_item_data(first)
+        assert second['fetch_outcome'] == 'body_unchanged'
+        assert second['validators']['body_hash'] == first['validators']['body_hash']
+
+        changed = {**first, 'validators': {**first['validators'], 'body_hash': 'stale'}}
+        assert scraper.get_item_data(changed)['fetch_outcome'] == 'fragment_unchanged'
+    finally:
+        retailer.stop()
+
+def test_browser_tier_pages_are_never_skipped(retailer, tmp_path, thumbnail_store):
+    scraper = make_scraper(retailer.product_url(JS), tmp_path, thumbnail_store, rendered=rendered_data(JS))
+    first = scraper.get_item_data()
+    assert 'tier' not in first['validators']
+    second = scraper.get_item_data(first)
+    assert second['fetch_outcome'] == 'fragment_unchanged'
+    assert scraper.browser_calls == 2
+    assert retailer.not_modified == 0
+
+def test_skip_rate():
+    assert skip_rate({}) is None
+    assert skip_rate({'checks': 4, 'not_modified': 2, 'body_unchanged': 1, 'changed': 1}) == 0.75
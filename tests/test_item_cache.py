@@ -0,0 +1,91 @@
+#test_item_cache.py
+
+from item_cache import ItemCache
+from datamanager import PriceDataManager
+from sqlite_storage import SQLiteStorage, SQLitePriceDataManager
+from tracker import PriceTracker
+from dashboard import Dashboard
+import pytest
+
+URL = 'https://shop.example.com/item'
+
+class StubConfigManager:
+    def update_status(self, url, status):
+        pass
+
+@pytest.fixture
+def tracker(tmp_path, monkeypatch):
+    """A file-backed PriceTracker with one item, keeping its data under tmp_path"""
+    monkeypatch.chdir(tmp_path)
+    return PriceTracker([{'url': URL, 'name': 'Item'}], StubConfigManager())
+
+def only_item(tracker):
+    [(item_id, item)] = tracker.items.items()
+    return item_id, item
+
+def prices(data):
+    return [row['Price'] for row in data['price_history']]
+
+def test_cache_reloads_only_when_the_revision_changes():
+    cache = ItemCache()
+    loads = []
+    load = lambda: loads.append(1) or len(loads)
+    assert cache.get('a', 1, load) == 1
+    assert cache.get('a', 1, load) == 1
+    assert cache.get('a', 2, load) == 2
+    cache.retain(['b'])
+    assert cache.get('a', 2, load) == 3
+    assert cache.stats() == {'entries': 1, 'hits': 1, 'misses': 3, 'invalidations': 1, 'hit_rate': 0.25}
+
+def test_tracker_reads_are_served_from_the_cache_until_a_write(tracker):
+    item_id, item = only_item(tracker)
+    item['data_manager'].save_price(10)
+    assert prices(tracker.get_item_data(item_id)) == ['10.00']
+    tracker.get_all_items()
+    assert (tracker.cache.stats()['hits'], tracker.cache.stats()['misses']) == (1, 1)
+
+    item['data_manager'].save_price(9)
+    item['data_manager'].save_metadata({'title': 'Renamed'})
+    data = tracker.get_item_data(item_id)
+    assert prices(data) == ['10.00', '9.00']
+    assert data['metadata'] == {'title': 'Renamed'}
+    assert tracker.cache.stats()['misses'] == 2
+
+def test_cache_sees_writes_from_another_process(tracker):
+    item_id, item = only_item(tracker)
+    item['data_manager'].save_price(10)
+    assert prices(tracker.get_item_data(item_id)) == ['10.00']
+    # A worker process writes through its own data manager
+    PriceDataManager(item_id).save_price(8)
+    assert prices(tracker.get_item_data(item_id)) == ['10.00', '8.00']
+
+def test_cache_sees_commits_from_another_sqlite_connection(tmp_path):
+    storage = SQLiteStorage(str(tmp_path / 'prices.db'))
+    other = SQLiteStorage(str(tmp_path / 'prices.db'))
+    data_manager = SQLitePriceDataManager('item', storage)
+    cache = ItemCache()
+    load = lambda: cache.get('item', data_manager.get_revision(), data_manager.load_price_history)
+    data_manager.save_price(10)
+    assert len(load()) == 1
+    assert len(load()) == 1
+    SQLitePriceDataManager('item', other).save_price(8)
+    assert len(load()) == 2
+    storage.close()
+    other.close()
+
+def test_items_endpoint_answers_304_until_an_item_changes(tracker, monkeypatch):
+    monkeypatch.setattr(Dashboard, 'setup_scheduler', lambda self: None)
+    client = Dashboard(tracker, StubConfigManager()).app.test_client()
+    item_id, item = only_item(tracker)
+    item['data_manager'].save_price(10)
+
+    first = client.get('/api/items')
+    assert first.status_code == 200
+    etag = first.headers['ETag']
+    assert client.get('/api/items', headers={'If-None-Match': etag}).status_code == 304
+
+    item['data_manager'].save_price(9)
+    changed = client.get('/api/items', headers={'If-None-Match': etag})
+    assert changed.status_code == 200
+    assert changed.headers['ETag'] != etag
+    assert [row['Price'] for row in changed.get_json()[item_id]['price_history']] == ['10.00', '9.00']
@@ -0,0 +1,71 @@
+#test_item_registry.py
+
+from item_registry import ItemRegistry, normalize_url, generate_item_id
+from config_manager import ConfigManager
+
+URL = 'https://shop.example.com/item?id=1'
+# The same page as URL, as pasted from a browser
+VARIANT = 'HTTPS://Shop.Example.com:443/item/?utm_source=mail&id=1#reviews'
+
+def test_normalize_url():
+    assert normalize_url(VARIANT) == normalize_url(URL) == 'https://shop.example.com/item?id=1'
+    assert normalize_url('http://shop.example.com:8080/a?b=2&a=1') == 'http://shop.example.com:8080/a?a=1&b=2'
+    assert normalize_url('https://shop.example.com') == 'https://shop.example.com/'
+    assert normalize_url(URL) != normalize_url('https://shop.example.com/item?id=2')
+
+def test_lookup_by_url_normalized_url_and_id():
+    registry = ItemRegistry([{'name': 'Item', 'url': URL}, {'name': 'Other', 'url': 'https://shop.example.com/other'}])
+    assert registry.get(URL)['name'] == 'Item'
+    assert registry.get(VARIANT)['name'] == 'Item'
+    assert registry.get_by_id(generate_item_id(URL))['name'] == 'Item'
+    assert registry.get('https://shop.example.com/item?id=2') is None
+    assert registry.is_tracked(VARIANT)
+    assert len(registry) == 2
+
+def test_remove_and_restore_by_equivalent_url():
+    registry = ItemRegistry([{'name': 'Item', 'url': URL, 'status': 'ok'}])
+    removed = registry.remove(VARIANT, removed_at='yesterday')
+    assert removed['url'] == URL
+    assert not registry.is_tracked(URL)
+    assert registry.get_by_id(generate_item_id(URL)) is None
+    assert registry.get_removed(VARIANT)['removed_at'] == 'yesterday'
+
+    restored = registry.restore(VARIANT, status='checking')
+    assert restored == {'name': 'Item', 'url': URL, 'status': 'checking'}
+    assert registry.get(VARIANT) is not None
+    assert registry.history() == []
+    assert registry.remove(VARIANT) is not None and registry.remove(VARIANT) is None
+
+def test_history_keeps_one_entry_per_normalized_url():
+    registry = ItemRegistry(history=[
+        {'name': 'Old', 'url': URL, 'removed_at': '1'},
+        {'name': 'Other', 'url': 'https://shop.example.com/other', 'removed_at': '2'},
+        {'name': 'Newer', 'url': VARIANT, 'removed_at': '3'}
+    ])
+    # The later entry replaces the equivalent earlier one, and takes its place at the end
+    assert [item['name'] for item in registry.history()] == ['Other', 'Newer']
+    assert registry.get_removed(URL)['name'] == 'Newer'
+
+    registry.add({'name': 'Again', 'url': URL})
+    registry.remove(URL, removed_at='4')
+    assert [item['name'] for item in registry.history()] == ['Other', 'Again']
+    assert registry.get_removed(VARIANT)['removed_at'] == '4'
+
+def test_set_status_reports_changes():
+    registry = ItemRegistry([{'name': 'Item', 'url': URL, 'status': 'checking'}])
+    assert registry.set_status(VARIANT, 'ok')
+    assert not registry.set_status(URL, 'ok')
+    assert not registry.set_status('https://shop.example.com/missing', 'ok')
+    assert registry.items()[0]['status'] == 'ok'
+
+def test_config_manager_rejects_equivalent_urls(tmp_path):
+    config = ConfigManager(str(tmp_path / 'items.json'), str(tmp_path / 'history.json'))
+    assert config.add_item('Item', URL)[0]
+    assert config.add_item('Duplicate', VARIANT) == (False, "URL already being tracked")
+    assert config.remove_item(VARIANT)[0]
+    assert config.add_item('Item', URL)[0]
+    config.remove_item(URL)
+    assert len(config.get_history()) == 1
+    assert config.restore_item(VARIANT)[0]
+    assert [item['url'] for item in config.get_items()] == [URL]
+    assert config.get_history() == []
@@ -0,0 +1,84 @@
+#test_price_store.py
+
+from price_store import PriceStore
+import multiprocessing
+import time
+
+def observe_prices(path, count, base):
+    store = PriceStore(path)
+    for i in range(count):
+        store.observe(time.time(), base + i / 100)
+
+def test_observe_extends_runs_and_keeps_starts_increasing(tmp_path):
+    store = PriceStore(str(tmp_path / 'item_prices.bin'))
+    store.create()
+    now = int(time.time())
+    assert store.observe(now, 10.0)
+    assert not store.observe(now + 5, 10.0)
+    assert store.observe(now, 11.0)
+    first_seen, last_seen, counts, prices = store.read_runs()
+    assert list(first_seen) == [now, now + 1]
+    assert list(last_seen) == [now + 5, now + 1]
+    assert list(counts) == [2, 1]
+    assert list(prices) == [10.0, 11.0]
+
+def test_replace_before_keeps_observations_from_other_processes(tmp_path):
+    path = str(tmp_path / 'item_prices.bin')
+    store = PriceStore(path)
+    store.create()
+    old_runs = [(1000 + i, 1000 + i, 1, 1.0 + i) for i in range(200)]
+    store.extend([(ts, price) for ts, _, _, price in old_runs])
+
+    workers = [multiprocessing.Process(target=observe_prices, args=(path, 100, 100 * (n + 1)))
+               for n in range(3)]
+    for worker in workers:
+        worker.start()
+    rewrites = 0
+    while any(worker.is_alive() for worker in workers) or not rewrites:
+        store.replace_before(2000, [(1000, 1199, 200, 1.0)] if rewrites % 2 else old_runs)
+        rewrites += 1
+    for worker in workers:
+        worker.join()
+
+    timestamps, prices = store.read_range(2000)
+    assert len(timestamps) == 300
+    assert list(timestamps) == sorted(timestamps)
+
+def test_read_last_reads_only_the_latest_runs(tmp_path):
+    store = PriceStore(str(tmp_path / 'item_prices.bin'))
+    assert list(store.read_last(3)[0]) == []
+    store.create()
+    store.extend([(1000 + i, float(i)) for i in range(10)])
+    timestamps, prices = store.read_last(3)
+    assert list(timestamps) == [1007, 1008, 1009]
+    assert list(prices) == [7.0, 8.0, 9.0]
+    assert list(store.read_last(50)[1]) == [float(i) for i in range(10)]
+    assert list(store.read_last(0)[1]) == []
+
+def test_cached_latest_and_count_follow_writes_from_other_instances(tmp_path):
+    path = str(tmp_path / 'item_prices.bin')
+    reader, writer = PriceStore(path), PriceStore(path)
+    reader.create()
+    assert len(reader) == 0 and reader.latest() is None
+
+    now = int(time.time())
+    writer.observe(now, 10.0)
+    assert len(reader) == 1 and reader.latest() == (now, 10.0)
+    # Extending the latest run in place keeps the size but moves last-seen
+    writer.observe(now + 30, 10.0)
+    assert len(reader) == 1 and reader.latest() == (now + 30, 10.0)
+    writer.observe(now + 60, 12.0)
+    assert len(reader) == 2 and reader.latest() == (now + 60, 12.0)
+    # Records of the reader's own writes still count those of the writer
+    reader.observe(now + 90, 13.0)
+    assert len(reader) == 3 and len(writer) == 3
+
+def test_rollups_are_rebuilt_after_another_process_saves(tmp_path, monkeypatch):
+    from datamanager import PriceDataManager
+    monkeypatch.chdir(tmp_path)
+    dashboard, worker = PriceDataManager('item'), PriceDataManager('item')
+    assert dashboard.save_price(10.0)
+    assert dashboard._get_rollups().count == 1
+    worker.store.observe(time.time() + 1, 12.0)
+    assert dashboard._get_rollups().count == 2
+    assert dashboard.get_latest_price()[1] == 12.0
@@ -0,0 +1,55 @@
+#test_scraper.py
+
+from profiles import ProfileRegistry
+from resilience import ScrapeError
+from scraper import PriceScraper
+import pytest
+import time
+
+class FakeDriver:
+    """Answers the selector script with what the page shows at each poll
+
+    polls is a list of {selector: text} dicts; the last one repeats.
+    """
+
+    def __init__(self, polls, title='Product page'):
+        self.polls = polls
+        self.title = title
+        self.calls = 0
+
+    def execute_script(self, script, lookups):
+        shown = self.polls[min(self.calls, len(self.polls) - 1)]
+        self.calls += 1
+        return [[shown[selector], {'content': ''}] if selector in shown else None
+                for selector, _ in lookups]
+
+def make_scraper(tmp_path, **kwargs):
+    return PriceScraper('https://shop.example.com/item', driver_pool=object(),
+                        profile_registry=ProfileRegistry(str(tmp_path / 'profiles.json')),
+                        thumbnail_store=object(), **kwargs)
+
+def test_title_rendered_after_the_price_is_waited_for(tmp_path):
+    scraper = make_scraper(tmp_path)
+    driver = FakeDriver([{'.price': '$12.50'}, {'.price': '$12.50'},
+                         {'.price': '$12.50', 'h1.page-title': 'Kettle'}])
+    assert scraper._wait_for_fields(driver, time.monotonic() + 10) == (12.5, 'Kettle')
+    assert driver.calls == 3
+
+def test_missing_title_gives_up_after_the_grace_period(tmp_path):
+    scraper = make_scraper(tmp_path, title_grace=0.5)
+    driver = FakeDriver([{'.price': '$12.50'}])
+    started = time.monotonic()
+    assert scraper._wait_for_fields(driver, time.monotonic() + 10) == (12.5, 'Unknown Title')
+    assert 0.5 <= time.monotonic() - started < 2
+
+def test_price_is_kept_when_the_deadline_passes_waiting_for_a_title(tmp_path):
+    scraper = make_scraper(tmp_path, title_grace=30)
+    driver = FakeDriver([{'.price': '$12.50'}])
+    assert scraper._wait_for_fields(driver, time.monotonic() + 0.5)[0] == 12.5
+
+def test_missing_price_fails_and_blocked_pages_are_classified(tmp_path):
+    scraper = make_scraper(tmp_path)
+    with pytest.raises(ValueError):
+        scraper._wait_for_fields(FakeDriver([{'h1.page-title': 'Kettle'}]), time.monotonic() + 0.5)
+    with pytest.raises(ScrapeError):
+        scraper._wait_for_fields(FakeDriver([{}], title='Access Denied'), time.monotonic() + 0.5)
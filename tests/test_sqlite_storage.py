@@ -0,0 +1,60 @@
+#test_sqlite_storage.py
+
+from sqlite_storage import SQLiteStorage
+import pytest
+
+INSERT = "INSERT INTO prices (item_id, ts, price, last_seen, count) VALUES (?, ?, ?, ?, 1)"
+
+@pytest.fixture
+def storage(tmp_path):
+    storage = SQLiteStorage(str(tmp_path / 'prices.db'))
+    yield storage
+    storage.close()
+
+def items(storage):
+    return [row[0] for row in storage.query('SELECT item_id FROM prices ORDER BY ts')]
+
+def test_batch_commits_on_a_clean_exit(storage):
+    with storage.batch():
+        with storage.batch():
+            storage.write(INSERT, ('a', 1, 1.0, 1))
+        storage.write(INSERT, ('b', 2, 1.0, 2))
+    assert items(storage) == ['a', 'b']
+    assert not storage.conn.in_transaction
+
+def test_failed_batch_rolls_back_its_uncommitted_writes(storage):
+    with pytest.raises(RuntimeError):
+        with storage.batch():
+            storage.write(INSERT, ('a', 1, 1.0, 1))
+            with storage.batch():
+                storage.write(INSERT, ('b', 2, 1.0, 2))
+            raise RuntimeError
+    assert items(storage) == []
+    assert not storage.conn.in_transaction
+    # The storage is usable afterwards
+    with storage.batch():
+        storage.write(INSERT, ('c', 3, 1.0, 3))
+    assert items(storage) == ['c']
+
+def test_failed_batch_keeps_periodically_committed_writes(tmp_path):
+    storage = SQLiteStorage(str(tmp_path / 'prices.db'), batch_size=2)
+    with pytest.raises(RuntimeError):
+        with storage.batch():
+            for ts in range(3):
+                storage.write(INSERT, (f'item{ts}', ts, 1.0, ts))
+            raise RuntimeError
+    assert items(storage) == ['item0', 'item1']
+    storage.close()
+
+def test_failed_transaction_inside_a_batch_rolls_back_alone(storage):
+    with storage.batch():
+        storage.write(INSERT, ('a', 1, 1.0, 1))
+        with pytest.raises(RuntimeError):
+            with storage.transaction():
+                storage.write('DELETE FROM prices')
+                with storage.transaction():
+                    storage.write(INSERT, ('b', 2, 1.0, 2))
+                raise RuntimeError
+        with storage.transaction():
+            storage.write(INSERT, ('c', 3, 1.0, 3))
+    assert items(storage) == ['a', 'c']
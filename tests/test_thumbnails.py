@@ -0,0 +1,46 @@
+#test_thumbnails.py
+
+from fake_retailer import PRODUCT_IMAGE
+from thumbnails import ThumbnailStore
+import zlib
+
+def png(seed):
+    """A distinct valid PNG per seed, so each one is stored as its own file"""
+    def chunk(kind, data):
+        return len(data).to_bytes(4, 'big') + kind + data + zlib.crc32(kind + data).to_bytes(4, 'big')
+    return (b'\x89PNG\r\n\x1a\n' +
+            chunk(b'IHDR', (1).to_bytes(4, 'big') * 2 + bytes([8, 2, 0, 0, 0])) +
+            chunk(b'IDAT', zlib.compress(bytes([0, seed * 80 % 256, 255 - seed * 80 % 256, 0x33]))) +
+            chunk(b'IEND', b''))
+
+def make_store(tmp_path):
+    return ThumbnailStore(str(tmp_path / 'thumbnails'), str(tmp_path / 'thumbnails.json'))
+
+def test_prune_keeps_thumbnails_stored_by_other_processes(tmp_path):
+    dashboard = make_store(tmp_path)
+    kept = dashboard.put('kept', png(1))
+    removed = dashboard.put('removed', png(2))
+
+    # A worker process with its own store, loaded before or after the dashboard's
+    worker = make_store(tmp_path)
+    captured = worker.put('new', png(3))
+
+    assert dashboard.prune(['kept', 'new']) == 1
+    assert dashboard.get('new') == captured
+    for path in (kept, captured):
+        assert (tmp_path / 'thumbnails' / path.rsplit('/', 1)[1]).exists()
+    assert not (tmp_path / 'thumbnails' / removed.rsplit('/', 1)[1]).exists()
+
+def test_saves_from_several_stores_are_merged(tmp_path):
+    first, second = make_store(tmp_path), make_store(tmp_path)
+    first.put('a', png(1))
+    second.put('b', png(2))
+    first.save()
+    assert set(make_store(tmp_path).index) == {'a', 'b'}
+    assert second.get('a') == first.get('a')
+
+def test_items_sharing_an_image_share_one_file(tmp_path):
+    store = make_store(tmp_path)
+    assert store.put('a', PRODUCT_IMAGE) == store.put('b', PRODUCT_IMAGE)
+    assert store.prune(['b']) == 0
+    assert store.get('b') is not None
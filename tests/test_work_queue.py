@@ -0,0 +1,114 @@
+#test_work_queue.py
+
+from work_queue import WorkQueue
+from worker import ScrapeWorker
+import threading
+import time
+
+def make_queue(tmp_path, lease_seconds=120, **kwargs):
+    return WorkQueue(str(tmp_path / 'queue.db'), lease_seconds=lease_seconds, **kwargs)
+
+def enqueue(queue, *item_ids):
+    return queue.enqueue([(item_id, f"https://shop.example.com/{item_id}", {'url': f"https://shop.example.com/{item_id}"})
+                          for item_id in item_ids])
+
+def states(queue):
+    return dict(queue._query('SELECT item_id, state FROM tasks'))
+
+def test_expired_lease_returns_the_task_to_the_queue(tmp_path):
+    queue = make_queue(tmp_path, lease_seconds=0.1)
+    enqueue(queue, 'a')
+    [task] = queue.lease('crashed', 1)
+    assert queue.lease('other', 1) == []
+    time.sleep(0.2)
+    [again] = queue.lease('other', 1)
+    assert (again['id'], again['attempts']) == (task['id'], 2)
+    # The crashed worker no longer owns the task
+    assert not queue.complete(task['id'], 'crashed', {})
+    assert queue.complete(task['id'], 'other', {})
+
+def test_task_fails_after_its_lease_expires_max_attempts_times(tmp_path):
+    queue = make_queue(tmp_path, lease_seconds=0.05, max_attempts=2)
+    task_id = enqueue(queue, 'a')['a']
+    for owner in ('first', 'second'):
+        assert queue.lease(owner, 1)
+        time.sleep(0.1)
+    assert queue.lease('third', 1) == []
+    state, result = queue.results([task_id])[task_id]
+    assert state == 'failed'
+    assert result['error']['kind'] == 'lease_expired'
+
+def test_heartbeat_keeps_the_lease(tmp_path):
+    queue = make_queue(tmp_path, lease_seconds=0.3)
+    enqueue(queue, 'a')
+    [task] = queue.lease('alive', 1)
+    for _ in range(4):
+        time.sleep(0.15)
+        queue.heartbeat('alive')
+    # Longer than the lease, but renewed all along
+    assert queue.lease('other', 1) == []
+    assert queue.complete(task['id'], 'alive', {})
+    assert [worker['owner'] for worker in queue.stats()['workers']] == ['alive']
+
+def test_released_task_is_picked_up_by_another_worker(tmp_path):
+    queue = make_queue(tmp_path)
+    enqueue(queue, 'a', 'b')
+    leased = queue.lease('stopping', 2)
+    queue.heartbeat('stopping')
+    queue.release('stopping')
+    assert states(queue) == {'a': 'queued', 'b': 'queued'}
+    assert queue.stats()['workers'] == []
+    picked = queue.lease('other', 2)
+    assert sorted(task['id'] for task in picked) == sorted(task['id'] for task in leased)
+    # Releasing does not use up an attempt
+    assert [task['attempts'] for task in picked] == [1, 1]
+
+def test_lease_respects_the_per_domain_limit(tmp_path):
+    queue = make_queue(tmp_path, per_domain_limit=1)
+    enqueue(queue, 'a', 'b')
+    assert len(queue.lease('first', 2)) == 1
+    assert queue.lease('second', 2) == []
+
+class StubScraper:
+    def __init__(self, url):
+        self.url = url
+        self.js_only = False
+
+class StubTracker:
+    """Tracker whose item swaps are slow enough for pool threads to interleave"""
+
+    def __init__(self):
+        self._items = {}
+        self._in_flight_lock = threading.Lock()
+
+    @property
+    def items(self):
+        return self._items
+
+    @items.setter
+    def items(self, items):
+        time.sleep(0.0005)
+        self._items = items
+
+    def _create_item(self, payload):
+        time.sleep(0.001)
+        return {'scraper': StubScraper(payload['url']), 'name': 'Unknown Item'}
+
+def test_worker_threads_adding_items_do_not_lose_each_other(tmp_path):
+    tracker = StubTracker()
+    worker = ScrapeWorker(tracker, make_queue(tmp_path))
+    tasks = [{'item_id': f"item{i}", 'payload': {'url': f"https://shop.example.com/{i}", 'name': f"Item {i}"}}
+             for i in range(200)]
+
+    def run(tasks):
+        for task in tasks:
+            worker._item(task)
+    threads = [threading.Thread(target=run, args=(tasks[i::8],)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(tracker.items) == 200
+    assert tracker.items['item7']['name'] == 'Item 7'
+    # A known item is reused, not recreated
+    assert worker._item(tasks[7]) is tracker.items['item7']
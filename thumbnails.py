@@ -0,0 +1,307 @@
+#thumbnails.py
+
+from http_fetcher import USER_AGENT
+from file_lock import locked, load_json, write_json
+from urllib.request import Request, HTTPRedirectHandler, build_opener
+from urllib.parse import urljoin, urlparse
+from io import BytesIO
+import threading
+import ipaddress
+import socket
+import hashlib
+import logging
+import os
+import re
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+# Elements most likely to hold the main product image, in priority order
+IMAGE_SELECTORS = [
+    'img[itemprop="image"]',
+    '#landingImage',
+    '.product-image img',
+    '.gallery img',
+    'main img'
+]
+
+# Finds the product image: [og:image URL or null, index of the first visible image element or -1]
+FIND_IMAGE_SCRIPT = """
+var meta = document.querySelector('meta[property="og:image"]');
+if (meta && meta.getAttribute('content')) { return [meta.getAttribute('content'), -1]; }
+var selectors = arguments[0];
+for (var i = 0; i < selectors.length; i++) {
+    try {
+        var element = document.querySelector(selectors[i]);
+        if (element && element.offsetWidth > 50 && element.offsetHeight > 50) {
+            element.scrollIntoView({block: 'center'});
+            return [null, i];
+        }
+    } catch (e) {}
+}
+return [null, -1];
+"""
+
+MAX_IMAGE_BYTES = 10 * 1024 * 1024
+HASHED_NAME = re.compile(r'^[0-9a-f]{20}\.\w+$')
+
+# Hosts allowed to resolve to private or loopback addresses, for local test servers only
+ALLOWED_PRIVATE_HOSTS = set()
+
+def image_extension(data):
+    """File extension of JPEG, PNG, GIF or WebP bytes by their magic number, or None"""
+    if data.startswith(b'\xff\xd8\xff'):
+        return 'jpg'
+    if data.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'png'
+    if data[:6] in (b'GIF87a', b'GIF89a'):
+        return 'gif'
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return 'webp'
+    return None
+
+def check_public_url(url):
+    """Raise ValueError unless url is http(s) on a host resolving only to public addresses
+
+    Image URLs come from the retailer's page, so they must not reach local
+    files or internal services.
+    """
+    parsed = urlparse(url)
+    if parsed.scheme not in ('http', 'https') or not parsed.hostname:
+        raise ValueError(f"Refusing image URL {url[:200]}")
+    if parsed.hostname in ALLOWED_PRIVATE_HOSTS:
+        return
+    port = parsed.port or (443 if parsed.scheme == 'https' else 80)
+    for info in socket.getaddrinfo(parsed.hostname, port, proto=socket.IPPROTO_TCP):
+        address = ipaddress.ip_address(info[4][0].split('%')[0])
+        if not address.is_global or address.is_multicast:
+            raise ValueError(f"Refusing image URL on non-public address {address}")
+
+class _PublicRedirectHandler(HTTPRedirectHandler):
+    """Follows redirects only to URLs that pass check_public_url"""
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        check_public_url(newurl)
+        return super().redirect_request(req, fp, code, msg, headers, newurl)
+
+_image_opener = build_opener(_PublicRedirectHandler)
+
+def download_image(url, base_url=None, timeout=10):
+    """Download an image over http(s) from a public host, resolving url against the page it was found on"""
+    url = urljoin(base_url or url, url)
+    check_public_url(url)
+    request = Request(url, headers={'User-Agent': USER_AGENT})
+    with _image_opener.open(request, timeout=timeout) as response:
+        return response.read(MAX_IMAGE_BYTES)
+
+class ThumbnailStore:
+    """Resized, compressed thumbnails stored once per content hash
+
+    Images are scaled to fit size and encoded as WebP (JPEG when the Pillow
+    build lacks WebP). Files are named by the hash of their encoded bytes, so
+    items sharing an image share one file and URLs never change content,
+    which lets them be served with long-lived cache headers. Without Pillow
+    the source image is stored as-is, still deduplicated by hash, if its
+    magic bytes show a known image format. The index is shared with worker
+    processes: changes are merged into the file under a lock, and it is
+    reloaded when another process has written it.
+    """
+
+    def __init__(self, root='static/thumbnails', index_file='data/thumbnails.json',
+                 size=(320, 320), quality=80):
+        """
+        root: directory holding the image files
+        index_file: where the item ID to file mapping persists
+        size: bounding box thumbnails are scaled down to
+        quality: WebP/JPEG encoder quality
+        """
+        self.root = root
+        self.index_file = index_file
+        self.size = size
+        self.quality = quality
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        # Index changes not yet merged into the file; None marks a removed item
+        self._pending = {}
+        self._stamp = None
+        os.makedirs(self.root, exist_ok=True)
+        self.index = self._load()
+        self.format = self._pick_format()
+
+    def _pick_format(self):
+        if Image is None:
+            return None
+        from PIL import features
+        return 'WEBP' if features.check('webp') else 'JPEG'
+
+    def _file_stamp(self):
+        try:
+            stat = os.stat(self.index_file)
+            return stat.st_mtime_ns, stat.st_size
+        except OSError:
+            return None
+
+    def _load(self):
+        """Load the item index from file, with this process's unsaved changes applied"""
+        index = {}
+        try:
+            stamp = self._file_stamp()
+            index = load_json(self.index_file, {})
+            self._stamp = stamp
+        except Exception as e:
+            self.logger.error(f"Error loading thumbnail index: {e}")
+        with self._lock:
+            for item_id, path in self._pending.items():
+                if path is None:
+                    index.pop(item_id, None)
+                else:
+                    index[item_id] = path
+        return index
+
+    def _refresh(self):
+        """Reload the index if another process has written it since it was loaded"""
+        if self._file_stamp() != self._stamp:
+            index = self._load()
+            with self._lock:
+                self.index = index
+
+    def _merge(self, remove=()):
+        """Merge pending changes into the file, holding its lock; returns the merged index"""
+        with self._lock:
+            for item_id in remove:
+                self._pending[item_id] = None
+        index = self._load()
+        os.makedirs(os.path.dirname(self.index_file) or '.', exist_ok=True)
+        write_json(self.index_file, index, indent=4)
+        with self._lock:
+            self.index = index
+            self._pending = {}
+        self._stamp = self._file_stamp()
+        return index
+
+    def save(self):
+        """Merge this process's index changes into the shared index file"""
+        try:
+            with locked(self.index_file):
+                self._merge()
+        except Exception as e:
+            self.logger.error(f"Error saving thumbnail index: {e}")
+
+    def _legacy_path(self, item_id):
+        return os.path.join(self.root, f"{item_id}.png")
+
+    def get(self, item_id):
+        """Thumbnail path for an item, or None; converts a legacy full-page PNG on first use"""
+        self._refresh()
+        with self._lock:
+            path = self.index.get(item_id)
+        if path and os.path.exists(path):
+            return path
+
+        legacy_path = self._legacy_path(item_id)
+        if os.path.exists(legacy_path):
+            with open(legacy_path, 'rb') as f:
+                path = self.put(item_id, f.read())
+            if path and path != legacy_path:
+                os.remove(legacy_path)
+            return path
+        return None
+
+    def has(self, item_id):
+        """Whether an item already has a thumbnail"""
+        return self.get(item_id) is not None
+
+    def _encode(self, data):
+        """Scale and encode image bytes, returning (bytes, extension)"""
+        if Image is None:
+            # Stored and served as-is, so anything but a known image format is refused
+            extension = image_extension(data)
+            if extension is None:
+                raise ValueError("Not a JPEG, PNG, GIF or WebP image")
+            return data, extension
+        with Image.open(BytesIO(data)) as image:
+            image.draft('RGB', self.size)
+            image = image.convert('RGB')
+            image.thumbnail(self.size, Image.LANCZOS)
+            output = BytesIO()
+            image.save(output, self.format, quality=self.quality, optimize=True)
+        return output.getvalue(), 'webp' if self.format == 'WEBP' else 'jpg'
+
+    def put(self, item_id, data):
+        """Store image bytes as an item's thumbnail, returning its path or None"""
+        try:
+            encoded, extension = self._encode(data)
+        except Exception as e:
+            self.logger.error(f"Error encoding thumbnail for {item_id}: {e}")
+            return None
+
+        digest = hashlib.sha256(encoded).hexdigest()[:20]
+        path = f"{self.root}/{digest}.{extension}"
+        try:
+            # Held from writing the file until it is indexed, so a prune cannot delete it in between
+            with locked(self.index_file):
+                if not os.path.exists(path):
+                    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+                    with open(tmp_path, 'wb') as f:
+                        f.write(encoded)
+                    os.replace(tmp_path, path)
+                    self.logger.info(f"Stored thumbnail {path} ({len(encoded)} bytes)")
+                with self._lock:
+                    self.index[item_id] = path
+                    self._pending[item_id] = path
+                self._merge()
+        except Exception as e:
+            self.logger.error(f"Error storing thumbnail for {item_id}: {e}")
+            return None
+        return path
+
+    def capture(self, item_id, driver, page_url):
+        """Store a thumbnail from a loaded page: og:image, else the product image element, else the viewport"""
+        try:
+            image_url, index = driver.execute_script(FIND_IMAGE_SCRIPT, IMAGE_SELECTORS)
+            if image_url:
+                try:
+                    return self.put(item_id, download_image(image_url, page_url))
+                except Exception as e:
+                    self.logger.info(f"og:image download failed for {page_url}: {e}")
+            if index >= 0:
+                from selenium.webdriver.common.by import By
+                element = driver.find_element(By.CSS_SELECTOR, IMAGE_SELECTORS[index])
+                return self.put(item_id, element.screenshot_as_png)
+            driver.execute_script("window.scrollTo(0, 0)")
+            return self.put(item_id, driver.get_screenshot_as_png())
+        except Exception as e:
+            self.logger.error(f"Error creating thumbnail: {e}")
+            return None
+
+    def prune(self, item_ids):
+        """Forget thumbnails of items not in item_ids and delete files nobody references
+
+        The index is re-read from file first, so thumbnails other processes
+        stored since this one loaded it are kept.
+        """
+        item_ids = set(item_ids)
+        deleted = 0
+        with locked(self.index_file):
+            index = self._load()
+            removed = [item_id for item_id in index if item_id not in item_ids]
+            if not removed:
+                return 0
+            referenced = set(self._merge(removed).values())
+            for name in os.listdir(self.root):
+                path = f"{self.root}/{name}"
+                if path not in referenced and HASHED_NAME.match(name):
+                    os.remove(path)
+                    deleted += 1
+        return deleted
+
+_default_store = None
+
+def get_default_store():
+    """Shared store for code paths created without an explicit one"""
+    global _default_store
+    if _default_store is None:
+        _default_store = ThumbnailStore()
+    return _default_store
@@ -1,104 +1,457 @@
 #tracker.py
 
-from scraper import PriceScraper
+from scraper import PriceScraper, SelectorStats
+from profiles import ProfileRegistry
+from thumbnails import ThumbnailStore
+from alerts import AlertEngine
+from resilience import ResilienceTracker, ScrapeError, CircuitOpenError
+from metrics import get_default_metrics
+from price_history import DOWNSAMPLERS, PERIODS, rollup_columns, lttb
 from datamanager import PriceDataManager
+from sqlite_storage import SQLitePriceDataManager
+from update_engine import UpdateEngine
+from driver_pool import DriverPool
+from http_fetcher import FetchTierStats, skip_rate, SKIP_OUTCOMES
+from item_cache import ItemCache
+from compaction import PriceCompactor
+from item_registry import generate_item_id
+from status_bus import StatusBus
+from contextlib import nullcontext
+from datetime import datetime, timedelta
+import threading
 import logging
+import hashlib
+import json
+import time
 
 class PriceTracker:
     """Coordinates price scraping and data management for multiple items"""
     
-    def __init__(self, items_config, config_manager):
+    def __init__(self, items_config, config_manager, max_workers=4, per_domain_limit=2,
+                 driver_pool=None, storage=None, page_deadline=20, coordinator=None, compactor=None):
         """
         Initialize with a list of items to track
         items_config: list of dictionaries with 'url' and 'name' keys
         config_manager: ConfigManager instance for saving status updates
+        max_workers: number of scrapes run concurrently during an update
+        per_domain_limit: maximum concurrent scrapes against a single domain
+        driver_pool: DriverPool lending browser sessions to the scrapers
+        storage: optional SQLiteStorage, item data is kept in per-item files otherwise
+        page_deadline: seconds a browser scrape may spend loading a page and finding its price
+        coordinator: optional QueueCoordinator handing update runs to worker processes
+        compactor: PriceCompactor with the history retention settings
         """
         self.items = {}
         self.logger = logging.getLogger(__name__)
         self.config_manager = config_manager  
+        self.engine = UpdateEngine(max_workers, per_domain_limit)
+        self.coordinator = coordinator
+        self.compactor = compactor or PriceCompactor()
+        self.driver_pool = driver_pool or DriverPool(max_drivers=max_workers)
+        self.tier_stats = FetchTierStats()
+        self.selector_stats = SelectorStats()
+        self.profiles = ProfileRegistry()
+        self.thumbnails = ThumbnailStore()
+        self.alerts = AlertEngine()
+        self.resilience = ResilienceTracker()
+        self.metrics = get_default_metrics()
+        self.run_metrics_file = 'data/run_metrics.jsonl'
+        self.page_deadline = page_deadline
+        self.revalidate_hours = 24
+        self.storage = storage
+        self.cache = ItemCache()
+        self.summary_cache = ItemCache()
+        self.sparkline_points = 30
+        self.sparkline_days = 90
+        self.status_bus = StatusBus()
+        self._in_flight = set()
+        self._in_flight_lock = threading.Lock()
+        self.metrics.gauge('item_cache_hit_ratio', lambda: [
+            ({'cache': 'items'}, self.cache.stats()['hit_rate']),
+            ({'cache': 'summaries'}, self.summary_cache.stats()['hit_rate'])
+        ], 'Share of item reads served from the in-memory caches')
+        self.metrics.gauge('tracked_items', lambda: len(self.items), 'Number of tracked items')
+        self.metrics.gauge('circuit_breaker_open', self.resilience.breaker_states,
+                           'Whether scrapes of a domain are suspended by its circuit breaker')
+        self.status_bus.seed({item['url']: item.get('status', 'checking') for item in items_config})
         
         for item in items_config:
-            scraper = PriceScraper(item['url'])
-            data_manager = PriceDataManager(scraper.item_id)
-            self.items[scraper.item_id] = {
-                'scraper': scraper,
-                'data_manager': data_manager,
-                'name': item.get('name', 'Unknown Item')
-            }
+            scraper_item = self._create_item(item)
+            self.items[scraper_item['scraper'].item_id] = scraper_item
+
+    def _create_item(self, item):
+        """Create the scraper and data manager for a config entry"""
+        scraper = PriceScraper(
+            item['url'], self.driver_pool, self.tier_stats, item.get('js_only', False),
+            self.selector_stats, self.page_deadline, self.profiles, self.thumbnails,
+            self.revalidate_hours
+        )
+        return {
+            'scraper': scraper,
+            'data_manager': self._create_data_manager(scraper.item_id),
+            'name': item.get('name', 'Unknown Item')
+        }
         
+    def _create_data_manager(self, item_id):
+        """Create the data manager for the configured storage engine"""
+        if self.storage is not None:
+            return SQLitePriceDataManager(item_id, self.storage)
+        return PriceDataManager(item_id)
+
+    def _write_batch(self):
+        """Group storage writes made during an update run"""
+        if self.storage is not None:
+            return self.storage.batch()
+        return nullcontext()
+
     def update_all_prices(self):
         """Update prices for all tracked items"""
-        results = {}
-        config_items = self.config_manager.get_items()  # Add this line
-        
+        return self.update_prices(list(self.items.keys()))
+
+    def _last_update(self, item):
+        """When an item was last scraped successfully, or None if never"""
+        data_manager = item['data_manager']
+        last_update = data_manager.load_metadata().get('last_update')
+        if last_update:
+            try:
+                return datetime.fromisoformat(last_update)
+            except ValueError:
+                pass
+        # Items scraped before last_update was recorded: the day of their latest price
+        latest = data_manager.get_latest_price()
+        return datetime.fromisoformat(latest[0]) if latest else None
+
+    def stale_item_ids(self, max_age_hours=24):
+        """Items not scraped successfully within max_age_hours, never-scraped and oldest first"""
+        cutoff = datetime.now() - timedelta(hours=max_age_hours)
+        stale = []
         for item_id, item in self.items.items():
             try:
-                data = item['scraper'].get_item_data()
-                if data:
-                    item['data_manager'].save_price(data['price'])
-                    item['data_manager'].save_metadata(data)
-                    results[item_id] = data
-                    # Update status to success
-                    for config_item in config_items:
-                        if config_item['url'] == item['scraper'].url:
-                            config_item['status'] = 'success'
-                            # Save immediately to ensure SSE picks up change
-                            self.config_manager.save_items(config_items)
-                    self.logger.info(f"Updated item {item_id}")
+                last_update = self._last_update(item)
             except Exception as e:
-                # Update status to error
-                for config_item in config_items:
-                    if config_item['url'] == item['scraper'].url:
-                        config_item['status'] = 'error'
-                self.logger.error(f"Error updating item {item_id}: {e}")
-                
-        # Save updated statuses
-        self.config_manager.save_items(config_items)
+                self.logger.error(f"Error checking item {item_id}: {e}")
+                last_update = None
+            if last_update is None or last_update < cutoff:
+                stale.append((last_update or datetime.min, item_id))
+        return [item_id for _, item_id in sorted(stale)]
+
+    def update_stale_prices(self, max_age_hours=24):
+        """Update prices of the items whose last successful scrape is older than max_age_hours"""
+        item_ids = self.stale_item_ids(max_age_hours)
+        self.logger.info(f"{len(item_ids)} of {len(self.items)} items are stale")
+        return self.update_prices(item_ids)
+
+    def update_prices(self, item_ids, on_progress=None, force=False):
+        """
+        Update prices for the given items on the concurrent update engine
+        on_progress: optional callback(done, total) called as each item finishes
+        force: scrape items in retry backoff or on domains with an open circuit breaker too
+        """
+        jobs = []
+        skipped = {}
+        for item_id in item_ids:
+            item = self.items.get(item_id)
+            if item is None:
+                continue
+            with self._in_flight_lock:
+                if item_id in self._in_flight:
+                    # Another run (scheduler, dashboard job, initial refresh) is already scraping it
+                    allowed, reason = False, 'in_progress'
+                elif force:
+                    allowed, reason = True, None
+                else:
+                    allowed, reason = self.resilience.allow(item_id, item['scraper'].url)
+                if allowed:
+                    self._in_flight.add(item_id)
+            if allowed:
+                jobs.append((item_id, item))
+            else:
+                skipped[reason] = skipped.get(reason, 0) + 1
+                self.metrics.inc('scrapes_skipped_total', domain=item['scraper'].domain, reason=reason)
+        try:
+            return self._run_jobs(jobs, skipped, on_progress, force)
+        finally:
+            with self._in_flight_lock:
+                self._in_flight.difference_update(item_id for item_id, _ in jobs)
+
+    def _run_jobs(self, jobs, skipped, on_progress, force):
+        """Scrape the admitted jobs on the engine or the worker queue and record the outcomes"""
+        if skipped:
+            self.logger.info(f"Skipped {sum(skipped.values())} items: {skipped}")
+        for item_id, item in jobs:
+            self._set_status(item['scraper'].url, 'checking')
+        finished = []
+
+        def on_result(item_id, item, data, error):
+            finished.append(item_id)
+            if isinstance(error, CircuitOpenError):
+                outcome = 'skipped'
+            else:
+                outcome = 'success' if data and error is None else 'failure'
+            self.metrics.inc('scrapes_total', domain=item['scraper'].domain, outcome=outcome)
+            if on_progress:
+                on_progress(len(finished), len(jobs))
+            if data and error is None:
+                self._set_status(item['scraper'].url, 'success')
+                self.logger.info(f"Updated item {item_id}")
+            else:
+                self._set_status(item['scraper'].url, 'error')
+                if isinstance(error, CircuitOpenError):
+                    self.logger.info(f"Skipped item {item_id}: {error}")
+                elif error:
+                    self.logger.error(f"Error updating item {item_id}: {getattr(error, 'kind', 'error')}: {error}")
+                else:
+                    self.logger.warning(f"No data scraped for item {item_id}")
+
+        before = self.metrics.snapshot()
+        if self.coordinator is not None:
+            def on_remote_result(item_id, item, data, error):
+                # Workers only scrape and store; backoff and breakers are kept here
+                if data and error is None:
+                    self.resilience.record_success(item_id, item['scraper'].url)
+                elif isinstance(error, ScrapeError):
+                    self.resilience.record_failure(item_id, item['scraper'].url, error)
+                    self.metrics.inc('scrape_errors_total', domain=item['scraper'].domain, kind=error.kind)
+                on_result(item_id, item, data, error)
+
+            # No storage batch here: it would hold the write lock for the whole remote run,
+            # while the workers write prices to the same database
+            results = self.coordinator.run(jobs, on_remote_result)
+            self.config_manager.flush()
+            self.resilience.save()
+            self._save_run_metrics(before)
+            return results
+
+        with self._write_batch():
+            results = self.engine.run(jobs, lambda item_id, item: self._scrape_item(item_id, item, force),
+                                      on_result)
+
+            # Write out any status changes still held by the config manager
+            self.config_manager.flush()
+        self.tier_stats.save()
+        self.selector_stats.save()
+        self.alerts.save()
+        self.resilience.save()
+        self._save_run_metrics(before)
         return results
-        
+
+    def _save_run_metrics(self, before):
+        """Append the run's timings and the metrics recorded during it to run_metrics_file"""
+        try:
+            run = {key: value for key, value in (self.last_run_stats or {}).items() if key != 'items'}
+            run['metrics'] = self.metrics.summarize(before)
+            with open(self.run_metrics_file, 'a') as f:
+                f.write(json.dumps(run) + '\n')
+        except Exception as e:
+            self.logger.error(f"Error saving run metrics: {e}")
+
+    @property
+    def last_run_stats(self):
+        """Timing summary of the most recent update run"""
+        if self.coordinator is not None:
+            return self.coordinator.last_run
+        return self.engine.last_run
+
+    def compact_history(self):
+        """Roll old intraday prices of all items into daily and weekly summaries
+
+        Each item is compacted in its own transaction or under its own file
+        lock, so worker processes can keep saving prices during the run.
+        """
+        return self.compactor.run(self.items)
+
+    def fetch_skip_stats(self):
+        """Per-item fetch outcomes and skip rates, with totals over all items"""
+        items = {}
+        totals = {}
+        for item_id, item in self.items.items():
+            try:
+                fetch_stats = item['data_manager'].load_metadata().get('fetch_stats') or {}
+            except Exception as e:
+                self.logger.error(f"Error loading fetch stats for {item_id}: {e}")
+                continue
+            for outcome, count in fetch_stats.items():
+                totals[outcome] = totals.get(outcome, 0) + count
+            items[item_id] = {
+                'name': item['name'],
+                'url': item['scraper'].url,
+                **fetch_stats,
+                'skip_rate': skip_rate(fetch_stats)
+            }
+        return {
+            'skipped_outcomes': list(SKIP_OUTCOMES),
+            'totals': {**totals, 'skip_rate': skip_rate(totals)},
+            'items': items
+        }
+
+    def _scrape_item(self, item_id, item, force=False):
+        """Scrape a single item and store the result, run on an engine worker
+
+        Failures are recorded for backoff and circuit breaking, then re-raised.
+        """
+        scraper = item['scraper']
+        if not force:
+            # The domain's breaker may have opened while this item was queued
+            self.resilience.check_domain(scraper.url)
+        try:
+            data = self.scrape_and_store(item_id, item)
+        except Exception as e:
+            error = self.resilience.record_failure(item_id, scraper.url, e)
+            self.metrics.inc('scrape_errors_total', domain=scraper.domain, kind=error.kind)
+            raise error
+        self.resilience.record_success(item_id, scraper.url)
+        return data
+
+    def scrape_and_store(self, item_id, item):
+        """Scrape one item and store its price and metadata, raising ScrapeError on failure
+
+        The stored metadata's validators let the scraper skip unchanged pages;
+        fetch_stats counts each outcome for the per-item skip rate.
+        """
+        scraper = item['scraper']
+        data_manager = item['data_manager']
+        previous = data_manager.load_metadata()
+        with self.metrics.timer('scrape_duration_seconds', domain=scraper.domain):
+            data = scraper.get_item_data(previous)
+        if data:
+            data['last_update'] = datetime.now().isoformat(timespec='seconds')
+            outcome = data.pop('fetch_outcome', 'changed')
+            fetch_stats = dict(previous.get('fetch_stats') or {})
+            fetch_stats['checks'] = fetch_stats.get('checks', 0) + 1
+            fetch_stats[outcome] = fetch_stats.get(outcome, 0) + 1
+            data['fetch_stats'] = fetch_stats
+            self.metrics.inc('fetch_outcomes_total', domain=scraper.domain, outcome=outcome)
+            if data_manager.save_price(data['price']):
+                self.alerts.on_price(item_id, item['name'], data['url'], round(data['price'], 2), data_manager)
+            data_manager.save_metadata(data)
+        return data
+
+    def _set_status(self, url, status):
+        """Record an item's status in the config and publish the change"""
+        self.config_manager.update_status(url, status)
+        self.status_bus.publish_status(url, status)
+
     def update_configuration(self, items_config):
-        """Update the tracker with a new configuration"""
-        self.items = {}
-        for item in items_config:
-            scraper = PriceScraper(item['url'])
-            data_manager = PriceDataManager(scraper.item_id)
-            self.items[scraper.item_id] = {
-                'scraper': scraper,
-                'data_manager': data_manager,
-                'name': item.get('name', 'Unknown Item')
-            }    
-        
+        """Apply a new configuration by adding and removing only the changed items
+
+        Returns (added_ids, removed_ids). Existing items keep their scraper and
+        data manager; only their name and js_only flag are refreshed.
+        """
+        wanted = {generate_item_id(item['url']): item for item in items_config}
+        items = dict(self.items)
+        removed_ids = [item_id for item_id in items if item_id not in wanted]
+        added_ids = []
+
+        for item_id in removed_ids:
+            self.status_bus.remove(items.pop(item_id)['scraper'].url)
+            self.cache.invalidate(item_id)
+            self.summary_cache.invalidate(item_id)
+
+        for item_id, config_item in wanted.items():
+            if item_id in items:
+                items[item_id]['name'] = config_item.get('name', 'Unknown Item')
+                items[item_id]['scraper'].js_only = config_item.get('js_only', False)
+            else:
+                items[item_id] = self._create_item(config_item)
+                added_ids.append(item_id)
+                self.status_bus.publish_status(config_item['url'], config_item.get('status', 'checking'))
+
+        # Swap in a new dict so update runs and readers iterating the old one are unaffected
+        self.items = items
+        if removed_ids:
+            self.thumbnails.prune(items)
+            self.alerts.retain(items)
+            self.resilience.retain(items)
+        if added_ids or removed_ids:
+            self.logger.info(f"Reconfigured tracker: {len(added_ids)} added, {len(removed_ids)} removed")
+        return added_ids, removed_ids
+
     def update_price(self, item_id):
         """Update price for a specific item"""
         if item_id not in self.items:
             return None
             
         try:
-            item = self.items[item_id]
-            data = item['scraper'].get_item_data()
-            if data:
-                item['data_manager'].save_price(data['price'])
-                item['data_manager'].save_metadata(data)
-                return data
+            return self._scrape_item(item_id, self.items[item_id], force=True)
         except Exception as e:
             self.logger.error(f"Error updating item {item_id}: {e}")
         return None
         
+    def _load_item(self, item_id, item):
+        """Get parsed metadata and price history, served from the cache when unchanged"""
+        data_manager = item['data_manager']
+        metadata, price_history = self.cache.get(
+            item_id,
+            data_manager.get_revision(),
+            lambda: (data_manager.load_metadata(), data_manager.load_price_history())
+        )
+        return {
+            'metadata': metadata,
+            'price_history': price_history,
+            'name': item['name']
+        }
+
     def get_all_items(self):
         """Get current data for all items"""
         results = {}
         for item_id, item in self.items.items():
             try:
-                metadata = item['data_manager'].load_metadata()
-                price_history = item['data_manager'].load_price_history()
-                results[item_id] = {
-                    'metadata': metadata,
-                    'price_history': price_history,
-                    'name': item['name']
-                }
+                results[item_id] = self._load_item(item_id, item)
             except Exception as e:
                 self.logger.error(f"Error getting item {item_id}: {e}")
         return results
+
+    def _summarize(self, item_id, item):
+        """Latest price, change and a short sparkline, without the full history"""
+        data_manager = item['data_manager']
+        metadata = data_manager.load_metadata()
+        timestamps, prices = data_manager.load_price_columns(time.time() - self.sparkline_days * 86400)
+        if len(prices) < 2:
+            timestamps, prices = data_manager.load_price_columns()
+        latest = round(prices[-1], 2) if prices else None
+        previous = round(prices[-2], 2) if len(prices) > 1 else None
+        change = round(latest - previous, 2) if previous is not None else None
+        _, sparkline = lttb(timestamps, prices, self.sparkline_points)
+        return {
+            'item_id': item_id,
+            'title': metadata.get('title'),
+            'url': item['scraper'].url,
+            'thumbnail_path': metadata.get('thumbnail_path'),
+            'latest_price': latest,
+            'latest_at': timestamps[-1] if timestamps else None,
+            'previous_price': previous,
+            'change': change,
+            'change_pct': round(change / previous * 100, 2) if previous else None,
+            'sparkline': [round(price, 2) for price in sparkline],
+            'skip_rate': skip_rate(metadata.get('fetch_stats'))
+        }
+
+    def get_item_summaries(self):
+        """Summaries of all items with their current status, in tracking order"""
+        _, statuses = self.status_bus.snapshot()
+        summaries = []
+        for item_id, item in self.items.items():
+            try:
+                summary = self.summary_cache.get(
+                    item_id,
+                    item['data_manager'].get_revision(),
+                    lambda: self._summarize(item_id, item)
+                )
+                summaries.append({
+                    **summary,
+                    'name': item['name'],
+                    'status': statuses.get(item['scraper'].url, 'checking')
+                })
+            except Exception as e:
+                self.logger.error(f"Error summarizing item {item_id}: {e}")
+        return summaries
+
+    def get_items_etag(self):
+        """Validator for get_all_items that changes whenever any item's data changes"""
+        digest = hashlib.md5()
+        for item_id, item in self.items.items():
+            digest.update(repr((item_id, item['name'], item['data_manager'].get_revision())).encode())
+        return digest.hexdigest()
         
     def get_item_data(self, item_id):
         """Get data for a specific item"""
@@ -106,12 +459,56 @@ class PriceTracker:
             return None
             
         try:
-            item = self.items[item_id]
-            return {
-                'metadata': item['data_manager'].load_metadata(),
-                'price_history': item['data_manager'].load_price_history(),
-                'name': item['name']
-            }
+            return self._load_item(item_id, self.items[item_id])
         except Exception as e:
             self.logger.error(f"Error getting item {item_id}: {e}")
-            return None
\ No newline at end of file
+            return None
+
+    def get_price_history(self, item_id, start=None, end=None, points=500, method='lttb',
+                          resolution='auto'):
+        """Columnar price history of one item, downsampled or rolled up to about points entries
+
+        resolution is 'raw', 'week', 'month' or 'auto'; auto serves raw prices,
+        downsampled with method ('lttb' or 'minmax'), unless the range holds so
+        many that the weekly or monthly rollups are the better source.
+        """
+        if item_id not in self.items:
+            return None
+        data_manager = self.items[item_id]['data_manager']
+
+        if resolution == 'auto':
+            resolution = 'raw'
+            timestamps, prices = data_manager.load_price_columns(start, end)
+            if len(timestamps) > points * 4:
+                for period in PERIODS:
+                    if len(data_manager.load_rollups(period, start, end)) <= points:
+                        resolution = period
+                        break
+                else:
+                    resolution = PERIODS[-1]
+        elif resolution == 'raw':
+            timestamps, prices = data_manager.load_price_columns(start, end)
+
+        if resolution in PERIODS:
+            rows = data_manager.load_rollups(resolution, start, end)
+            return {'item_id': item_id, 'resolution': resolution, 'total': len(rows),
+                    **rollup_columns(rows)}
+
+        total = len(timestamps)
+        timestamps, prices = DOWNSAMPLERS[method](timestamps, prices, points)
+        return {
+            'item_id': item_id,
+            'resolution': 'raw',
+            'method': method if len(timestamps) < total else None,
+            'total': total,
+            't': list(timestamps),
+            'price': [round(price, 2) for price in prices]
+        }
+
+    def get_item_id(self, url):
+        """Get the tracked item ID for a URL, or None if it is not tracked"""
+        config_item = self.config_manager.find_item(url)
+        if config_item is None:
+            return None
+        item_id = generate_item_id(config_item['url'])
+        return item_id if item_id in self.items else None
\ No newline at end of file
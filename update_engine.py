@@ -0,0 +1,107 @@
+#update_engine.py
+
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from collections import deque
+from datetime import datetime
+from urllib.parse import urlparse
+import logging
+import time
+
+class UpdateEngine:
+    """Runs item scrapes on a bounded worker pool with per-domain concurrency limits"""
+
+    def __init__(self, max_workers=4, per_domain_limit=2):
+        """
+        max_workers: maximum number of scrapes running at once
+        per_domain_limit: maximum number of concurrent scrapes against one domain
+        """
+        self.max_workers = max(1, max_workers)
+        self.per_domain_limit = max(1, per_domain_limit)
+        self.logger = logging.getLogger(__name__)
+        self.last_run = None
+
+    @staticmethod
+    def get_domain(url):
+        """Return the host part of a URL, used to group scrapes per retailer"""
+        return urlparse(url).netloc.lower()
+
+    def run(self, jobs, task, on_result=None):
+        """
+        Run task(item_id, item) for every job and collect the results
+        jobs: iterable of (item_id, item) pairs, item must have a 'scraper' entry
+        task: callable doing the scrape, returns the item data or None
+        on_result: optional callback(item_id, item, data, error) called in the
+                   calling thread as soon as each scrape finishes
+        Returns a dict of item_id -> data for successful scrapes
+        """
+        # Queue jobs per domain so a busy retailer never starves the others
+        pending = {}
+        for item_id, item in jobs:
+            domain = self.get_domain(item['scraper'].url)
+            pending.setdefault(domain, deque()).append((item_id, item))
+
+        results = {}
+        timings = {}
+        in_flight = {}
+        domain_active = {}
+        run_start = time.monotonic()
+        started_at = datetime.now().isoformat()
+
+        def timed_task(item_id, item):
+            start = time.monotonic()
+            try:
+                return task(item_id, item), None, time.monotonic() - start
+            except Exception as e:
+                return None, e, time.monotonic() - start
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while pending or in_flight:
+                # Fill free worker slots round-robin over domains with spare capacity
+                submitted = True
+                while submitted and len(in_flight) < self.max_workers:
+                    submitted = False
+                    for domain in list(pending):
+                        if len(in_flight) >= self.max_workers:
+                            break
+                        if domain_active.get(domain, 0) >= self.per_domain_limit:
+                            continue
+                        item_id, item = pending[domain].popleft()
+                        if not pending[domain]:
+                            del pending[domain]
+                        future = executor.submit(timed_task, item_id, item)
+                        in_flight[future] = (item_id, item, domain)
+                        domain_active[domain] = domain_active.get(domain, 0) + 1
+                        submitted = True
+
+                done, _ = wait(list(in_flight), return_when=FIRST_COMPLETED)
+                for future in done:
+                    item_id, item, domain = in_flight.pop(future)
+                    domain_active[domain] -= 1
+                    data, error, duration = future.result()
+                    timings[item_id] = {
+                        'duration': round(duration, 3),
+                        'success': bool(data) and error is None
+                    }
+                    if data and error is None:
+                        results[item_id] = data
+                    if on_result:
+                        try:
+                            on_result(item_id, item, data, error)
+                        except Exception as e:
+                            self.logger.error(f"Error handling result for item {item_id}: {e}")
+
+        duration = time.monotonic() - run_start
+        succeeded = sum(1 for timing in timings.values() if timing['success'])
+        self.last_run = {
+            'started_at': started_at,
+            'duration': round(duration, 3),
+            'total': len(timings),
+            'succeeded': succeeded,
+            'failed': len(timings) - succeeded,
+            'items': timings
+        }
+        self.logger.info(
+            f"Updated {succeeded}/{len(timings)} items in {duration:.1f}s "
+            f"({self.max_workers} workers, {self.per_domain_limit} per domain)"
+        )
+        return results
@@ -0,0 +1,92 @@
+#validate_profiles.py
+
+from http_fetcher import extract_item
+from profiles import ProfileRegistry
+import argparse
+import logging
+import json
+import glob
+import time
+import sys
+import os
+
+def load_fixtures(fixtures_dir):
+    """Yield (name, html, expected) for every <name>.html with a matching <name>.json"""
+    for html_path in sorted(glob.glob(os.path.join(fixtures_dir, '*.html'))):
+        name = os.path.splitext(os.path.basename(html_path))[0]
+        expected_path = os.path.join(fixtures_dir, f"{name}.json")
+        if not os.path.exists(expected_path):
+            continue
+        with open(html_path, 'r', encoding='utf-8') as f:
+            html = f.read()
+        with open(expected_path, 'r') as f:
+            yield name, html, json.load(f)
+
+def validate_fixture(registry, html, expected, repeat=1):
+    """Run extraction on one fixture, returning (price, title, errors, ms per run)"""
+    profile = registry.for_url(expected['url'])
+    started = time.perf_counter()
+    for _ in range(repeat):
+        price, title = extract_item(html, profile)
+    elapsed_ms = (time.perf_counter() - started) * 1000 / repeat
+
+    errors = []
+    if 'price' in expected and (price is None or abs(price - expected['price']) > 0.005):
+        errors.append(f"price {price!r} != {expected['price']!r}")
+    if 'title' in expected and title != expected['title']:
+        errors.append(f"title {title!r} != {expected['title']!r}")
+    return price, title, errors, elapsed_ms
+
+def validate(registry, fixtures_dir, repeat=1):
+    """Validate every fixture, returning a report dict"""
+    results = []
+    for name, html, expected in load_fixtures(fixtures_dir):
+        price, title, errors, elapsed_ms = validate_fixture(registry, html, expected, repeat)
+        results.append({
+            'name': name,
+            'domain': registry.for_url(expected['url']).domain,
+            'price': price,
+            'title': title,
+            'errors': errors,
+            'ms': round(elapsed_ms, 3)
+        })
+
+    passed = sum(1 for result in results if not result['errors'])
+    timings = sorted(result['ms'] for result in results)
+    return {
+        'fixtures': len(results),
+        'passed': passed,
+        'accuracy': round(passed / len(results), 3) if results else None,
+        'median_ms': timings[len(timings) // 2] if timings else None,
+        'max_ms': timings[-1] if timings else None,
+        'results': results
+    }
+
+def main():
+    """Check extraction profiles against saved HTML fixtures offline"""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument('--fixtures', default='fixtures/profiles',
+                        help='directory of <name>.html pages with <name>.json expectations')
+    parser.add_argument('--profiles', default='data/profiles.json')
+    parser.add_argument('--repeat', type=int, default=20,
+                        help='extractions per fixture when timing')
+    parser.add_argument('--json', action='store_true', help='print the report as JSON')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    report = validate(ProfileRegistry(args.profiles), args.fixtures, max(1, args.repeat))
+    if args.json:
+        print(json.dumps(report, indent=4))
+    else:
+        for result in report['results']:
+            status = 'ok  ' if not result['errors'] else 'FAIL'
+            print(f"{status} {result['name']:<30} {result['domain']:<25} {result['ms']:>8.3f} ms"
+                  f"  {'; '.join(result['errors'])}")
+        print(f"{report['passed']}/{report['fixtures']} fixtures passed, "
+              f"median {report['median_ms']} ms, max {report['max_ms']} ms")
+
+    if not report['fixtures'] or report['passed'] < report['fixtures']:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
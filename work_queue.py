@@ -0,0 +1,332 @@
+#work_queue.py
+
+from contextlib import contextmanager
+from datetime import datetime
+from urllib.parse import urlparse
+from resilience import ScrapeError
+import threading
+import logging
+import sqlite3
+import socket
+import json
+import time
+import os
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    item_id TEXT NOT NULL,
+    domain TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    state TEXT NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    owner TEXT,
+    lease_expires REAL,
+    enqueued_at REAL NOT NULL,
+    finished_at REAL,
+    result TEXT
+);
+CREATE UNIQUE INDEX IF NOT EXISTS tasks_active_item ON tasks (item_id) WHERE state IN ('queued', 'leased');
+CREATE INDEX IF NOT EXISTS tasks_state ON tasks (state, id);
+CREATE TABLE IF NOT EXISTS workers (
+    owner TEXT PRIMARY KEY,
+    host TEXT NOT NULL,
+    pid INTEGER NOT NULL,
+    started_at REAL NOT NULL,
+    last_seen REAL NOT NULL,
+    stats TEXT
+);
+"""
+
+class WorkQueueTimeout(Exception):
+    """No worker finished a queued scrape in time"""
+
+class WorkQueue:
+    """Scrape tasks shared by the dashboard and any number of worker processes
+
+    Backed by a SQLite database, so every process on the host (or on hosts
+    sharing a local-semantics filesystem) sees the same queue. Workers lease
+    tasks for lease_seconds and keep the lease alive with heartbeats; a task
+    whose lease expires, because its worker crashed or hung, is handed to
+    another worker, up to max_attempts times. At most per_domain_limit tasks
+    of one domain are leased at once across all workers.
+    """
+
+    def __init__(self, db_path='data/work_queue.db', lease_seconds=120, max_attempts=3,
+                 per_domain_limit=2):
+        """
+        db_path: SQLite database holding the queue
+        lease_seconds: how long a task stays with a worker without a heartbeat
+        max_attempts: leases of one task before it is failed as poisoned
+        per_domain_limit: tasks of one domain leased at once across all workers
+        """
+        self.db_path = db_path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.per_domain_limit = per_domain_limit
+        self.logger = logging.getLogger(__name__)
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None, timeout=30)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(SCHEMA)
+
+    @contextmanager
+    def _immediate(self):
+        """Write transaction taking the database write lock up front, so leases never race"""
+        with self._lock:
+            self.conn.execute('BEGIN IMMEDIATE')
+            try:
+                yield self.conn
+            except Exception:
+                self.conn.execute('ROLLBACK')
+                raise
+            self.conn.execute('COMMIT')
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            return self.conn.execute(sql, params).fetchall()
+
+    def enqueue(self, entries):
+        """
+        Queue (item_id, url, payload) entries, returning {item_id: task_id}
+        An item already queued or leased keeps its task, whose ID is returned instead.
+        """
+        now = time.time()
+        task_ids = {}
+        with self._immediate() as conn:
+            for item_id, url, payload in entries:
+                conn.execute(
+                    'INSERT OR IGNORE INTO tasks (item_id, domain, payload, enqueued_at) VALUES (?, ?, ?, ?)',
+                    (item_id, urlparse(url).netloc.lower(), json.dumps(payload), now)
+                )
+                row = conn.execute(
+                    "SELECT id FROM tasks WHERE item_id = ? AND state IN ('queued', 'leased')", (item_id,)
+                ).fetchone()
+                task_ids[item_id] = row[0]
+        return task_ids
+
+    def _reclaim(self, conn, now):
+        """Requeue tasks whose lease expired, failing those out of attempts"""
+        expired = conn.execute(
+            "SELECT id, attempts, owner FROM tasks WHERE state = 'leased' AND lease_expires < ?", (now,)
+        ).fetchall()
+        for task_id, attempts, owner in expired:
+            if attempts >= self.max_attempts:
+                result = {'error': {'kind': 'lease_expired', 'message': f"Lease lost {attempts} times"}}
+                conn.execute(
+                    "UPDATE tasks SET state = 'failed', owner = NULL, finished_at = ?, result = ? WHERE id = ?",
+                    (now, json.dumps(result), task_id)
+                )
+            else:
+                conn.execute("UPDATE tasks SET state = 'queued', owner = NULL WHERE id = ?", (task_id,))
+        if expired:
+            self.logger.warning(f"Reclaimed {len(expired)} tasks with expired leases")
+
+    def lease(self, owner, limit):
+        """Lease up to limit queued tasks to a worker, oldest first within per-domain limits
+
+        Returns [{'id', 'item_id', 'payload', 'attempts'}].
+        """
+        now = time.time()
+        leased = []
+        with self._immediate() as conn:
+            self._reclaim(conn, now)
+            active = dict(conn.execute(
+                "SELECT domain, COUNT(*) FROM tasks WHERE state = 'leased' GROUP BY domain"
+            ).fetchall())
+            candidates = conn.execute(
+                "SELECT id, item_id, domain, payload, attempts FROM tasks WHERE state = 'queued' ORDER BY id LIMIT ?",
+                (max(limit * 50, 500),)
+            ).fetchall()
+            for task_id, item_id, domain, payload, attempts in candidates:
+                if len(leased) >= limit:
+                    break
+                if active.get(domain, 0) >= self.per_domain_limit:
+                    continue
+                active[domain] = active.get(domain, 0) + 1
+                conn.execute(
+                    "UPDATE tasks SET state = 'leased', owner = ?, lease_expires = ?, attempts = attempts + 1 "
+                    "WHERE id = ?",
+                    (owner, now + self.lease_seconds, task_id)
+                )
+                leased.append({'id': task_id, 'item_id': item_id, 'payload': json.loads(payload),
+                               'attempts': attempts + 1})
+        return leased
+
+    def heartbeat(self, owner, stats=None):
+        """Extend a worker's leases and record that it is alive"""
+        now = time.time()
+        with self._immediate() as conn:
+            conn.execute(
+                "UPDATE tasks SET lease_expires = ? WHERE owner = ? AND state = 'leased'",
+                (now + self.lease_seconds, owner)
+            )
+            conn.execute(
+                'INSERT INTO workers (owner, host, pid, started_at, last_seen, stats) VALUES (?, ?, ?, ?, ?, ?) '
+                'ON CONFLICT (owner) DO UPDATE SET last_seen = excluded.last_seen, stats = excluded.stats',
+                (owner, socket.gethostname(), os.getpid(), now, now, json.dumps(stats or {}))
+            )
+
+    def _finish(self, task_id, owner, state, result):
+        with self._immediate() as conn:
+            cursor = conn.execute(
+                "UPDATE tasks SET state = ?, owner = NULL, finished_at = ?, result = ? "
+                "WHERE id = ? AND owner = ? AND state = 'leased'",
+                (state, time.time(), json.dumps(result), task_id, owner)
+            )
+            return cursor.rowcount == 1
+
+    def complete(self, task_id, owner, result):
+        """Store a task's result; False if the lease was lost and the task belongs to another worker"""
+        return self._finish(task_id, owner, 'done', result)
+
+    def fail(self, task_id, owner, error, duration=None):
+        """Fail a task with an error dict; False if the lease was lost"""
+        return self._finish(task_id, owner, 'failed', {'error': error, 'duration': duration})
+
+    def release(self, owner):
+        """Hand a stopping worker's tasks back to the queue without using up an attempt"""
+        with self._immediate() as conn:
+            conn.execute(
+                "UPDATE tasks SET state = 'queued', owner = NULL, attempts = attempts - 1 "
+                "WHERE owner = ? AND state = 'leased'",
+                (owner,)
+            )
+            conn.execute('DELETE FROM workers WHERE owner = ?', (owner,))
+
+    def results(self, task_ids):
+        """{task_id: (state, result)} of the given tasks that have finished"""
+        finished = {}
+        task_ids = list(task_ids)
+        for start in range(0, len(task_ids), 500):
+            chunk = task_ids[start:start + 500]
+            rows = self._query(
+                f"SELECT id, state, result FROM tasks WHERE id IN ({','.join('?' * len(chunk))}) "
+                "AND state IN ('done', 'failed')",
+                chunk
+            )
+            for task_id, state, result in rows:
+                finished[task_id] = (state, json.loads(result) if result else {})
+        return finished
+
+    def cancel(self, task_ids):
+        """Fail tasks that no worker has picked up yet"""
+        result = json.dumps({'error': {'kind': 'cancelled', 'message': 'Cancelled before a worker took it'}})
+        with self._immediate() as conn:
+            for task_id in task_ids:
+                conn.execute(
+                    "UPDATE tasks SET state = 'failed', finished_at = ?, result = ? WHERE id = ? AND state = 'queued'",
+                    (time.time(), result, task_id)
+                )
+
+    def prune(self, max_age_hours=24):
+        """Delete finished tasks and silent workers older than max_age_hours"""
+        cutoff = time.time() - max_age_hours * 3600
+        with self._immediate() as conn:
+            conn.execute("DELETE FROM tasks WHERE state IN ('done', 'failed') AND finished_at < ?", (cutoff,))
+            conn.execute('DELETE FROM workers WHERE last_seen < ?', (cutoff,))
+
+    def stats(self):
+        """Task counts by state and the workers seen within two lease periods"""
+        counts = dict(self._query('SELECT state, COUNT(*) FROM tasks GROUP BY state'))
+        alive_since = time.time() - 2 * self.lease_seconds
+        workers = [
+            {'owner': owner, 'host': host, 'pid': pid, 'last_seen': datetime.fromtimestamp(last_seen).isoformat(),
+             'stats': json.loads(stats) if stats else {}}
+            for owner, host, pid, last_seen, stats in self._query(
+                'SELECT owner, host, pid, last_seen, stats FROM workers WHERE last_seen >= ? ORDER BY owner',
+                (alive_since,)
+            )
+        ]
+        return {'tasks': {state: counts.get(state, 0) for state in ('queued', 'leased', 'done', 'failed')},
+                'workers': workers}
+
+class QueueCoordinator:
+    """Dashboard side of the work queue: runs update batches on remote workers
+
+    run() has the shape of UpdateEngine.run, so the tracker can hand a batch
+    to the queue instead of its own engine and handle results the same way.
+    """
+
+    def __init__(self, queue, poll_seconds=0.5, run_timeout_minutes=120):
+        """
+        queue: WorkQueue shared with the workers
+        poll_seconds: how often finished tasks are collected
+        run_timeout_minutes: longest wait for a batch; unfinished items are reported as failed
+        """
+        self.queue = queue
+        self.poll_seconds = poll_seconds
+        self.run_timeout = run_timeout_minutes * 60
+        self.logger = logging.getLogger(__name__)
+        self.last_run = None
+
+    def run(self, jobs, on_result=None):
+        """
+        Queue every (item_id, item) job and wait for the workers' results
+        on_result: optional callback(item_id, item, data, error) called as each result arrives
+        Returns a dict of item_id -> data for successful scrapes
+        """
+        jobs = dict(jobs)
+        started_at = datetime.now().isoformat()
+        run_start = time.monotonic()
+        task_ids = self.queue.enqueue([
+            (item_id, item['scraper'].url, {
+                'url': item['scraper'].url,
+                'name': item['name'],
+                'js_only': item['scraper'].js_only
+            })
+            for item_id, item in jobs.items()
+        ])
+        waiting = {task_id: item_id for item_id, task_id in task_ids.items()}
+        results = {}
+        timings = {}
+
+        def report(item_id, data, error, duration):
+            timings[item_id] = {'duration': round(duration, 3), 'success': bool(data) and error is None}
+            if data and error is None:
+                results[item_id] = data
+            if on_result:
+                try:
+                    on_result(item_id, jobs[item_id], data, error)
+                except Exception as e:
+                    self.logger.error(f"Error handling result for item {item_id}: {e}")
+
+        deadline = time.monotonic() + self.run_timeout
+        while waiting and time.monotonic() < deadline:
+            finished = self.queue.results(waiting)
+            for task_id, (state, result) in finished.items():
+                item_id = waiting.pop(task_id)
+                duration = result.get('duration') or 0
+                error = result.get('error', {})
+                if state == 'done':
+                    report(item_id, result.get('data'), None, duration)
+                elif error.get('kind') == 'cancelled':
+                    report(item_id, None, WorkQueueTimeout(error.get('message')), duration)
+                else:
+                    report(item_id, None, ScrapeError(error.get('kind', 'unknown'), error.get('message', ''),
+                                                      error.get('retry_after')), duration)
+            if waiting:
+                time.sleep(self.poll_seconds)
+
+        if waiting:
+            self.queue.cancel(waiting)
+            self.logger.warning(f"No worker result for {len(waiting)} items after {self.run_timeout / 60:.0f} minutes")
+            for item_id in waiting.values():
+                report(item_id, None, WorkQueueTimeout("No result from the scrape workers"),
+                       time.monotonic() - run_start)
+
+        duration = time.monotonic() - run_start
+        succeeded = sum(1 for timing in timings.values() if timing['success'])
+        self.last_run = {
+            'started_at': started_at,
+            'duration': round(duration, 3),
+            'total': len(timings),
+            'succeeded': succeeded,
+            'failed': len(timings) - succeeded,
+            'items': timings
+        }
+        self.logger.info(f"Workers updated {succeeded}/{len(timings)} items in {duration:.1f}s")
+        self.queue.prune()
+        return results
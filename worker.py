@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+#worker.py
+
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from tracker import PriceTracker
+from config_manager import ConfigManager
+from sqlite_storage import SQLiteStorage, SQLiteConfigManager
+from driver_pool import DriverPool
+from work_queue import WorkQueue
+from resilience import classify_error
+import threading
+import argparse
+import logging
+import signal
+import socket
+import time
+import uuid
+import os
+
+class ScrapeWorker:
+    """Leases scrape tasks from the shared work queue and stores results through the data managers"""
+
+    def __init__(self, tracker, queue, concurrency=4, poll_seconds=2, save_seconds=60, owner=None):
+        """
+        tracker: PriceTracker doing the scrapes and writes, without a coordinator
+        queue: WorkQueue shared with the dashboard
+        concurrency: scrapes run at once by this worker
+        poll_seconds: wait between polls of an empty queue
+        save_seconds: how often learned tier and selector stats and alert state are saved
+        owner: lease owner name, unique per worker process
+        """
+        self.tracker = tracker
+        self.queue = queue
+        self.concurrency = max(1, concurrency)
+        self.poll_seconds = poll_seconds
+        self.save_seconds = save_seconds
+        self.owner = owner or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self.logger = logging.getLogger(__name__)
+        self._stop = threading.Event()
+        self.counts = {'done': 0, 'failed': 0, 'in_flight': 0}
+
+    def stop(self):
+        """Stop leasing; scrapes in flight are finished first"""
+        self._stop.set()
+
+    def _item(self, task):
+        """The tracker item for a task, created from its payload when the worker has not seen it"""
+        payload = task['payload']
+        item_id = task['item_id']
+        lock = self.tracker._in_flight_lock
+        with lock:
+            item = self.tracker.items.get(item_id)
+        if item is None or item['scraper'].url != payload['url']:
+            # Created outside the lock; another pool thread may have added the item meanwhile
+            created = self.tracker._create_item(payload)
+            with lock:
+                item = self.tracker.items.get(item_id)
+                if item is None or item['scraper'].url != payload['url']:
+                    item = created
+                    self.tracker.items = {**self.tracker.items, item_id: item}
+        with lock:
+            item['name'] = payload.get('name', item['name'])
+            item['scraper'].js_only = payload.get('js_only', False)
+        return item
+
+    def _scrape(self, task):
+        """Run one task on a pool thread, returning (data, error, duration)"""
+        start = time.monotonic()
+        try:
+            data = self.tracker.scrape_and_store(task['item_id'], self._item(task))
+            if not data:
+                raise ValueError("No data scraped")
+            return data, None, time.monotonic() - start
+        except Exception as e:
+            return None, classify_error(e), time.monotonic() - start
+
+    def _heartbeat(self):
+        while not self._stop.wait(self.queue.lease_seconds / 3):
+            try:
+                self.queue.heartbeat(self.owner, self.counts)
+            except Exception as e:
+                self.logger.error(f"Heartbeat failed: {e}")
+
+    def _save_state(self):
+        self.tracker.tier_stats.save()
+        self.tracker.selector_stats.save()
+        self.tracker.alerts.save()
+
+    def run(self):
+        """Lease and scrape tasks until stopped"""
+        self.logger.info(f"Worker {self.owner} started with {self.concurrency} slots")
+        self.queue.heartbeat(self.owner, self.counts)
+        threading.Thread(target=self._heartbeat, name='worker-heartbeat', daemon=True).start()
+        in_flight = {}
+        last_save = time.monotonic()
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            while in_flight or not self._stop.is_set():
+                free = self.concurrency - len(in_flight)
+                if free and not self._stop.is_set():
+                    try:
+                        for task in self.queue.lease(self.owner, free):
+                            in_flight[executor.submit(self._scrape, task)] = task
+                    except Exception as e:
+                        self.logger.error(f"Error leasing tasks: {e}")
+                self.counts['in_flight'] = len(in_flight)
+                if not in_flight:
+                    self._stop.wait(self.poll_seconds)
+                    continue
+
+                done, _ = wait(list(in_flight), timeout=self.poll_seconds, return_when=FIRST_COMPLETED)
+                for future in done:
+                    task = in_flight.pop(future)
+                    data, error, duration = future.result()
+                    try:
+                        if error is None:
+                            kept = self.queue.complete(task['id'], self.owner,
+                                                       {'data': data, 'duration': round(duration, 3)})
+                            self.counts['done'] += 1
+                        else:
+                            kept = self.queue.fail(task['id'], self.owner, {
+                                'kind': error.kind,
+                                'message': str(error)[:500],
+                                'retry_after': error.retry_after
+                            }, round(duration, 3))
+                            self.counts['failed'] += 1
+                        if not kept:
+                            self.logger.warning(f"Lease on task {task['id']} was lost before it finished")
+                    except Exception as e:
+                        self.logger.error(f"Error reporting task {task['id']}: {e}")
+
+                if time.monotonic() - last_save >= self.save_seconds:
+                    self._save_state()
+                    last_save = time.monotonic()
+
+        self._save_state()
+        self.queue.release(self.owner)
+        self.logger.info(f"Worker {self.owner} stopped: {self.counts['done']} done, {self.counts['failed']} failed")
+
+def parse_args():
+    """Parse command line options"""
+    parser = argparse.ArgumentParser(description='Price tracker scrape worker')
+    parser.add_argument('--queue', default='data/work_queue.db', help='work queue database shared with the dashboard')
+    parser.add_argument('--storage', choices=['files', 'sqlite'], default='files',
+                        help='keep item data in per-item files or a single SQLite database')
+    parser.add_argument('--db', default='data/price_tracker.db',
+                        help='SQLite database path when --storage sqlite is used')
+    parser.add_argument('--concurrency', type=int, default=4, help='scrapes run at once by this worker')
+    parser.add_argument('--browsers', type=int, default=None,
+                        help='browser sessions kept by this worker, defaults to --concurrency')
+    parser.add_argument('--per-domain', type=int, default=2,
+                        help='tasks of one domain leased at once across all workers')
+    parser.add_argument('--lease-seconds', type=int, default=120)
+    parser.add_argument('--page-deadline', type=float, default=20)
+    return parser.parse_args()
+
+def main():
+    """Worker entry point"""
+    args = parse_args()
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    os.makedirs('data', exist_ok=True)
+    storage = None
+    if args.storage == 'sqlite':
+        storage = SQLiteStorage(args.db)
+        config_manager = SQLiteConfigManager(storage)
+    else:
+        config_manager = ConfigManager()
+
+    # Items arrive with their tasks; the configuration only pre-creates the known ones
+    tracker = PriceTracker(config_manager.get_items(), config_manager,
+                           driver_pool=DriverPool(max_drivers=args.browsers or args.concurrency),
+                           storage=storage, page_deadline=args.page_deadline)
+    queue = WorkQueue(args.queue, lease_seconds=args.lease_seconds, per_domain_limit=args.per_domain)
+    worker = ScrapeWorker(tracker, queue, concurrency=args.concurrency)
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *_: worker.stop())
+    worker.run()
+
+if __name__ == "__main__":
+    main()